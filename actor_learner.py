@@ -0,0 +1,271 @@
+"""Actor-learner training for the Tron learners
+
+Actor processes play games with a snapshot of the learner's policy and push
+compact trajectory batches over a bounded queue. The learner - the calling
+process - drains the queue, applies vectorized updates through the trainer's
+learn_episodes and sends a fresh policy snapshot to the actors every few
+batches. A full queue blocks the actors, so a slow learner throttles them
+instead of piling up stale games.
+
+Queue depth and actor/learner throughput are reported while training to
+balance the cores between the two roles: a queue that stays full means more
+actors will not help, an empty one means the learner is waiting on games.
+Actor spawn time - from process start until the first policy is loaded,
+mostly interpreter start and imports - is reported with the throughput.
+
+A trajectory batch holds the episodes of one actor packed end to end
+
+    states: (sum(T + 1), F) int8 - every state including the final one
+    actions: (sum(T + 1),) int8 - action index taken in each state, the last
+        one picked in the final state for SARSA's Q(s', a')
+    rewards: (sum(T),) float32 - reward of every transition
+    lengths: (episodes,) int32 - transitions T of every episode
+"""
+import importlib
+import multiprocessing as mp
+import queue
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import approximators
+import streams
+import tron
+
+
+def transition_rows(lengths: np.ndarray) -> np.ndarray:
+    """Row of s for every transition of packed episodes - s' is the next row"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    ends = np.cumsum(lengths + 1) - 1
+    rows = np.ones(ends[-1] + 1 if len(ends) else 0, dtype=bool)
+    rows[ends] = False
+    return np.flatnonzero(rows)
+
+
+def snapshot(trainer) -> Dict[str, Any]:
+    """Copy of the trainer's policy that can be sent to the actors"""
+    if trainer.q_function is not None:
+        return {"approximator": trainer.approximator,
+                "state": {k: np.array(v) for k, v in trainer.q_function.state_dict().items()}}
+    return {"q_table": trainer.q_table.copy()}
+
+
+class SnapshotPolicy:
+    """Epsilon greedy policy over a snapshot of the Q table or approximator"""
+
+    def __init__(self, epsilon: float, feature_sizes: list[int], draws: Optional[streams.Draws] = None):
+        self.epsilon = epsilon
+        self.feature_sizes = feature_sizes
+        self.q_table: Optional[np.ndarray] = None
+        self.q_function = None
+        # exploration draws - point at the game's stream of the player, see streams.Draws
+        self.draws = draws if draws is not None else streams.Draws()
+
+    def load(self, policy: Dict[str, Any]) -> None:
+        if "q_table" in policy:
+            self.q_table = policy["q_table"]
+            return
+        if self.q_function is None:
+            self.q_function = approximators.build(policy["approximator"], self.feature_sizes, len(tron.Turn))
+        self.q_function.load_state_dict(policy["state"])
+
+    def select(self, state: np.ndarray, legal_moves: Optional[np.ndarray] = None) -> int:
+        """Index of the epsilon greedy action - exploration only picks legal actions when masked"""
+        if self.epsilon and self.draws.random() <= self.epsilon:
+            if legal_moves is not None and np.any(legal_moves):
+                legal = np.flatnonzero(legal_moves)
+                return int(legal[self.draws.integers(len(legal))])
+            return self.draws.integers(len(tron.Turn))
+        if self.q_function is not None:
+            return int(np.argmax(self.q_function.q_values(state[None])[0]))
+        return int(np.argmax(self.q_table[tuple(state)]))
+
+
+def _actor(seeds: np.random.SeedSequence, config: Dict[str, Any], policies: mp.Queue, batches: mp.Queue,
+           stop) -> None:
+    """Play games and push trajectory batches until the learner says stop
+
+    Every game is seeded with the next child spawned from seeds.
+    """
+    directions = [tron.Turn.LEFT_90, tron.Turn.STRAIGHT, tron.Turn.RIGHT_90]
+    opponents = [importlib.import_module(a) for a in config["agents"]]
+    policy = SnapshotPolicy(config["epsilon"], tron.Tron.state_sizes(config["features"], config["vision_grid_size"]))
+    policy.load(policies.get())
+    # sent with the first batch only - wall clock since the learner started the process
+    spawn_time = time.time() - config["launched"]
+
+    def state(game):
+        return np.asarray(game.get_state(uid=1, features=config["features"], size=config["vision_grid_size"]))
+
+    while not stop.is_set():
+        # latest snapshot - older ones still in the queue are skipped
+        try:
+            while True:
+                policy.load(policies.get_nowait())
+        except queue.Empty:
+            pass
+
+        start = time.perf_counter()
+        states, actions, rewards, lengths, stats = [], [], [], [], []
+        for ii in range(config["episodes_per_batch"]):
+            game = tron.Tron(size=config["size"], num_players=config["players"], game_map=config["game_map"],
+                             seed=seeds.spawn(1)[0])
+            observation = game.reset()
+            policy.draws = streams.Draws(game.player_rngs[0])
+            s = state(game)
+            steps = 0
+            done = False
+            while not done:
+                legal_moves = observation['legal_moves'][0] if config["mask_actions"] else None
+                a = policy.select(s, legal_moves)
+                states.append(s)
+                actions.append(a)
+                moves = [directions[a]] + [am.generate_move(observation['board'], observation['positions'],
+                                                            observation['orientations'], uid,
+                                                            legal_moves=observation['legal_moves'][uid],
+                                                            rng=game.player_rngs[uid])
+                                           for uid, am in enumerate(opponents, start=1)]
+                observation, done, status, reward = game.move(*moves)
+                rewards.append(reward[0])
+                steps += 1
+                s = state(game)
+            # final state and the action the policy would take there
+            states.append(s)
+            actions.append(policy.select(s))
+            lengths.append(steps)
+            stats.append(game.get_game_stats(uid=1))
+
+        batch = {"states": np.array(states, dtype=np.int8), "actions": np.array(actions, dtype=np.int8),
+                 "rewards": np.array(rewards, dtype=np.float32), "lengths": np.array(lengths, dtype=np.int32),
+                 "stats": stats, "play_time": time.perf_counter() - start, "spawn_time": spawn_time}
+        spawn_time = None
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+
+def train(trainer, num_episodes: int = 1000, num_actors: int = 2, queue_size: int = 8,
+          episodes_per_batch: int = 4, refresh_every: int = 4, report_every: float = 5.0,
+          seed: streams.Seed = 0) -> tuple[list[Dict], Dict[str, float]]:
+    """Train the trainer from games played by actor processes
+
+    Args:
+        trainer: QLearning, SARSA or MonteCarlo instance - needs learn_episodes
+            and _converged for early stopping
+        num_episodes (int): number of episodes to learn from
+        num_actors (int): number of actor processes
+        queue_size (int): trajectory batches the queue holds before actors block
+        episodes_per_batch (int): episodes an actor packs into one batch
+        refresh_every (int): learner batches between policy snapshots
+        report_every (float): seconds between throughput reports
+        seed (int): seed or np.random.SeedSequence - every actor plays from
+            its own spawned child
+
+    Returns:
+        stats (list): game stats of every episode - see _build_game_stats
+        throughput (dict): actor and learner transitions per second, learner
+            busy fraction, mean queue depth and mean/max actor spawn seconds
+    """
+    config = {"size": trainer.size, "players": trainer.players, "agents": trainer.agent_list,
+              "features": trainer.features, "vision_grid_size": trainer.vision_grid_size,
+              "epsilon": trainer.epsilon, "mask_actions": trainer.mask_actions, "game_map": trainer.game_map,
+              "episodes_per_batch": episodes_per_batch}
+    # spawn - actors start clean instead of inheriting the learner's threads and state
+    ctx = mp.get_context("spawn")
+    batches = ctx.Queue(maxsize=queue_size)
+    policies = [ctx.Queue() for ii in range(num_actors)]
+    stop = ctx.Event()
+
+    policy = snapshot(trainer)
+    for q in policies:
+        q.put(policy)
+    actor_seeds = streams.seed_sequence(seed).spawn(num_actors)
+    actors = [ctx.Process(target=_actor, args=(actor_seeds[ii], config, policies[ii], batches, stop), daemon=True)
+              for ii in range(num_actors)]
+    config["launched"] = time.time()
+    for p in actors:
+        p.start()
+
+    stats = []
+    n_prev = len(trainer.game_stats)
+    num_batches = transitions = 0
+    learn_time = play_time = 0.0
+    depths = []
+    spawn_times = []
+    stopped = False
+    start = last_report = time.perf_counter()
+    try:
+        while len(stats) < num_episodes and not stopped:
+            try:
+                depths.append(batches.qsize())
+            except NotImplementedError:  # macOS has no sem_getvalue
+                pass
+            try:
+                batch = batches.get(timeout=1.0)
+            except queue.Empty:
+                if not any(p.is_alive() for p in actors):
+                    raise RuntimeError("All actors exited - see their tracebacks above")
+                continue
+
+            # drop the episodes past num_episodes
+            keep = min(len(batch["lengths"]), num_episodes - len(stats))
+            lengths = batch["lengths"][:keep]
+            rows = int(np.sum(lengths + 1))
+            tic = time.perf_counter()
+            trainer.learn_episodes(batch["states"][:rows], batch["actions"][:rows],
+                                   batch["rewards"][:rows - keep], lengths)
+            learn_time += time.perf_counter() - tic
+            play_time += batch["play_time"]
+            if batch["spawn_time"] is not None:
+                spawn_times.append(batch["spawn_time"])
+            transitions += int(np.sum(lengths))
+            for game_stats in batch["stats"][:keep]:
+                stats.append(trainer._build_game_stats(n=len(stats) + n_prev, game_stats=game_stats))
+                # a batch lands as one update - the first episode carries its whole change
+                stopped = trainer._converged(stats[-1])
+                if stopped:
+                    break
+
+            num_batches += 1
+            if num_batches % refresh_every == 0:
+                policy = snapshot(trainer)
+                for q in policies:
+                    q.put(policy)
+
+            now = time.perf_counter()
+            if now - last_report >= report_every:
+                last_report = now
+                print(f"Episodes {len(stats)}/{num_episodes} | "
+                      f"queue {depths[-1] if depths else '?'}/{queue_size} | "
+                      f"actors {transitions / (now - start):.0f} steps/s | "
+                      f"learner {transitions / max(learn_time, 1e-9):.0f} steps/s "
+                      f"({learn_time / (now - start):.0%} busy)")
+    finally:
+        stop.set()
+        # unblock actors waiting on a full queue, then wait for them
+        for p in actors:
+            while p.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+                p.join(timeout=0.1)
+        for q in [batches] + policies:
+            q.cancel_join_thread()
+
+    elapsed = time.perf_counter() - start
+    throughput = {"actor_steps_per_s": transitions / elapsed,
+                  "actor_steps_per_play_s": transitions / max(play_time, 1e-9),
+                  "learner_steps_per_s": transitions / max(learn_time, 1e-9),
+                  "learner_busy": learn_time / elapsed,
+                  "queue_depth": float(np.mean(depths)) if depths else float("nan"),
+                  "spawn_s": float(np.mean(spawn_times)) if spawn_times else float("nan"),
+                  "spawn_max_s": max(spawn_times, default=float("nan"))}
+    print("Actor-learner: {actor_steps_per_s:.0f} steps/s from the actors, learner "
+          "{learner_steps_per_s:.0f} steps/s ({learner_busy:.0%} busy), mean queue depth "
+          "{queue_depth:.1f}, actor spawn {spawn_s:.2f}s (max {spawn_max_s:.2f}s)".format(**throughput))
+    return stats, throughput
@@ -1,7 +1,7 @@
-import numpy as np
 import tron
+from agent.util import DEFAULT_RNG
 
-def generate_move(board, positions, orientations, uid):
+def generate_move(board, positions, orientations, uid, legal_moves=None, rng=None):
     """Generate move for game
 
     Args:
@@ -12,13 +12,15 @@ def generate_move(board, positions, orientations, uid):
         orientations (list): list of self orientation and opponents
             from tron.Orientation
         uid (int): player uid - index into arrays
+        rng (np.random.Generator): random stream of the player - see
+            Tron.player_rngs. None uses agent.util.DEFAULT_RNG
     
     Returns:
         move (int): Integer move command from tron.Turn
     """
 
     # move = get_forward_command()
-    move = get_stochastic_command()
+    move = get_stochastic_command(DEFAULT_RNG if rng is None else rng)
     return move
 
 def get_forward_command():
@@ -26,9 +28,9 @@ def get_forward_command():
     move = tron.Turn.STRAIGHT
     return move
 
-def get_stochastic_command():
+def get_stochastic_command(rng):
     """Go forward mostly but sometimes turn"""
-    rand = np.random.rand()
+    rand = rng.random()
     if rand < 0.1:
         move = tron.Turn.LEFT_90
     elif rand > 0.9:
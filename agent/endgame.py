@@ -0,0 +1,51 @@
+"""Hug the walls until sealed in a small region then play it out exactly
+
+The tablebase file is read from the TRON_TABLEBASE environment variable if
+set and solved positions are shared by every game in the process.
+"""
+import os
+
+import tron
+import tablebase
+from agent import wallhugger
+from regions import SIDES
+
+TABLEBASE = tablebase.Tablebase(filename=os.environ.get("TRON_TABLEBASE"))
+
+# pure Python move search holds the GIL - ConcurrentMoves runs it in a process pool
+EXECUTOR = "process"
+
+
+def generate_move(board, positions, orientations, uid, legal_moves=None, rng=None):
+    """Generate move for game
+
+    Args:
+        board (np.array): game board as nd array
+            [:, :, 0]: obstacles
+            [:, :, 1:]: player locations
+        positions (list): list of current position of self and opponents as tuple (y, x)
+        orientations (list): list of self orientation and opponents
+            from tron.Orientation
+        uid (int): player uid to use to index into arrays
+        legal_moves (np.array): optional legal move mask in Turn order from
+            the observation - skips checking the board
+        rng (np.random.Generator): random stream of the player for the
+            wallhugger fallback - see Tron.player_rngs
+
+    Returns:
+        move (int): Integer move command from tron.Turn
+    """
+    y, x = positions[uid]
+    cells = tablebase.region_cells(y, x, lambda yn, xn: tron.Tron.validate_position(yn, xn, board),
+                                   limit=TABLEBASE.max_cells)
+
+    # only solve when no opponent can reach the region
+    if cells:
+        opponents = {tuple(p) for ii, p in enumerate(positions) if ii != uid}
+        isolated = not any((cy + dy, cx + dx) in opponents for cy, cx in cells for dy, dx in SIDES)
+        if isolated:
+            best = TABLEBASE.best_move(y, x, orientations[uid], cells)
+            if best is not None:
+                return tron.Turn(best[0])
+
+    return wallhugger.generate_move(board, positions, orientations, uid, legal_moves, rng=rng)
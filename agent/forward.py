@@ -1,7 +1,7 @@
 import numpy as np
 import tron
 
-def generate_move(board, positions, orientations):
+def generate_move(board, positions, orientations, uid=0, legal_moves=None, rng=None):
     """Generate move for game
 
     Args:
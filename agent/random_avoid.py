@@ -1,9 +1,12 @@
 """Randomly pick only valid moves"""
 
-import numpy as np
 import tron
+from agent.util import DEFAULT_RNG, get_valid_moves
 
-def generate_move(board, positions, orientations, uid):
+# pure Python move search holds the GIL - ConcurrentMoves runs it in a process pool
+EXECUTOR = "process"
+
+def generate_move(board, positions, orientations, uid, legal_moves=None, rng=None):
     """
 
     Args:
@@ -14,6 +17,10 @@ def generate_move(board, positions, orientations, uid):
         orientations (list): list of self orientation and opponents
             from tron.Orientation
         uid (int): player uid to use to index into arrays
+        legal_moves (np.array): optional legal move mask in Turn order from
+            the observation - skips checking the board
+        rng (np.random.Generator): random stream of the player - see
+            Tron.player_rngs. None uses agent.util.DEFAULT_RNG
     
     Returns:
         move (int): Integer move command from tron.Turn
@@ -24,18 +31,13 @@ def generate_move(board, positions, orientations, uid):
     y, x = positions[uid]
     orientation = orientations[uid]
     # get list of possible moves
-    valid_moves = []
-    for a in tron.Turn:
-        (yn, xn, _) = tron.Player.future_move(y, x, orientation, a)
-
-        # check if resulting square is occupied
-        if tron.Tron.validate_position(yn, xn, board):
-            valid_moves.append(a)
+    valid_moves = get_valid_moves(y, x, orientation, board, legal_moves)
 
     # randomly pick a move from valid options - or if none pick a random invalid one
+    rng = DEFAULT_RNG if rng is None else rng
     if valid_moves:
-        move = np.random.choice(valid_moves)
+        move = valid_moves[rng.integers(len(valid_moves))]
     else:
-        move = np.random.choice(tron.Turn)
+        move = tron.TURNS[rng.integers(len(tron.TURNS))]
 
     return move
@@ -6,7 +6,8 @@ import tron
 from agent.util import get_valid_moves, validate_move
 
 
-def generate_move(board: np.ndarray, positions: list, orientations: list, uid: int) -> tron.Turn:
+def generate_move(board: np.ndarray, positions: list, orientations: list, uid: int,
+                  legal_moves: np.ndarray = None, rng: np.random.Generator = None) -> tron.Turn:
 
     # load the Q table from Json
 
@@ -1,9 +1,23 @@
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import importlib
+import queue
+import time
+from types import ModuleType
+from typing import Iterable, Optional
+
 import numpy as np
 
 import tron
 
+# stream of agents called without one - games hand each player its own, see Tron.player_rngs
+DEFAULT_RNG = np.random.default_rng()
+
 def get_valid_moves(y: int, x: int, orientation: tron.Orientation,
-                    board: np.ndarray) -> list[tron.Turn]:
+                    board: np.ndarray, legal_moves: Optional[np.ndarray] = None) -> list[tron.Turn]:
+    if legal_moves is not None:
+        # engine already checked every move - see Tron._legal_moves
+        return [a for a, legal in zip(tron.TURNS, legal_moves) if legal]
+
     valid_moves = []
     for a in tron.Turn:
         (yn, xn, _) = tron.Player.future_move(y, x, orientation, a)
@@ -15,7 +29,10 @@ def get_valid_moves(y: int, x: int, orientation: tron.Orientation,
     return valid_moves
 
 def validate_move(y: int, x: int, orientation: tron.Orientation, 
-                  board: np.ndarray, action: tron.Turn) -> bool:
+                  board: np.ndarray, action: tron.Turn,
+                  legal_moves: Optional[np.ndarray] = None) -> bool:
+    if legal_moves is not None:
+        return bool(legal_moves[tron.TURNS.index(tron.Turn.STRAIGHT)])
     (yn, xn, _) = tron.Player.future_move(y, x, orientation, tron.Turn.STRAIGHT)
     return tron.Tron.validate_position(yn, xn, board)
 
@@ -35,3 +52,215 @@ def build_agent_list(players: int, agents: list[str]) -> list[str]:
         agent_list = ["agent.semideterministic" for ii in range(players)]
 
     return agent_list
+
+
+def _generate_move(module_name: str, board: np.ndarray, positions: tuple,
+                   orientations: tuple, uid: int, legal_moves: Optional[np.ndarray],
+                   rng: Optional[np.random.Generator] = None) -> tuple[tron.Turn, Optional[dict]]:
+    """Process pool entry point - agent modules are imported once per worker
+
+    rng arrives as a copy of the player's stream, so its state after the move
+    is sent back to advance the original - see _sync_stream.
+    """
+    move = importlib.import_module(module_name).generate_move(board, positions, orientations, uid,
+                                                              legal_moves=legal_moves, rng=rng)
+    return move, (rng.bit_generator.state if rng is not None else None)
+
+
+def _sync_stream(future: Future, rng: Optional[np.random.Generator]) -> Future:
+    """Future of the move alone - the player's stream takes the worker's state
+
+    The process path then draws exactly what the thread and serial paths draw.
+    """
+    moved: Future = Future()
+
+    def done(f: Future) -> None:
+        if f.exception() is not None:
+            moved.set_exception(f.exception())
+            return
+        move, state = f.result()
+        if rng is not None:
+            rng.bit_generator.state = state
+        moved.set_result(move)
+    future.add_done_callback(done)
+    return moved
+
+
+class ConcurrentMoves:
+    """Generate the moves of all players against the same observation
+
+    Agents run in a thread pool by default which suits NumPy heavy agents
+    that release the GIL. Agent modules that set EXECUTOR = "process" are
+    pure Python and run in a process pool instead. With concurrent=False the
+    moves are generated serially in the calling thread.
+
+    Given the game's player streams every agent draws from its own, so the
+    moves don't depend on the order the threads run in.
+    """
+
+    def __init__(self, agent_modules: list[ModuleType], concurrent: bool = True,
+                 max_workers: Optional[int] = None):
+        """Constructor
+
+        Args:
+            agent_modules (list): agent modules with generate_move
+            concurrent (bool): evaluate all players at once
+            max_workers (int): size of the pools - defaults to number of agents
+        """
+        self.agent_modules = agent_modules
+        self.concurrent = concurrent
+        self.thread_pool: Optional[ThreadPoolExecutor] = None
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+
+        if concurrent and agent_modules:
+            max_workers = max_workers if max_workers else len(agent_modules)
+            self.thread_pool = ThreadPoolExecutor(max_workers=max_workers)
+            if any(getattr(am, "EXECUTOR", "thread") == "process" for am in agent_modules):
+                self.process_pool = ProcessPoolExecutor(max_workers=max_workers)
+
+    @staticmethod
+    def _arguments(observation: tron.Observation) -> tuple:
+        board = observation['board']
+        if isinstance(board, np.ndarray):
+            # every agent sees the same read only board
+            board = board.view()
+            board.flags.writeable = False
+        return board, (observation['positions'], observation['orientations']), observation['legal_moves']
+
+    def generate_moves(self, observation: tron.Observation, uids: Iterable[int],
+                       rngs: Optional[list[np.random.Generator]] = None) -> list[tron.Turn]:
+        """Moves for each agent module in order
+
+        Args:
+            observation (dict): observation from Tron.move or Tron.reset
+            uids (list): player index passed to each agent's generate_move
+            rngs (list): random stream of every player indexed like uids -
+                see Tron.player_rngs. None uses agent.util.DEFAULT_RNG
+
+        Returns:
+            moves (list): move from tron.Turn for every agent module
+        """
+        if not self.concurrent:
+            board, args, legal_moves = self._arguments(observation)
+            return [am.generate_move(board, *args, uid, legal_moves=legal_moves[uid],
+                                     rng=rngs[uid] if rngs is not None else None)
+                    for am, uid in zip(self.agent_modules, uids)]
+
+        return [f.result() for f in self.submit_moves(observation, uids, rngs)]
+
+    def submit_moves(self, observation: tron.Observation, uids: Iterable[int],
+                     rngs: Optional[list[np.random.Generator]] = None) -> list[Future]:
+        """Start generating the moves of every agent module in the pools
+
+        Returns:
+            futures (list): future move from tron.Turn for every agent module
+        """
+        board, args, legal_moves = self._arguments(observation)
+        futures = []
+        for am, uid in zip(self.agent_modules, uids):
+            rng = rngs[uid] if rngs is not None else None
+            if getattr(am, "EXECUTOR", "thread") == "process":
+                futures.append(_sync_stream(self.process_pool.submit(_generate_move, am.__name__, board, *args,
+                                                                     uid, legal_moves[uid], rng), rng))
+            else:
+                futures.append(self.thread_pool.submit(am.generate_move, board, *args, uid,
+                                                       legal_moves=legal_moves[uid], rng=rng))
+        return futures
+
+    def close(self) -> None:
+        for pool in (self.thread_pool, self.process_pool):
+            if pool is not None:
+                pool.shutdown()
+
+
+def fallback_move(observation: tron.Observation, uid: int) -> tron.Turn:
+    """Straight if legal otherwise the first legal move - used when an agent runs out of time"""
+    legal_moves = observation['legal_moves'][uid]
+    if legal_moves[tron.TURNS.index(tron.Turn.STRAIGHT)]:
+        return tron.Turn.STRAIGHT
+    moves = [a for a, legal in zip(tron.TURNS, legal_moves) if legal]
+    return moves[0] if moves else tron.Turn.STRAIGHT
+
+
+class BackgroundMoves(ConcurrentMoves):
+    """Think about the next moves in the background
+
+    submit starts every agent on an observation straight away and finished
+    moves are delivered through a queue. collect waits at most a deadline and
+    uses fallback_move for any agent that isn't done yet. Moves that arrive
+    after the next submit are for an old observation and are dropped.
+    """
+
+    def __init__(self, agent_modules: list[ModuleType], deadline: float = 0.1,
+                 max_workers: Optional[int] = None):
+        """Constructor
+
+        Args:
+            agent_modules (list): agent modules with generate_move
+            deadline (float): default seconds collect waits for moves
+            max_workers (int): size of the pools - defaults to number of agents
+        """
+        super().__init__(agent_modules, concurrent=True, max_workers=max_workers)
+        self.deadline = deadline
+        self.results: queue.Queue = queue.Queue()
+        self.timeouts = 0
+        self._ticket = 0
+        self._observation: Optional[tron.Observation] = None
+        self._uids: list[int] = []
+        self._moves: dict[int, tron.Turn] = {}
+
+    def submit(self, observation: tron.Observation, uids: Iterable[int],
+               rngs: Optional[list[np.random.Generator]] = None) -> None:
+        """Start thinking about the moves for a new observation - see generate_moves"""
+        self._ticket += 1
+        self._observation = observation
+        self._uids = list(uids)
+        self._moves = {}
+        for future, uid in zip(self.submit_moves(observation, self._uids, rngs), self._uids):
+            future.add_done_callback(lambda f, ticket=self._ticket, uid=uid: self._deliver(ticket, uid, f))
+
+    def _deliver(self, ticket: int, uid: int, future: Future) -> None:
+        # a crashing agent is treated like one that ran out of time
+        if future.exception() is None:
+            self.results.put((ticket, uid, future.result()))
+
+    @property
+    def ready(self) -> bool:
+        """True once every move for the current observation has arrived"""
+        self._drain(timeout=0)
+        return len(self._moves) == len(self._uids)
+
+    def _drain(self, timeout: float) -> None:
+        end = time.perf_counter() + timeout
+        while len(self._moves) < len(self._uids):
+            try:
+                ticket, uid, move = self.results.get(timeout=max(end - time.perf_counter(), 0))
+            except queue.Empty:
+                return
+            if ticket == self._ticket:
+                self._moves[uid] = move
+
+    def collect(self, deadline: Optional[float] = None) -> list[tron.Turn]:
+        """Moves for the submitted observation
+
+        Args:
+            deadline (float): seconds to wait for unfinished agents -
+                defaults to self.deadline
+
+        Returns:
+            moves (list): move from tron.Turn for every submitted uid
+        """
+        self._drain(self.deadline if deadline is None else deadline)
+        moves = []
+        for uid in self._uids:
+            if uid not in self._moves:
+                self.timeouts += 1
+                self._moves[uid] = fallback_move(self._observation, uid)
+            moves.append(self._moves[uid])
+        return moves
+
+    def close(self) -> None:
+        # don't wait for agents still thinking about an old observation
+        for pool in (self.thread_pool, self.process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
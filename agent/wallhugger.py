@@ -1,11 +1,12 @@
 """Go straight unless there's an obstacle"""
-import numpy as np
-
 import tron
-from agent.util import get_valid_moves, validate_move
+from agent.util import DEFAULT_RNG, get_valid_moves, validate_move
+
+# pure Python move search holds the GIL - ConcurrentMoves runs it in a process pool
+EXECUTOR = "process"
 
 
-def generate_move(board, positions, orientations, uid):
+def generate_move(board, positions, orientations, uid, legal_moves=None, rng=None):
     """Generate move for game
 
     Args:
@@ -15,6 +16,11 @@ def generate_move(board, positions, orientations, uid):
         positions (list): list of current position of self and opponents as tuple (y, x)
         orientations (list): list of self orientation and opponents
             from tron.Orientation
+        uid (int): player uid to use to index into arrays
+        legal_moves (np.array): optional legal move mask in Turn order from
+            the observation - skips checking the board
+        rng (np.random.Generator): random stream of the player - see
+            Tron.player_rngs. None uses agent.util.DEFAULT_RNG
     
     Returns:
         move (int): Integer move command from tron.Turn
@@ -24,16 +30,18 @@ def generate_move(board, positions, orientations, uid):
     orientation = orientations[uid]
     
     # try to go straight
-    if validate_move(y, x, orientation, board, action=tron.Turn.STRAIGHT):
+    if validate_move(y, x, orientation, board, action=tron.Turn.STRAIGHT,
+                     legal_moves=legal_moves):
         move = tron.Turn.STRAIGHT
     else:
         # check all moves and determine if they result in collision
-        valid_moves = get_valid_moves(y, x, orientation, board)
+        valid_moves = get_valid_moves(y, x, orientation, board, legal_moves)
 
+        rng = DEFAULT_RNG if rng is None else rng
         if valid_moves:
-            move = np.random.choice(valid_moves)
+            move = valid_moves[rng.integers(len(valid_moves))]
         else:
-            move = np.random.choice(tron.Turn)
+            move = tron.TURNS[rng.integers(len(tron.TURNS))]
             
         # try to move straight
 
@@ -0,0 +1,177 @@
+"""Q function approximators for the learners
+
+Drop in replacements for the tabular q_table when the state is too big to
+enumerate. Both score a batch of states with one call and learn from
+minibatches of (state, action, target) with a semi-gradient step - the
+target is treated as a constant.
+
+    TileCodedQ: linear Q over hashed tiles of feature subsets
+    MLPQ: one hidden layer ReLU network trained with Adam
+
+States are integer feature vectors - vision grids or ray features - with
+the number of values of each entry given by tron.Tron.state_sizes.
+"""
+from typing import Optional, Sequence
+
+import numpy as np
+
+APPROXIMATORS = ("tiles", "mlp")
+
+
+class TileCodedQ:
+    """Linear Q function over hashed tile codings
+
+    Each tiling looks at a random subset of the state entries and maps the
+    values it sees to one weight per action in a fixed size hashed table.
+    Q(s, a) is the sum of the weights of the active tile of every tiling, so
+    memory stays fixed however large the state gets.
+    """
+
+    def __init__(self, feature_sizes: Sequence[int], num_actions: int = 3, num_tilings: int = 16,
+                 tile_width: int = 4, memory: int = 2**18, learning_rate: float = 0.1, seed: int = 0):
+        """Constructor
+
+        Args:
+            feature_sizes (list): number of values of each state entry
+            num_actions (int): number of actions
+            num_tilings (int): number of tilings - active tiles per state
+            tile_width (int): state entries combined by each tiling
+            memory (int): size of the hashed weight table
+            learning_rate (float): step size - split between the tilings
+            seed (int): seed for picking the tiling subsets
+        """
+        rng = np.random.default_rng(seed)
+        sizes = np.asarray(feature_sizes, dtype=np.int64)
+        width = min(tile_width, len(sizes))
+
+        self.num_tilings = num_tilings
+        self.memory = memory
+        self.learning_rate = learning_rate
+        self.subsets = np.stack([rng.choice(len(sizes), size=width, replace=False)
+                                 for ii in range(num_tilings)])
+        # mixed radix place value of each entry inside its tiling
+        radix = sizes[self.subsets]
+        self.place = np.cumprod(np.hstack([np.ones((num_tilings, 1), dtype=np.int64), radix[:, :-1]]), axis=1)
+        self.offsets = rng.integers(0, memory, size=num_tilings)
+        self.weights = np.zeros((memory, num_actions))
+
+    def _tiles(self, states: np.ndarray) -> np.ndarray:
+        """N x num_tilings active tile of every tiling"""
+        states = np.asarray(states, dtype=np.int64)
+        codes = (states[:, self.subsets] * self.place).sum(axis=2)
+        return (codes * 2654435761 + self.offsets) % self.memory
+
+    def q_values(self, states: np.ndarray) -> np.ndarray:
+        """N x num_actions action values for a batch of states"""
+        return self.weights[self._tiles(states)].sum(axis=1)
+
+    def update(self, states: np.ndarray, actions: np.ndarray, targets: np.ndarray) -> None:
+        """Semi-gradient step towards the targets for the taken actions"""
+        tiles = self._tiles(states)
+        actions = np.asarray(actions)[:, None]
+        delta = np.asarray(targets) - self.weights[tiles, actions].sum(axis=1)
+        np.add.at(self.weights, (tiles, actions), (self.learning_rate / self.num_tilings) * delta[:, None])
+
+    def state_dict(self) -> dict:
+        return {"weights": self.weights, "subsets": self.subsets, "place": self.place, "offsets": self.offsets}
+
+    def load_state_dict(self, data) -> None:
+        for key in ("weights", "subsets", "place", "offsets"):
+            setattr(self, key, np.asarray(data[key]))
+        self.memory = self.weights.shape[0]
+        self.num_tilings = self.subsets.shape[0]
+
+
+class MLPQ:
+    """Small multilayer perceptron Q function
+
+    State entries are scaled to [0, 1], go through one ReLU hidden layer and
+    come out as one value per action. Minibatches are trained on the squared
+    TD error of the taken actions with Adam.
+    """
+
+    PARAMETERS = ("w1", "b1", "w2", "b2")
+
+    def __init__(self, feature_sizes: Sequence[int], num_actions: int = 3, hidden: int = 64,
+                 learning_rate: float = 1e-3, seed: int = 0):
+        """Constructor
+
+        Args:
+            feature_sizes (list): number of values of each state entry
+            num_actions (int): number of actions
+            hidden (int): number of hidden units
+            learning_rate (float): Adam step size
+            seed (int): seed for the initial weights
+        """
+        rng = np.random.default_rng(seed)
+        inputs = len(feature_sizes)
+        self.learning_rate = learning_rate
+        self.scale = 1 / np.maximum(np.asarray(feature_sizes, dtype=float) - 1, 1)
+
+        self.w1 = rng.normal(0, np.sqrt(2 / inputs), size=(inputs, hidden))
+        self.b1 = np.zeros(hidden)
+        self.w2 = rng.normal(0, np.sqrt(1 / hidden), size=(hidden, num_actions))
+        self.b2 = np.zeros(num_actions)
+
+        # Adam moments
+        self._m = {p: np.zeros_like(getattr(self, p)) for p in self.PARAMETERS}
+        self._v = {p: np.zeros_like(getattr(self, p)) for p in self.PARAMETERS}
+        self._t = 0
+
+    def _forward(self, states: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        x = np.asarray(states, dtype=float) * self.scale
+        h = np.maximum(x @ self.w1 + self.b1, 0)
+        return x, h, h @ self.w2 + self.b2
+
+    def q_values(self, states: np.ndarray) -> np.ndarray:
+        """N x num_actions action values for a batch of states"""
+        return self._forward(states)[2]
+
+    def update(self, states: np.ndarray, actions: np.ndarray, targets: np.ndarray) -> None:
+        """Semi-gradient Adam step on the squared TD error of the taken actions"""
+        x, h, q = self._forward(states)
+        rows = np.arange(len(q))
+        grad_q = np.zeros_like(q)
+        grad_q[rows, actions] = (q[rows, actions] - np.asarray(targets)) / len(q)
+
+        grad_h = grad_q @ self.w2.T
+        grad_h[h <= 0] = 0
+        grads = {"w1": x.T @ grad_h, "b1": grad_h.sum(axis=0),
+                 "w2": h.T @ grad_q, "b2": grad_q.sum(axis=0)}
+
+        self._t += 1
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        for p, g in grads.items():
+            self._m[p] = beta1 * self._m[p] + (1 - beta1) * g
+            self._v[p] = beta2 * self._v[p] + (1 - beta2) * g**2
+            m_hat = self._m[p] / (1 - beta1**self._t)
+            v_hat = self._v[p] / (1 - beta2**self._t)
+            setattr(self, p, getattr(self, p) - self.learning_rate * m_hat / (np.sqrt(v_hat) + eps))
+
+    def state_dict(self) -> dict:
+        return {p: getattr(self, p) for p in self.PARAMETERS}
+
+    def load_state_dict(self, data) -> None:
+        for p in self.PARAMETERS:
+            setattr(self, p, np.asarray(data[p]))
+        self._m = {p: np.zeros_like(getattr(self, p)) for p in self.PARAMETERS}
+        self._v = {p: np.zeros_like(getattr(self, p)) for p in self.PARAMETERS}
+        self._t = 0
+
+
+def build(kind: str, feature_sizes: Sequence[int], num_actions: int = 3,
+          learning_rate: Optional[float] = None):
+    """Create an approximator from APPROXIMATORS
+
+    Args:
+        kind (str): "tiles" or "mlp"
+        feature_sizes (list): number of values of each state entry
+        num_actions (int): number of actions
+        learning_rate (float): step size - None uses the approximator default
+    """
+    kwargs = {} if learning_rate is None else {"learning_rate": learning_rate}
+    if kind == "tiles":
+        return TileCodedQ(feature_sizes, num_actions, **kwargs)
+    elif kind == "mlp":
+        return MLPQ(feature_sizes, num_actions, **kwargs)
+    raise ValueError(f"approximator must be one of {APPROXIMATORS}")
@@ -0,0 +1,168 @@
+"""Sparse game board for very large maps"""
+from typing import Any, Dict
+
+import numpy as np
+
+
+class SparseBoard:
+    """Drop in replacement for the dense Tron grid that only stores trails
+
+    Boundary walls are implicit and interior obstacles and player trails are
+    kept in hash maps keyed by the linear cell index (y * cols + x). Memory
+    scales with the number of obstacles and the total trail length instead of
+    size^2 * (1 + num_players).
+
+    The board is indexed like the dense grid - board[y, x, layer] - where
+    y and x are ints, integer arrays or slices and layer 0 is walls and
+    layer uid is the trail of player uid. Slicing returns a dense window.
+    """
+
+    def __init__(self, rows: int, cols: int, num_players: int):
+        """Constructor
+
+        Args:
+            rows (int): number of rows (y) of the board
+            cols (int): number of columns (x) of the board
+            num_players (int): number of players - one trail layer each
+        """
+        self.rows = rows
+        self.cols = cols
+        self.num_players = num_players
+
+        # linear cell index -> 1 for interior obstacles
+        self._obstacles: Dict[int, int] = {}
+        # linear cell index -> bitmask of uids with a trail on the cell
+        self._trails: Dict[int, int] = {}
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return (self.rows, self.cols, 1 + self.num_players)
+
+    @property
+    def ndim(self) -> int:
+        return 3
+
+    @property
+    def trail_length(self) -> int:
+        """Number of cells covered by any trail"""
+        return len(self._trails)
+
+    def _normalize(self, index, length: int) -> np.ndarray:
+        """Turn an int, array or slice into in range integer indices"""
+        if isinstance(index, slice):
+            return np.arange(length)[index]
+        index = np.asarray(index, dtype=int)
+        if np.any((index >= length) | (index < -length)):
+            raise IndexError(f"index out of bounds for axis with size {length}")
+        return np.where(index < 0, index + length, index)
+
+    def _key(self, key):
+        """Turn a dense style index into broadcastable (ys, xs, layers)"""
+        y, x, layer = key
+        ys = self._normalize(y, self.rows)
+        xs = self._normalize(x, self.cols)
+        # slices build an open mesh - (rows, cols) window
+        if isinstance(y, slice) and isinstance(x, slice):
+            ys, xs = ys[:, None], xs[None, :]
+        elif isinstance(y, slice) and xs.ndim:
+            ys = ys[:, None]
+        elif isinstance(x, slice) and ys.ndim:
+            xs = xs[None, :]
+        ys, xs = np.broadcast_arrays(ys, xs)
+
+        layers = np.arange(1 + self.num_players)[layer]
+        if isinstance(layer, slice):
+            # layers become the trailing axis like the dense grid
+            ys, xs = ys[..., None], xs[..., None]
+        return ys, xs, layers
+
+    def walls(self, ys: np.ndarray, xs: np.ndarray) -> np.ndarray:
+        """Vectorized wall lookup - boundary walls are implicit"""
+        ys, xs = np.asarray(ys), np.asarray(xs)
+        walls = (ys <= 0) | (xs <= 0) | (ys >= self.rows - 1) | (xs >= self.cols - 1)
+        if self._obstacles:
+            walls |= self._lookup(self._obstacles, ys * self.cols + xs) > 0
+        return walls
+
+    def is_free(self, key: int) -> bool:
+        """Check a single cell by linear index - no wall or trail"""
+        y, x = divmod(key, self.cols)
+        if y <= 0 or x <= 0 or y >= self.rows - 1 or x >= self.cols - 1:
+            return False
+        return key not in self._trails and key not in self._obstacles
+
+    @staticmethod
+    def _lookup(table: Dict[int, int], keys: np.ndarray) -> np.ndarray:
+        """Vectorized lookup of many linear cell indices in a hash map"""
+        if not table:
+            return np.zeros(keys.shape, dtype=np.int64)
+        if keys.size < 64 or keys.size < len(table):
+            values = [table.get(k, 0) for k in keys.ravel().tolist()]
+            return np.array(values, dtype=np.int64).reshape(keys.shape)
+        # large windows - search the sorted table keys instead of hashing every cell
+        table_keys = np.fromiter(table.keys(), dtype=np.int64, count=len(table))
+        table_values = np.fromiter(table.values(), dtype=np.int64, count=len(table))
+        order = np.argsort(table_keys)
+        table_keys, table_values = table_keys[order], table_values[order]
+        pos = np.searchsorted(table_keys, keys).clip(max=len(table_keys) - 1)
+        return np.where(table_keys[pos] == keys, table_values[pos], 0)
+
+    def __getitem__(self, key):
+        ys, xs, layers = self._key(key)
+        walls = self.walls(ys, xs)
+        if np.any(layers > 0):
+            masks = self._lookup(self._trails, ys * self.cols + xs)
+            out = np.where(layers == 0, walls, (masks >> layers) & 1)
+        else:
+            out = np.broadcast_to(walls, np.broadcast_shapes(walls.shape, np.shape(layers)))
+        return out.astype(int)[()]
+
+    def __setitem__(self, key, value) -> None:
+        ys, xs, layers = np.broadcast_arrays(*self._key(key))
+        cells = (ys * self.cols + xs).ravel().tolist()
+        values = np.broadcast_to(np.asarray(value), ys.shape).ravel().tolist()
+        for cell, layer, v in zip(cells, layers.ravel().tolist(), values):
+            table = self._obstacles if layer == 0 else self._trails
+            bit = 1 if layer == 0 else 1 << layer
+            mask = table.get(cell, 0) | bit if v else table.get(cell, 0) & ~bit
+            if mask:
+                table[cell] = mask
+            else:
+                table.pop(cell, None)
+
+    def window(self, y: int, x: int, size: int) -> np.ndarray:
+        """Dense size x size x (1 + num_players) window centered on (y, x)
+
+        Cells outside of the board are zero, like get_vision_grid
+        """
+        rows = np.arange(y - size // 2, y + size // 2 + 1)[:, None]
+        cols = np.arange(x - size // 2, x + size // 2 + 1)[None, :]
+        rows, cols = np.broadcast_arrays(rows, cols)
+        inside = (rows >= 0) & (cols >= 0) & (rows < self.rows) & (cols < self.cols)
+        out = np.zeros((size, size, 1 + self.num_players), dtype=int)
+        out[inside] = self[rows[inside], cols[inside], :]
+        return out
+
+    def copy(self) -> "SparseBoard":
+        board = SparseBoard(self.rows, self.cols, self.num_players)
+        board._obstacles = self._obstacles.copy()
+        board._trails = self._trails.copy()
+        return board
+
+    def toarray(self) -> np.ndarray:
+        """Dense grid equivalent to Tron._define_grid"""
+        return self[:, :, :]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact JSON friendly representation"""
+        return {"shape": self.shape,
+                "obstacles": list(self._obstacles),
+                "trails": [list(self._trails.keys()), list(self._trails.values())]}
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "SparseBoard":
+        rows, cols, layers = data["shape"]
+        board = SparseBoard(rows, cols, layers - 1)
+        board._obstacles = {int(k): 1 for k in data["obstacles"]}
+        board._trails = {int(k): int(v) for k, v in zip(*data["trails"])}
+        return board
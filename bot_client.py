@@ -0,0 +1,86 @@
+"""Run an agent module as an external bot for server.py
+
+Speaks the server line protocol over TCP, a Unix socket or stdin/stdout and
+rebuilds the game board locally from the positions sent each turn.
+"""
+import argparse
+import importlib
+import json
+import socket
+import sys
+from typing import TextIO
+
+import numpy as np
+
+import tron
+
+
+def new_board(size: int, num_players: int) -> np.ndarray:
+    """Empty board with boundary walls - same layout as the Tron grid"""
+    board = np.zeros([size, size, 1 + num_players], dtype=int)
+    board[0, :, 0] = 1
+    board[-1, :, 0] = 1
+    board[:, 0, 0] = 1
+    board[:, -1, 0] = 1
+    return board
+
+
+def play(agent, rfile: TextIO, wfile: TextIO, name: str) -> None:
+    """Answer server turns with agent.generate_move until the server disconnects
+
+    Args:
+        agent (module): agent module with generate_move(board, positions, orientations, uid)
+        rfile (file): line stream from the server
+        wfile (file): line stream to the server
+        name (str): bot name reported to the server
+    """
+    def send(message):
+        wfile.write(json.dumps(message) + "\n")
+        wfile.flush()
+
+    send({"type": "hello", "name": name})
+    games = {}
+    try:
+        for line in rfile:
+            message = json.loads(line)
+            if message["type"] == "start":
+                games[message["game"]] = (new_board(message["size"], message["num_players"]), message["uid"])
+            elif message["type"] == "turn":
+                board, uid = games[message["game"]]
+                positions = tuple(tuple(p) for p in message["positions"])
+                orientations = tuple(tron.Orientation(o) for o in message["orientations"])
+                # heads become trails like Tron._update
+                for idx, (y, x) in enumerate(positions):
+                    board[y, x, idx + 1] = 1
+                move = agent.generate_move(board, positions, orientations, uid)
+                send({"game": message["game"], "step": message["step"], "move": int(move)})
+            elif message["type"] == "end":
+                games.pop(message["game"], None)
+    except (BrokenPipeError, ConnectionResetError):
+        # server went away
+        return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TRON bot client - run an agent module against server.py")
+    parser.add_argument('agent', type=str, help="module to use, e.g. agent.wallhugger")
+    parser.add_argument('--connect', type=str, default=None, help="TCP host:port of the server")
+    parser.add_argument('--unix', type=str, default=None, help="Unix socket path of the server")
+    parser.add_argument('--name', type=str, default=None, help="Bot name - defaults to the agent module")
+    args = parser.parse_args()
+
+    agent = importlib.import_module(args.agent)
+    name = args.name if args.name else args.agent
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        sock = socket.create_connection((host, int(port)))
+    elif args.unix:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(args.unix)
+    else:
+        # persistent subprocess of the server
+        play(agent, sys.stdin, sys.stdout, name)
+        sys.exit()
+
+    with sock, sock.makefile("r") as rfile, sock.makefile("w") as wfile:
+        play(agent, rfile, wfile, name)
@@ -0,0 +1,242 @@
+"""Catalog of saved games in sqlite
+
+Saved games are summarized into two tables so aggregate questions are
+answered by one SQL query instead of loading every game file
+
+    games: path, mtime, size, players, length, map, resolution
+    players: game_id, uid, agent, length, status, status_name, total_reward,
+        survived
+
+Files are parsed in a process pool and written in one transaction. Ingest is
+incremental - files already in the catalog with the same modification time
+are skipped, changed files are replaced, and files that are not games are
+remembered so they are not parsed again.
+
+    python catalog.py ingest games/ --db tron_games.db
+    python catalog.py summary --size 50 --uid 2 --status CRASH_INTO_TAIL
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+import tron
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER,
+    players INTEGER,
+    length INTEGER,
+    map TEXT,
+    resolution TEXT
+);
+CREATE TABLE IF NOT EXISTS players (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    uid INTEGER NOT NULL,
+    agent TEXT,
+    length INTEGER,
+    status INTEGER,
+    status_name TEXT,
+    total_reward REAL,
+    survived INTEGER,
+    PRIMARY KEY (game_id, uid)
+);
+CREATE TABLE IF NOT EXISTS skipped (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_size ON games(size, players);
+CREATE INDEX IF NOT EXISTS players_status ON players(uid, status);
+CREATE INDEX IF NOT EXISTS players_agent ON players(agent);
+"""
+
+
+def summarize_game(path: str) -> Optional[Dict[str, Any]]:
+    """Game and player summary rows of a saved game - None if it is not a game
+
+    Reads the JSON directly instead of Tron.load so the grid never becomes
+    an array.
+    """
+    try:
+        with open(path, "r") as file:
+            data = json.load(file)
+        states = data["states"]
+        size = data["board"]["shape"][0] if "board" in data else len(data["grid"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    agents = data.get("agents") or [None] * len(states)
+    players = []
+    for uid, (state, agent) in enumerate(zip(states, agents), start=1):
+        status = int(state["status"][-1]) if state["status"] else int(tron.Status.VALID)
+        players.append({"uid": uid, "agent": agent, "length": len(state["actions"]), "status": status,
+                        "status_name": tron.Status(status).name, "total_reward": float(sum(state["rewards"])),
+                        "survived": int(status == tron.Status.VALID)})
+    resolution = data.get("resolution")
+    return {"path": path, "mtime": os.path.getmtime(path), "size": size, "players": len(states),
+            "length": max((p["length"] for p in players), default=0), "map": data.get("map"),
+            "resolution": resolution["mode"] if resolution else None, "player_rows": players}
+
+
+def _expand(paths: list[str]) -> list[str]:
+    """Files from files, directories (their *.json) and glob patterns"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*.json")))
+        else:
+            files.extend(glob.glob(path) if glob.has_magic(path) else [path])
+    return sorted(set(os.path.abspath(f) for f in files))
+
+
+class Catalog:
+    """sqlite catalog of saved games"""
+
+    def __init__(self, filename: str = "tron_games.db"):
+        """Constructor
+
+        Args:
+            filename (str): sqlite database - created if missing. ":memory:"
+                for a throwaway catalog
+        """
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _known(self) -> dict[str, float]:
+        """path -> mtime of every file the catalog has seen"""
+        rows = self.connection.execute("SELECT path, mtime FROM games UNION ALL SELECT path, mtime FROM skipped")
+        return dict(rows.fetchall())
+
+    def ingest(self, paths: list[str], workers: Optional[int] = None, chunksize: int = 16) -> tuple[int, int]:
+        """Add new and changed game files
+
+        Args:
+            paths (list): files, directories or glob patterns
+            workers (int): number of processes - defaults to the number of
+                CPUs. 1 parses in this process
+            chunksize (int): files per pool task
+
+        Returns:
+            added (int): games added or replaced
+            skipped (int): new files that are not games
+        """
+        known = self._known()
+        files = [f for f in _expand(paths) if known.get(f) != os.path.getmtime(f)]
+        if not files:
+            return 0, 0
+        if workers == 1 or len(files) < 2 * chunksize:
+            summaries = list(map(summarize_game, files))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                summaries = list(executor.map(summarize_game, files, chunksize=chunksize))
+
+        added = skipped = 0
+        with self.connection:
+            # changed files are replaced - players go with the cascade
+            self.connection.executemany("DELETE FROM games WHERE path = ?", [(f,) for f in files])
+            self.connection.executemany("DELETE FROM skipped WHERE path = ?", [(f,) for f in files])
+            for path, summary in zip(files, summaries):
+                if summary is None:
+                    self.connection.execute("INSERT INTO skipped (path, mtime) VALUES (?, ?)",
+                                            (path, os.path.getmtime(path)))
+                    skipped += 1
+                    continue
+                cursor = self.connection.execute(
+                    "INSERT INTO games (path, mtime, size, players, length, map, resolution) "
+                    "VALUES (:path, :mtime, :size, :players, :length, :map, :resolution)", summary)
+                self.connection.executemany(
+                    "INSERT INTO players (game_id, uid, agent, length, status, status_name, total_reward, survived) "
+                    "VALUES (:game_id, :uid, :agent, :length, :status, :status_name, :total_reward, :survived)",
+                    [{**row, "game_id": cursor.lastrowid} for row in summary["player_rows"]])
+                added += 1
+        return added, skipped
+
+    def prune(self) -> int:
+        """Drop games whose file no longer exists - returns the number dropped"""
+        missing = [(path,) for path in self._known() if not os.path.exists(path)]
+        with self.connection:
+            self.connection.executemany("DELETE FROM games WHERE path = ?", missing)
+            self.connection.executemany("DELETE FROM skipped WHERE path = ?", missing)
+        return len(missing)
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        """Run any SQL against the catalog"""
+        return self.connection.execute(sql, params).fetchall()
+
+    def summary(self, size: Optional[int] = None, players: Optional[int] = None, uid: Optional[int] = None,
+                status: Optional[str] = None, agent: Optional[str] = None) -> Dict[str, float]:
+        """Aggregate over the player rows matching every given filter
+
+        Args:
+            size (int): board size
+            players (int): players per game
+            uid (int): player uid
+            status (str): final Status name, e.g. CRASH_INTO_TAIL
+            agent (str): agent module or learner name
+
+        Returns:
+            summary (dict): games, mean_length (game), mean_player_length,
+                mean_reward and survival rate of the matching players
+        """
+        filters = {"g.size": size, "g.players": players, "p.uid": uid, "p.status_name": status, "p.agent": agent}
+        where = [f"{column} = ?" for column, value in filters.items() if value is not None]
+        params = tuple(value for value in filters.values() if value is not None)
+        row = self.connection.execute(
+            "SELECT COUNT(DISTINCT g.id), AVG(g.length), AVG(p.length), AVG(p.total_reward), AVG(p.survived) "
+            "FROM players p JOIN games g ON g.id = p.game_id" + (" WHERE " + " AND ".join(where) if where else ""),
+            params).fetchone()
+        return dict(zip(("games", "mean_length", "mean_player_length", "mean_reward", "survival"), row))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TRON CATALOG - Index saved games in sqlite")
+    parser.add_argument('--db', type=str, default="tron_games.db", help="Catalog database - default tron_games.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Add new and changed games")
+    ingest_parser.add_argument('paths', nargs='+', help="Game files, directories or glob patterns")
+    ingest_parser.add_argument('--workers', '-w', type=int, default=None, help="Number of processes - default all CPUs")
+    ingest_parser.add_argument('--prune', action='store_true', help="Drop games whose file is gone")
+
+    summary_parser = commands.add_parser("summary", help="Aggregate over matching players")
+    summary_parser.add_argument('--size', '-s', type=int, default=None, help="Board size")
+    summary_parser.add_argument('--players', '-p', type=int, default=None, help="Players per game")
+    summary_parser.add_argument('--uid', type=int, default=None, help="Player uid")
+    summary_parser.add_argument('--status', type=str, choices=[s.name for s in tron.Status], default=None,
+                                help="Final status of the player")
+    summary_parser.add_argument('--agent', type=str, default=None, help="Agent module or learner name")
+
+    query_parser = commands.add_parser("query", help="Run SQL against the catalog")
+    query_parser.add_argument('sql', type=str, help="SQL over the games and players tables")
+    args = parser.parse_args()
+
+    with Catalog(args.db) as catalog:
+        if args.command == "ingest":
+            if args.prune:
+                print(f"Pruned {catalog.prune()} missing games")
+            added, skipped = catalog.ingest(args.paths, workers=args.workers)
+            print(f"Added {added} games, skipped {skipped} other files")
+        elif args.command == "summary":
+            for key, value in catalog.summary(size=args.size, players=args.players, uid=args.uid,
+                                              status=args.status, agent=args.agent).items():
+                print(f"{key}: {value}")
+        else:
+            for row in catalog.query(args.sql):
+                print(*row, sep="\t")
@@ -0,0 +1,18 @@
+"""Player colors shared by the pygame interface and the headless exports
+
+Plain RGB tuples, so export.py and mosaic.py color frames without importing
+pygame. Each pair is a dark head and a light tail color - the 4 and 1
+variants of the pygame color names noted per line.
+"""
+
+COLOR_PAIRS = [((0, 0, 139), (0, 0, 255)),  # blue
+               ((139, 0, 0), (255, 0, 0)),  # red
+               ((139, 69, 0), (255, 127, 0)),  # darkorange
+               ((104, 34, 139), (191, 62, 255)),  # darkorchid
+               ((69, 139, 116), (127, 255, 212)),  # aquamarine
+               ((139, 35, 35), (255, 64, 64)),  # brown
+               ((83, 134, 139), (152, 245, 255)),  # cadetblue
+               ((69, 139, 0), (127, 255, 0)),  # chartreuse
+               ((139, 62, 47), (255, 114, 86)),  # coral
+               ((0, 139, 139), (0, 255, 255)),  # cyan
+               ((139, 101, 8), (255, 185, 15))]  # darkgoldenrod
@@ -0,0 +1,145 @@
+"""Convergence tracking and early stopping for the learners
+
+The tracker is fed once per finished episode with the game stats of the
+episode and how much the action values moved. It keeps running measures
+
+    delta_q: max |Q_new - Q_old| since the previous episode
+    coverage: fraction of state-action entries that have been visited
+    rolling_length / rolling_reward: mean over the last window episodes
+
+and says when to stop:
+
+    tol: max delta_q over the last window episodes is below tol
+    patience: the rolling reward has not improved by more than min_delta
+        for patience episodes
+
+Tabular learners know which entries they updated, so they pass max |dQ| and
+the visit coverage straight to record - no per episode pass over the table.
+For approximators update diffs the action values of a fixed probe batch of
+states against the previous episode.
+"""
+from collections import deque
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+class ConvergenceTracker:
+    """Running learning measures with early stopping rules"""
+
+    def __init__(self, window: int = 100, tol: Optional[float] = None, patience: Optional[int] = None,
+                 min_delta: float = 0.0, min_episodes: int = 0):
+        """Constructor
+
+        Args:
+            window (int): episodes K for the delta_q rule and the rolling means
+            tol (float): stop when max delta_q over the last window episodes
+                is below tol - None to disable
+            patience (int): stop after patience episodes without a rolling
+                reward improvement - None to disable
+            min_delta (float): smallest rolling reward gain that counts
+            min_episodes (int): never stop before this many episodes
+        """
+        self.window = window
+        self.tol = tol
+        self.patience = patience
+        self.min_delta = min_delta
+        self.min_episodes = min_episodes
+
+        self.episodes = 0
+        self.delta_q: deque = deque(maxlen=window)
+        self.lengths: deque = deque(maxlen=window)
+        self.rewards: deque = deque(maxlen=window)
+        self.best_reward = -np.inf
+        self.since_best = 0
+        self.coverage = np.nan
+        self.reason: Optional[str] = None
+        self.history: list[Dict[str, float]] = []
+        self._previous: Optional[np.ndarray] = None
+
+    @property
+    def rolling_length(self) -> float:
+        return float(np.mean(self.lengths)) if self.lengths else np.nan
+
+    @property
+    def rolling_reward(self) -> float:
+        return float(np.mean(self.rewards)) if self.rewards else np.nan
+
+    def update(self, q_values: np.ndarray, game_stats: Dict[str, Any],
+               visits: Optional[np.ndarray] = None) -> bool:
+        """Record a finished episode from the current action values
+
+        Args:
+            q_values (np.array): probe batch (or full table) action values -
+                copied and diffed against the previous episode
+            game_stats (dict): stats of the episode - see Tron.get_game_stats
+            visits (np.array): per entry visit counts or a visited mask for
+                the coverage - None leaves it unchanged
+
+        Returns:
+            stop (bool): True once a stopping rule fired - see reason
+        """
+        if self._previous is None or self._previous.shape != q_values.shape:
+            self._previous = np.array(q_values, dtype=float)
+            delta = np.inf
+        else:
+            delta = float(np.max(np.abs(q_values - self._previous))) if q_values.size else 0.0
+            self._previous[...] = q_values
+        coverage = np.count_nonzero(visits) / visits.size if visits is not None else None
+        return self.record(game_stats, delta, coverage)
+
+    def record(self, game_stats: Dict[str, Any], delta_q: float, coverage: Optional[float] = None) -> bool:
+        """Record a finished episode from incrementally tracked measures
+
+        Args:
+            game_stats (dict): stats of the episode - see Tron.get_game_stats
+            delta_q (float): max |Q_new - Q_old| over the entries updated
+                since the previous episode
+            coverage (float): fraction of visited state-action entries - None
+                leaves it unchanged
+
+        Returns:
+            stop (bool): True once a stopping rule fired - see reason
+        """
+        self.episodes += 1
+        self.delta_q.append(delta_q)
+        if coverage is not None:
+            self.coverage = coverage
+
+        self.lengths.append(game_stats["num_actions"])
+        self.rewards.append(game_stats["total_reward"])
+        # the rolling reward only counts once the window is full
+        if len(self.rewards) == self.window:
+            if self.rolling_reward > self.best_reward + self.min_delta:
+                self.best_reward = self.rolling_reward
+                self.since_best = 0
+            else:
+                self.since_best += 1
+
+        self.history.append({"episode": self.episodes, "delta_q": delta_q, "coverage": self.coverage,
+                             "rolling_length": self.rolling_length, "rolling_reward": self.rolling_reward})
+        return self.should_stop()
+
+    def should_stop(self) -> bool:
+        """Check the stopping rules - the first one that fired is kept in reason"""
+        if self.reason is not None:
+            return True
+        if self.episodes < max(self.min_episodes, 1):
+            return False
+        if self.tol is not None and len(self.delta_q) == self.window and max(self.delta_q) < self.tol:
+            self.reason = f"max |dQ| below {self.tol} for {self.window} episodes"
+        elif self.patience is not None and self.since_best >= self.patience:
+            self.reason = f"no rolling reward improvement for {self.patience} episodes"
+        return self.reason is not None
+
+    def summary(self) -> str:
+        """One line progress report"""
+        delta = self.delta_q[-1] if self.delta_q else np.nan
+        return (f"max |dQ| {delta:.4g} | coverage {self.coverage:.1%} | "
+                f"rolling length {self.rolling_length:.1f} | rolling reward {self.rolling_reward:.2f}")
+
+
+def probe_states(feature_sizes, num_states: int = 1024, seed: int = 0) -> np.ndarray:
+    """Fixed random batch of states to measure approximator value changes on"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, np.asarray(feature_sizes), size=(num_states, len(feature_sizes)))
@@ -0,0 +1,233 @@
+"""Evaluate a saved learner policy against an opponent lineup
+
+The greedy policy (epsilon = 0) from a saved Q table or approximator plays
+as uid=1 against the opponents in a process pool. Games are played in seeded
+chunks and the evaluation stops as soon as the confidence interval of every
+outcome rate is tighter than the requested precision, so clear-cut matchups
+finish after few games. Chunks finish in any order, but the stopping rule
+only ever sees the games of the contiguous prefix of finished chunks, so a
+seed gives the same report whatever the pool timing.
+
+Outcomes are from the learner's side - the game ends on the first crash
+
+    win: the learner is still moving
+    draw: the learner crashed together with every opponent
+    loss: the learner crashed while an opponent is still moving
+
+Rates use Wilson score intervals and the mean survival length a normal
+interval.
+"""
+import argparse
+import importlib
+import itertools
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from statistics import NormalDist
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import actor_learner
+import maps
+import tron
+from agent.util import build_agent_list
+
+OUTCOMES = ("win", "draw", "loss")
+
+# policy and game settings of a pool worker - set by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def load_policy(filename: str) -> Dict[str, Any]:
+    """Load a saved Q table or approximator as a policy snapshot - see actor_learner.snapshot"""
+    data = np.load(filename)
+    if "q_table" in data:
+        return {"q_table": data["q_table"]}
+    kind = "tiles" if "weights" in data else "mlp"
+    return {"approximator": kind, "state": {k: data[k] for k in data.files}}
+
+
+def wilson_interval(successes: int, n: int, z: float) -> tuple[float, float]:
+    """Wilson score interval of a rate"""
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    center = (p + z**2 / (2 * n)) / (1 + z**2 / n)
+    half = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / (1 + z**2 / n)
+    # the interval always holds p - clamp away rounding at 0 and 1
+    return max(min(center - half, p), 0.0), min(max(center + half, p), 1.0)
+
+
+def _init_worker(policy: Dict[str, Any], config: Dict[str, Any]) -> None:
+    sizes = tron.Tron.state_sizes(config["features"], config["vision_grid_size"])
+    _worker["policy"] = actor_learner.SnapshotPolicy(0.0, sizes)
+    _worker["policy"].load(policy)
+    _worker["opponents"] = [importlib.import_module(a) for a in config["agents"]]
+    _worker["config"] = config
+    _worker["game_map"] = maps.resolve(config["game_map"], config["size"])
+
+
+def _play_games(seed: int, num_games: int) -> list[Dict[str, Any]]:
+    """Play num_games games seeded with the children spawned from seed in a pool worker"""
+    policy, opponents, config = _worker["policy"], _worker["opponents"], _worker["config"]
+    directions = [tron.Turn.LEFT_90, tron.Turn.STRAIGHT, tron.Turn.RIGHT_90]
+    results = []
+    for game_seed in np.random.SeedSequence(seed).spawn(num_games):
+        game = tron.Tron(size=config["size"], num_players=config["players"], game_map=_worker["game_map"],
+                         seed=game_seed)
+        observation = game.reset()
+        done = False
+        while not done:
+            s = np.asarray(game.get_state(uid=1, features=config["features"], size=config["vision_grid_size"]))
+            moves = [directions[policy.select(s)]] + [am.generate_move(observation['board'], observation['positions'],
+                                                                      observation['orientations'], uid,
+                                                                      legal_moves=observation['legal_moves'][uid],
+                                                                      rng=game.player_rngs[uid])
+                                                      for uid, am in enumerate(opponents, start=1)]
+            observation, done, status, reward = game.move(*moves)
+
+        stats = game.get_game_stats(uid=1)
+        if game.status[0] == tron.Status.VALID:
+            outcome = "win"
+        elif np.all(game.status[1:] != tron.Status.VALID):
+            outcome = "draw"
+        else:
+            outcome = "loss"
+        results.append({"outcome": outcome, "length": stats["num_actions"], "reward": stats["total_reward"],
+                        "crash_flag": int(stats["crash_flag"])})
+    return results
+
+
+def summarize(results: list[Dict[str, Any]], confidence: float = 0.95) -> Dict[str, Any]:
+    """Rates, crash breakdown and mean survival length with confidence intervals
+
+    Returns:
+        report (dict): games, outcomes {name: (rate, low, high)}, crashes
+            {Status name: (rate, low, high)}, length (mean, half width),
+            reward (mean, half width) and precision - the widest rate half width
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    n = len(results)
+
+    def rate(count):
+        low, high = wilson_interval(count, n, z)
+        return count / max(n, 1), low, high
+
+    outcomes = {o: rate(sum(r["outcome"] == o for r in results)) for o in OUTCOMES}
+    crashes = {s.name: rate(sum(r["crash_flag"] == s for r in results)) for s in tron.Status}
+
+    def mean(key):
+        values = np.array([r[key] for r in results], dtype=float)
+        half = z * values.std(ddof=1) / math.sqrt(n) if n > 1 else math.inf
+        return (float(values.mean()) if n else math.nan), half
+
+    return {"games": n, "confidence": confidence, "outcomes": outcomes, "crashes": crashes,
+            "length": mean("length"), "reward": mean("reward"),
+            "precision": max((high - low) / 2 for _, low, high in outcomes.values())}
+
+
+def evaluate(filename: str, size: int = 25, players: int = 2, agents: list[str] = ['agent.wallhugger'],
+             features: str = "vision", vision_grid_size: int = 3, precision: float = 0.05,
+             confidence: float = 0.95, min_games: int = 100, max_games: int = 5000,
+             chunk_games: int = 20, workers: Optional[int] = None, seed: int = 0,
+             game_map: Optional[str] = None) -> Dict[str, Any]:
+    """Play the greedy policy until the outcome rates are known to +- precision
+
+    Args:
+        filename (str): saved Q table or approximator .npz from a trainer
+        size (int): size of the game grid
+        players (int): players per game - the policy is uid=1
+        agents (list): opponent modules
+        features (str): learner state the policy was trained on - see tron.FEATURES
+        vision_grid_size (int): vision grid size the policy was trained on
+        precision (float): stop once every outcome rate interval half width is below this
+        confidence (float): confidence level of the intervals
+        min_games (int): games played before the stopping rule is checked
+        max_games (int): hard limit on the number of games
+        chunk_games (int): games per pool task
+        workers (int): number of processes - defaults to the number of CPUs
+        seed (int): chunk idx is seeded with seed + idx
+        game_map (str): map file or random spec - see maps.resolve
+
+    Returns:
+        report (dict): see summarize
+    """
+    config = {"size": size, "players": players, "agents": build_agent_list(players - 1, agents),
+              "features": features, "vision_grid_size": vision_grid_size, "game_map": game_map}
+    policy = load_policy(filename)
+    expected = tuple(tron.Tron.state_sizes(features, vision_grid_size))
+    if "q_table" in policy and policy["q_table"].shape[:-1] != expected:
+        raise ValueError(f"Q table shape {policy['q_table'].shape} does not match {features} "
+                         f"features with vision grid {vision_grid_size}")
+
+    workers = workers if workers else os.cpu_count()
+    results: list[Dict[str, Any]] = []
+    # finished chunks waiting for an earlier chunk - chunk idx -> results
+    finished: Dict[int, list[Dict[str, Any]]] = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(policy, config)) as executor:
+        # keep every worker busy - a couple of chunks queued per process
+        in_flight = 2 * workers
+        chunks = iter(range(math.ceil(max_games / chunk_games)))
+        pending = {executor.submit(_play_games, seed + idx, chunk_games): idx
+                   for idx in itertools.islice(chunks, in_flight)}
+        next_chunk = 0
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[pending.pop(future)] = future.result()
+            # results hold chunks 0, 1, 2, ... in order - the rule is checked after each
+            stop = False
+            while next_chunk in finished and not stop:
+                results.extend(finished.pop(next_chunk))
+                next_chunk += 1
+                report = summarize(results[:max_games], confidence)
+                stop = len(results) >= max_games or (len(results) >= min_games and report["precision"] <= precision)
+            if stop:
+                for future in pending:
+                    future.cancel()
+                break
+            for idx in chunks:
+                pending[executor.submit(_play_games, seed + idx, chunk_games)] = idx
+                if len(pending) >= in_flight:
+                    break
+    return summarize(results[:max_games], confidence)
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['games']} games, {report['confidence']:.0%} intervals")
+    for name, (rate, low, high) in report["outcomes"].items():
+        print(f"    {name}: {rate:.1%} [{low:.1%}, {high:.1%}]")
+    print("Crash Flag:")
+    for name, (rate, low, high) in report["crashes"].items():
+        if rate > 0:
+            print(f"    {name}: {rate:.1%} [{low:.1%}, {high:.1%}]")
+    print("Survival length: {:.1f} +- {:.1f}".format(*report["length"]))
+    print("Total reward: {:.1f} +- {:.1f}".format(*report["reward"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TRON EVALUATE - Greedy policy win rates with confidence intervals")
+    parser.add_argument('filename', type=str, help="Saved Q table or approximator .npz")
+    parser.add_argument('--players', '-p', type=int, default=2, help="Number of players - default 2")
+    parser.add_argument('--size', '-s', type=int, default=25, help="Size of game grid - default 25")
+    parser.add_argument('--vision_grid', '-v', type=int, default=3, help="Vision grid the policy was trained on - default 3")
+    parser.add_argument('--features', type=str, choices=tron.FEATURES, default="vision",
+                        help="Learner state the policy was trained on - default vision")
+    parser.add_argument('--precision', type=float, default=0.05, help="Target interval half width - default 0.05")
+    parser.add_argument('--confidence', type=float, default=0.95, help="Confidence level - default 0.95")
+    parser.add_argument('--min_games', type=int, default=100, help="Games before stopping is checked - default 100")
+    parser.add_argument('--max_games', type=int, default=5000, help="Maximum number of games - default 5000")
+    parser.add_argument('--workers', '-w', type=int, default=None, help="Number of processes - default all CPUs")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the first chunk of games - default 0")
+    parser.add_argument('--map', type=str, default=None,
+                        help="Map file or random[:density[:seed]] - default open board")
+    parser.add_argument('--agents', '-a', nargs='*', default=['agent.wallhugger'],
+                        help="Opponent modules - default agent.wallhugger")
+    args = parser.parse_args()
+
+    print_report(evaluate(args.filename, size=args.size, players=args.players, agents=args.agents,
+                          features=args.features, vision_grid_size=args.vision_grid, precision=args.precision,
+                          confidence=args.confidence, min_games=args.min_games, max_games=args.max_games,
+                          workers=args.workers, seed=args.seed, game_map=args.map))
@@ -0,0 +1,229 @@
+"""Headless export of saved games to PNG sequences, GIFs or video
+
+Frames are built as a small array of palette indices per cell that is
+updated in place every step, then colored with a single lookup table
+index and scaled up with np.repeat - no display or pygame surface needed.
+
+PNG sequences need nothing beyond NumPy. GIFs need Pillow and video needs
+OpenCV (like examples/pygame_recorder.py) or an ffmpeg binary on the path.
+Files are spread over a process pool.
+"""
+import argparse
+import os
+import shutil
+import struct
+import subprocess
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, Optional
+
+import numpy as np
+
+import tron
+from board import SparseBoard
+from colors import COLOR_PAIRS
+
+FORMATS = ("png", "gif", "video")
+
+# palette indices - players use 2 + 2 * idx (tail) and 3 + 2 * idx (head)
+FREE, WALL = 0, 1
+WHITE, BLACK = (255, 255, 255), (0, 0, 0)
+
+
+def palette(num_players: int) -> np.ndarray:
+    """Color lookup table for frame labels
+
+    Returns:
+        lut (np.array): (2 + 2 * num_players) x 3 uint8 RGB colors
+    """
+    colors = [WHITE, BLACK]
+    for idx in range(num_players):
+        head, tail = COLOR_PAIRS[idx % len(COLOR_PAIRS)]
+        colors.extend([tail, head])
+    return np.array(colors, dtype=np.uint8)
+
+
+def iter_frames(grid, states: list, cellsize: int = 4, every: int = 1) -> Iterator[np.ndarray]:
+    """Render a saved game step by step
+
+    Matches replay.py - frame n shows the first n states of every player with
+    the latest one as the head.
+
+    Args:
+        grid (np.array or SparseBoard): board from tron.Tron.load
+        states (list): player states from tron.Tron.load
+        cellsize (int): pixels per board cell
+        every (int): yield every n-th frame - the final frame is always yielded
+
+    Yields:
+        frame (np.array): rows*cellsize x cols*cellsize x 3 uint8 RGB image
+    """
+    walls = grid.toarray()[:, :, 0] if isinstance(grid, SparseBoard) else np.asarray(grid)[:, :, 0]
+    labels = np.where(walls > 0, WALL, FREE).astype(np.uint8)
+    lut = palette(len(states))
+    num_steps = max(len(p["y"]) for p in states)
+
+    for step in range(1, num_steps + 1):
+        for idx, p in enumerate(states):
+            if step > len(p["y"]):
+                continue
+            if step > 1:
+                labels[p["y"][step - 2], p["x"][step - 2]] = 2 + 2 * idx
+            labels[p["y"][step - 1], p["x"][step - 1]] = 3 + 2 * idx
+
+        if step % every == 0 or step == num_steps:
+            image = lut[labels]
+            yield np.repeat(np.repeat(image, cellsize, axis=0), cellsize, axis=1)
+
+
+def write_png(filename: str, image: np.ndarray) -> None:
+    """Write an RGB uint8 image as a PNG with zlib only"""
+    height, width = image.shape[0], image.shape[1]
+    # filter type 0 byte in front of every row
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8),
+                          image.reshape(height, width * 3)], axis=1).tobytes()
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(filename, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(raw, 6)))
+        file.write(chunk(b"IEND", b""))
+
+
+def _write_gif(filename: str, frames: Iterator[np.ndarray], fps: int) -> None:
+    from PIL import Image
+
+    images = [Image.fromarray(f) for f in frames]
+    images[0].save(filename, save_all=True, append_images=images[1:],
+                   duration=int(1000 / fps), loop=0)
+
+
+def _write_video(filename: str, frames: Iterator[np.ndarray], fps: int) -> None:
+    try:
+        import cv2
+    except ImportError:
+        cv2 = None
+
+    first = next(frames)
+    height, width = first.shape[0], first.shape[1]
+    if cv2 is not None:
+        video = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*"mp4v"), float(fps), (width, height))
+        for frame in (first, *frames):
+            video.write(frame[:, :, ::-1])  # RGB to BGR
+        video.release()
+        return
+
+    # stream raw frames into ffmpeg
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+               "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+               "-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", filename]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    for frame in (first, *frames):
+        process.stdin.write(frame.tobytes())
+    process.stdin.close()
+    if process.wait():
+        raise RuntimeError(f"ffmpeg failed writing {filename}")
+
+
+def check_format(fmt: str) -> None:
+    """Raise if the encoder for fmt is not available"""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+    if fmt == "gif":
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise RuntimeError("GIF export needs Pillow")
+    elif fmt == "video":
+        try:
+            import cv2  # noqa: F401
+        except ImportError:
+            if shutil.which("ffmpeg") is None:
+                raise RuntimeError("Video export needs OpenCV or ffmpeg")
+
+
+def export_game(filename: str, out_dir: str = "frames", fmt: str = "png", cellsize: int = 4,
+                every: int = 1, fps: int = 30) -> list[str]:
+    """Render one saved game
+
+    Args:
+        filename (str): saved game from tron.Tron.save
+        out_dir (str): directory for the output
+        fmt (str): "png" for a directory of frames, "gif" or "video" (mp4)
+        cellsize (int): pixels per board cell
+        every (int): keep every n-th frame
+        fps (int): frame rate of GIFs and videos
+
+    Returns:
+        outputs (list): files written
+    """
+    grid, states = tron.Tron.load(filename)
+    frames = iter_frames(grid, states, cellsize=cellsize, every=every)
+    name = os.path.splitext(os.path.basename(filename))[0]
+    os.makedirs(out_dir, exist_ok=True)
+
+    if fmt == "png":
+        frame_dir = os.path.join(out_dir, name)
+        os.makedirs(frame_dir, exist_ok=True)
+        outputs = []
+        for idx, frame in enumerate(frames):
+            outputs.append(os.path.join(frame_dir, f"frame_{idx:05d}.png"))
+            write_png(outputs[-1], frame)
+        return outputs
+    elif fmt == "gif":
+        output = os.path.join(out_dir, name + ".gif")
+        _write_gif(output, frames, fps)
+    else:
+        output = os.path.join(out_dir, name + ".mp4")
+        _write_video(output, frames, fps)
+    return [output]
+
+
+def export_games(filenames: list[str], out_dir: str = "frames", fmt: str = "png", cellsize: int = 4,
+                 every: int = 1, fps: int = 30, workers: Optional[int] = None) -> dict[str, list[str]]:
+    """Render many saved games in a process pool
+
+    Args:
+        filenames (list): saved games
+        workers (int): number of processes - defaults to the number of CPUs
+        remaining: see export_game
+
+    Returns:
+        outputs (dict): filename -> files written. Games that failed to
+            render map to an empty list
+    """
+    check_format(fmt)
+    outputs = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(export_game, f, out_dir, fmt, cellsize, every, fps): f
+                   for f in filenames}
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                outputs[filename] = future.result()
+            except Exception as error:
+                print(f"Failed to export {filename}: {error}")
+                outputs[filename] = []
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TRON EXPORT - Render saved games headless to images or video")
+    parser.add_argument("save_games", nargs="+", help="Saved game files", type=str)
+    parser.add_argument("--out_dir", "-o", type=str, default="frames", help="Output directory")
+    parser.add_argument("--format", "-f", type=str, choices=FORMATS, default="png",
+                        help="png frame sequence, gif (Pillow) or mp4 video (OpenCV or ffmpeg)")
+    parser.add_argument("--cellsize", type=int, default=4, help="Pixels per board cell")
+    parser.add_argument("--every", type=int, default=1, help="Keep every n-th frame")
+    parser.add_argument("--fps", type=int, default=30, help="Frame rate of gif and video output")
+    parser.add_argument("--workers", "-w", type=int, default=None, help="Number of processes")
+    args = parser.parse_args()
+
+    outputs = export_games(args.save_games, out_dir=args.out_dir, fmt=args.format,
+                           cellsize=args.cellsize, every=args.every, fps=args.fps,
+                           workers=args.workers)
+    print("Exported {} of {} games to {}".format(sum(1 for o in outputs.values() if o),
+                                                 len(outputs), args.out_dir))
@@ -6,20 +6,10 @@ import importlib
 
 import tron
 from agent import dumb
-from agent.util import build_agent_list
+from agent.util import build_agent_list, BackgroundMoves
+from colors import COLOR_PAIRS
 
 COLORS = {key:value[0:3] for key, value in pygame.colordict.THECOLORS.items()}
-COLOR_PAIRS =  [(COLORS['blue4'], COLORS['blue1']),
-                (COLORS['red4'], COLORS['red1']),
-                (COLORS['darkorange4'], COLORS['darkorange1']),
-                (COLORS['darkorchid4'], COLORS['darkorchid1']),
-                (COLORS['aquamarine4'],COLORS['aquamarine1']),
-                (COLORS['brown4'], COLORS['brown1']),
-                (COLORS['cadetblue4'], COLORS['cadetblue1']),
-                (COLORS['chartreuse4'], COLORS['chartreuse1']),
-                (COLORS['coral4'], COLORS['coral1']),
-                (COLORS['cyan4'], COLORS['cyan1']),
-                (COLORS['darkgoldenrod4'], COLORS['darkgoldenrod1'])]
 class Text():
 
     def __init__(self,size=16):
@@ -31,7 +21,7 @@ class Text():
 class UserInterface():
 
     def __init__(self, size=100, num_players=2, width=800, human=True, 
-                 record=False, fps=15, agents=['agents.dumb']):
+                 record=False, fps=15, agents=['agents.dumb'], deadline=None):
 
         pygame.init()
         # TODO - define colors for the total number of players in game - dark variants for head
@@ -47,6 +37,12 @@ class UserInterface():
         agent_list = build_agent_list(self.num_players, self.agents)
         self.agent_modules = [importlib.import_module(a) for a in agent_list]
 
+        # AI players think in the background so the loop never waits longer
+        # than the deadline (half a frame by default) for their moves
+        self.ai_uids = list(range(1 if self.human else 0, self.num_players))
+        self.thinker = BackgroundMoves([self.agent_modules[uid] for uid in self.ai_uids],
+                                       deadline=deadline if deadline is not None else 0.5 / self.FPS)
+
         # intialize game
         self._reset()
 
@@ -83,7 +79,6 @@ class UserInterface():
         # build obstacles
         self.image[board[:,:,0] == 1] = COLORS['black']
         self.surf = pygame.Surface((self.image.shape[0], self.image.shape[1]))
-        self.scaled_surf = pygame.Surface((self.WIDTH, self.HEIGHT))
         # text object
         self.position_text = Text(size=16)
 
@@ -91,6 +86,20 @@ class UserInterface():
         pygame.display.set_caption('Tron')
         self.clock = pygame.time.Clock()
 
+        # persistent scaled board - only changed cells are repainted
+        self.board_surf = pygame.Surface((self.WIDTH, self.HEIGHT))
+        # grid lines are drawn once and reapplied to repainted cells
+        self.grid_overlay = self._draw_grid(pygame.Surface((self.WIDTH, self.HEIGHT), pygame.SRCALPHA))
+        self.heads = None # heads drawn on board_surf - None forces a full redraw
+        self.text_rect = None
+
+        self._think()
+
+    def _think(self):
+        """Start the AI players on the current observation"""
+        if self.ai_uids and not self.done:
+            self.thinker.submit(self.observation, self.ai_uids, rngs=self.game.player_rngs)
+
 
     def _build_board(self, observation):
         """Turn current game state into surface for pygame"""
@@ -125,6 +134,43 @@ class UserInterface():
         # build surface
         pygame.surfarray.blit_array(self.surf, self.image.swapaxes(0, 1))
 
+    def _draw_cell(self, y, x, color):
+        """Repaint a single cell of the board surface and return its rect"""
+        rect = pygame.Rect(x*self.cellsize, y*self.cellsize, self.cellsize, self.cellsize)
+        self.board_surf.fill(color, rect)
+        self.board_surf.blit(self.grid_overlay, rect, area=rect)
+        return rect
+
+    def _update_board(self, observation):
+        """Bring the board surface up to date with the observation
+
+        Each step only the previous head (now tail) and new head of every
+        player change, so only those cells are repainted. Anything else, like
+        the first frame after a reset, falls back to a full redraw.
+
+        Returns:
+            dirty (list): rects of the board surface that changed
+        """
+        positions = [tuple(p) for p in observation['positions']]
+        if self.heads is None or any(abs(y0 - y) + abs(x0 - x) > 1
+                                     for (y0, x0), (y, x) in zip(self.heads, positions)):
+            self._build_board(observation)
+            pygame.transform.scale(self.surf, (self.WIDTH, self.HEIGHT), self.board_surf)
+            self.board_surf.blit(self.grid_overlay, (0, 0))
+            self.heads = positions
+            return [self.board_surf.get_rect()]
+
+        dirty = []
+        # tails first so a head is never painted over
+        for (y0, x0), (y, x), color_dict in zip(self.heads, positions, self.player_colors):
+            if (y0, x0) != (y, x):
+                dirty.append(self._draw_cell(y0, x0, color_dict['tail']))
+        for (y, x), color_dict in zip(positions, self.player_colors):
+            dirty.append(self._draw_cell(y, x, color_dict['head']))
+
+        self.heads = positions
+        return dirty
+
     def _draw_grid(self, surf):
         """Draw a grid onto the larger surface"""
         
@@ -166,19 +212,14 @@ class UserInterface():
                     print(self.game.players[0].states)
                     
 
-        # first action is human - rest are AI
+        # first action is human - rest are AI moves from the background thinker
+        if self.done or not self.running:
+            return actions
         if self.human is True and action is not None:
             actions.append(action)
-            for uid in range(1, self.num_players):
-                actions.append(self.agent_modules.generate_move(self.observation['board'],
-                                                                self.observation['positions'],
-                                                                self.observation['orientations'],
-                                                                uid))
+            actions.extend(self.thinker.collect())
         elif self.human is False: # all AI players
-            actions = [am.generate_move(self.observation['board'],
-                                        self.observation['positions'],
-                                        self.observation['orientations'],
-                                        uid) for uid, am in enumerate(self.agent_modules)]
+            actions = self.thinker.collect()
         return actions
 
 
@@ -187,24 +228,29 @@ class UserInterface():
         # TODO Figure out what to do about reward
         self.observation, self.done, self.status, reward = self.game.move(*action)
         print(f"Status: {self.status}")
+        self._think()
 
     def render(self, string):
-        # draw surface
-        self._build_board(self.observation)
+        dirty = self._update_board(self.observation)
 
-        pygame.transform.scale(self.surf, (self.WIDTH, self.HEIGHT), self.scaled_surf)
-        self.scaled_surf = self._draw_grid(self.scaled_surf)
+        # restore the board under the previous text
+        if self.text_rect is not None:
+            dirty.append(self.text_rect)
+        for rect in dirty:
+            self.window.blit(self.board_surf, rect, area=rect)
 
         # add text
-        self.scaled_surf.blit(self.position_text.draw(string), (0,0))
+        self.text_rect = None
+        if string:
+            self.text_rect = self.window.blit(self.position_text.draw(string), (0,0))
+            dirty.append(self.text_rect)
 
-        # self.window.fill(UserInterface.COLORS['white'])
-        self.window.blit(self.scaled_surf, (0, 0))
-        pygame.display.update()
+        pygame.display.update(dirty)
 
     
     def _quit(self):
         """Close and quit"""
+        self.thinker.close()
         pygame.quit()
 
     def run(self):
@@ -226,6 +272,8 @@ if __name__ == "__main__":
     parser.add_argument('--interactive', '-i', action='store_true', help="Player 1 is human. If not set then all will be using the same agent.")
     # parser.add_argument('--record', '-r', action='store_true', help='Record the visualization')
     parser.add_argument('--fps', '-f', type=int, default=5, help='Change FPS.')
+    parser.add_argument('--deadline', '-d', type=float, default=None,
+                        help='Seconds per frame the AI gets before a fallback move is used. Defaults to half a frame.')
     
     # TODO add parsing for the AI agent to use for the AI
     parser.add_argument('agents', nargs='*', default=['agent.dumb',], help="module to use, e.g. agent.dumb")
@@ -234,5 +282,5 @@ if __name__ == "__main__":
     args = parser.parse_args()
     ui = UserInterface(size=args.size, num_players=args.players, 
                        human=args.interactive, fps=args.fps,
-                       agents=args.agents)
+                       agents=args.agents, deadline=args.deadline)
     ui.run()
@@ -0,0 +1,142 @@
+"""Live game records that can be followed while they are written
+
+A live record is JSON lines. The first line holds the board and the states
+of every player after reset, then each move appends one line with only the
+state entries added since the previous line:
+
+    {"type": "start", "shape": [rows, cols, layers], "obstacles": [[y, x], ...], "states": [...]}
+    {"type": "step", "states": [{"y": [5], "x": [7], ...}, ...], "done": false}
+
+Sparse games store {"board": SparseBoard.to_dict()} instead of the obstacles.
+The writer flushes every line so replay.py --follow sees it straight away.
+Every Tron.reset starts a new writer that truncates the record, and a reader
+that finds the file shorter than what it already read starts over on the new
+game.
+"""
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import utilities
+from board import SparseBoard
+
+# per step state keys - everything in Player.states except the uid
+STATE_KEYS = ("y", "x", "orientation", "status", "actions", "rewards", "location")
+
+
+class LiveWriter:
+    """Append the moves of a Tron game to a live record"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.file = open(filename, "w")
+        self._written: list[Dict[str, int]] = []
+
+    def _line(self, message: Dict[str, Any]) -> None:
+        self.file.write(json.dumps(message, cls=utilities.NumpyEncoder) + "\n")
+        self.file.flush()
+
+    def start(self, game) -> None:
+        """Write the header for a freshly reset game"""
+        header = {"type": "start"}
+        if isinstance(game.grid, SparseBoard):
+            header["board"] = game.grid.to_dict()
+        else:
+            header["shape"] = game.grid.shape
+            header["obstacles"] = np.argwhere(game.grid[:, :, 0] > 0)
+        header["states"] = [p.states for p in game.players]
+        self._line(header)
+        self._written = [{k: len(p.states[k]) for k in STATE_KEYS} for p in game.players]
+
+    def write(self, game, done: bool = False) -> None:
+        """Append the state entries added since the last line"""
+        states = []
+        for p, written in zip(game.players, self._written):
+            states.append({k: p.states[k][written[k]:] for k in STATE_KEYS})
+            for k in STATE_KEYS:
+                written[k] = len(p.states[k])
+        message = {"type": "step", "states": states, "done": done}
+        if done and getattr(game, "resolution", None) is not None:
+            message["resolution"] = game.resolution
+        self._line(message)
+        if done:
+            self.close()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+
+
+class LiveReader:
+    """Follow a live record like tail -f
+
+    Only lines appended since the last poll are read. A partially written
+    last line is left for the next poll. When the record was rewritten for a
+    new game the reader drops the old one and follows the new game.
+    """
+
+    def __init__(self, filename: str, timeout: float = 10.0):
+        """Constructor - waits up to timeout seconds for the header
+
+        Attributes:
+            grid (np.array or SparseBoard): board at the start of the game
+            states (list): player states - extended in place by poll
+            done (bool): True once the final move was read
+        """
+        self.filename = filename
+        self.grid = None
+        self.states: list[Dict[str, Any]] = []
+        self.done = False
+        self.resolution: Optional[Dict[str, Any]] = None
+        self._offset = 0
+
+        end = time.perf_counter() + timeout
+        while self.grid is None:
+            if os.path.exists(filename):
+                self.poll()
+            if self.grid is None:
+                if time.perf_counter() > end:
+                    raise TimeoutError(f"No live record header in {filename}")
+                time.sleep(0.05)
+
+    def _start(self, header: Dict[str, Any]) -> None:
+        if "board" in header:
+            self.grid = SparseBoard.from_dict(header["board"])
+        else:
+            self.grid = np.zeros(header["shape"], dtype=int)
+            obstacles = np.array(header["obstacles"], dtype=int).reshape(-1, 2)
+            self.grid[obstacles[:, 0], obstacles[:, 1], 0] = 1
+        self.states = header["states"]
+        self.done = False
+        self.resolution = None
+
+    def poll(self) -> int:
+        """Read any new lines
+
+        Returns:
+            lines (int): number of new step lines
+        """
+        lines = 0
+        if os.path.getsize(self.filename) < self._offset:
+            self._offset = 0  # truncated by a reset - read the new game from its header
+        with open(self.filename, "r") as file:
+            file.seek(self._offset)
+            while True:
+                line = file.readline()
+                if not line.endswith("\n"):
+                    break  # nothing new or still being written
+                self._offset = file.tell()
+                message = json.loads(line)
+                if message["type"] == "start":
+                    self._start(message)
+                    continue
+                for state, new in zip(self.states, message["states"]):
+                    for k, values in new.items():
+                        state[k].extend(values)
+                self.done = message["done"]
+                self.resolution = message.get("resolution")
+                lines += 1
+        return lines
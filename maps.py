@@ -0,0 +1,251 @@
+"""Obstacle maps for Tron
+
+A map is a square wall layout stored as text - one character per cell, '#'
+for a wall and '.' for a free cell - so maps are small on disk and easy to
+draw by hand. Maps are loaded from file or generated from a seed, and the
+border is always walled.
+
+Everything that only depends on the walls is computed once per map, on first
+use, and kept on the GameMap
+
+    wall_distance: 4-connected steps from every cell to the nearest wall
+    free_runs: free cells straight ahead of every cell facing N, E, S and W
+    labels / component_sizes: connected free regions
+    spawns: (y, x, orientation) start candidates in the largest region
+
+load, generate and resolve keep every map they build, so all the games and
+training runs of a process share one GameMap per layout instead of
+recomputing these fields per game. Tron places players from spawns and seeds
+its region check from labels instead of flooding the board on the first move.
+"""
+import argparse
+import os
+from functools import cached_property
+from typing import Optional
+
+import numpy as np
+
+import regions
+
+WALL_CHAR, FREE_CHAR = "#", "."
+
+# maps built in this process - see load, generate and resolve
+_CACHE: dict[tuple, "GameMap"] = {}
+
+
+class GameMap:
+    """Wall layout of a square board with cached static fields"""
+
+    def __init__(self, walls: np.ndarray, name: str = "custom"):
+        """Constructor
+
+        Args:
+            walls (np.array): size x size array - truthy cells are walls. The
+                border is walled whatever it holds
+            name (str): name of the map - the file or generator settings
+        """
+        walls = np.array(walls, dtype=bool)
+        if walls.ndim != 2 or walls.shape[0] != walls.shape[1]:
+            raise ValueError(f"Maps must be square - got shape {walls.shape}")
+        walls[[0, -1], :] = True
+        walls[:, [0, -1]] = True
+        walls.flags.writeable = False
+
+        self.walls = walls
+        self.name = name
+        self.size = walls.shape[0]
+
+    @cached_property
+    def wall_distance(self) -> np.ndarray:
+        """4-connected steps from every cell to the nearest wall - 0 on walls"""
+        distance = np.full(self.walls.shape, -1, dtype=int)
+        frontier = self.walls.copy()
+        step = 0
+        while frontier.any():
+            distance[frontier] = step
+            grown = frontier.copy()
+            grown[1:] |= frontier[:-1]
+            grown[:-1] |= frontier[1:]
+            grown[:, 1:] |= frontier[:, :-1]
+            grown[:, :-1] |= frontier[:, 1:]
+            frontier = grown & (distance < 0)
+            step += 1
+        return distance
+
+    @cached_property
+    def free_runs(self) -> np.ndarray:
+        """4 x size x size free cells straight ahead facing N, E, S and W"""
+        free = ~self.walls
+        runs = np.zeros((4,) + self.walls.shape, dtype=int)
+        # free cells ending at each cell, counted from the north and from the west
+        from_north = np.zeros(self.walls.shape, dtype=int)
+        from_south = np.zeros(self.walls.shape, dtype=int)
+        for y in range(1, self.size):
+            from_north[y] = (from_north[y - 1] + 1) * free[y]
+            from_south[-1 - y] = (from_south[-y] + 1) * free[-1 - y]
+        from_west = np.zeros(self.walls.shape, dtype=int)
+        from_east = np.zeros(self.walls.shape, dtype=int)
+        for x in range(1, self.size):
+            from_west[:, x] = (from_west[:, x - 1] + 1) * free[:, x]
+            from_east[:, -1 - x] = (from_east[:, -x] + 1) * free[:, -1 - x]
+        runs[0, 1:] = from_north[:-1]
+        runs[1, :, :-1] = from_east[:, 1:]
+        runs[2, :-1] = from_south[1:]
+        runs[3, :, 1:] = from_west[:, :-1]
+        return runs
+
+    @cached_property
+    def labels(self) -> np.ndarray:
+        """Connected free region of every cell - -1 on walls"""
+        free = bytearray((~self.walls).ravel().tobytes())
+        cell_labels: dict[int, int] = {}
+        count = 0
+        for key in np.flatnonzero(~self.walls.ravel()).tolist():
+            if key not in cell_labels:
+                regions.flood([key], free, self.size, cell_labels, owner=count)
+                count += 1
+        labels = np.full(self.walls.size, -1, dtype=int)
+        labels[list(cell_labels)] = list(cell_labels.values())
+        return labels.reshape(self.walls.shape)
+
+    @cached_property
+    def component_sizes(self) -> np.ndarray:
+        """Number of free cells of every region in labels"""
+        return np.bincount(self.labels[self.labels >= 0])
+
+    @cached_property
+    def spawns(self) -> np.ndarray:
+        """K x 3 (y, x, orientation) start candidates
+
+        Free cells of the largest region, at least as far from the walls as
+        the default start rows, facing their longest free run.
+        """
+        main = self.labels == np.argmax(self.component_sizes)
+        for margin in (1 + self.size // 10, 2, 1):
+            ys, xs = np.nonzero(main & (self.wall_distance >= margin))
+            if len(ys):
+                break
+        sides = np.argmax(self.free_runs[:, ys, xs], axis=0)
+        return np.stack([ys, xs, 2 * sides], axis=1)  # N, E, S, W are orientations 0, 2, 4, 6
+
+    def spawn(self, num_players: int, separation: Optional[int] = None,
+              rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """Random spread out spawns for a game
+
+        Args:
+            num_players (int): number of players
+            separation (int): manhattan distance wanted between players -
+                defaults to a third of the map. The farthest candidate is
+                used when no spawn is far enough
+            rng (np.random.Generator): random stream - see Tron.rng. None
+                for fresh entropy
+
+        Returns:
+            spawns (np.array): num_players x 3 (y, x, orientation)
+        """
+        separation = self.size // 3 if separation is None else separation
+        rng = np.random.default_rng(rng)
+        candidates = self.spawns
+        chosen = [candidates[rng.integers(len(candidates))]]
+        for idx in range(1, num_players):
+            picked = np.stack(chosen)
+            distance = np.abs(candidates[:, None, :2] - picked[None, :, :2]).sum(axis=2).min(axis=1)
+            far = np.flatnonzero(distance >= separation)
+            chosen.append(candidates[rng.choice(far) if len(far) else np.argmax(distance)])
+        return np.stack(chosen)
+
+    def to_text(self) -> str:
+        return "\n".join("".join(WALL_CHAR if w else FREE_CHAR for w in row) for row in self.walls) + "\n"
+
+    @staticmethod
+    def from_text(text: str, name: str = "custom") -> "GameMap":
+        rows = [line.rstrip() for line in text.splitlines() if line.strip()]
+        return GameMap(np.array([[c == WALL_CHAR for c in row] for row in rows]), name=name)
+
+    def save(self, filename: str) -> str:
+        with open(filename, "w") as file:
+            file.write(self.to_text())
+        return filename
+
+
+def load(filename: str) -> GameMap:
+    """Load a text map - cached until the file changes"""
+    key = ("file", os.path.abspath(filename), os.path.getmtime(filename))
+    if key not in _CACHE:
+        with open(filename, "r") as file:
+            _CACHE[key] = GameMap.from_text(file.read(), name=os.path.basename(filename))
+    return _CACHE[key]
+
+
+def generate(size: int, density: float = 0.1, seed: int = 0, symmetric: bool = True) -> GameMap:
+    """Random map of rectangular obstacles - cached per setting
+
+    Args:
+        size (int): side of the square map
+        density (float): fraction of interior cells covered by obstacles
+        seed (int): random seed of the layout
+        symmetric (bool): mirror the obstacles through the center so no
+            side of the map is favored
+
+    Pockets cut off from the largest free region are filled in, so every
+    free cell of the map is reachable from every spawn.
+    """
+    key = ("generated", size, density, seed, symmetric)
+    if key in _CACHE:
+        return _CACHE[key]
+
+    rng = np.random.default_rng(seed)
+    walls = np.zeros((size, size), dtype=bool)
+    interior = (size - 2)**2
+    longest = max(2, size // 8)
+    for attempt in range(100 * size):
+        if walls[1:-1, 1:-1].sum() >= density * interior:
+            break
+        h, w = rng.integers(1, longest + 1, size=2)
+        y, x = rng.integers(1, size - 1, size=2)
+        walls[y:y + h, x:x + w] = True
+        if symmetric:
+            walls |= walls[::-1, ::-1]
+
+    game_map = GameMap(walls, name=f"generated_{size}_{density}_{seed}")
+    main = game_map.labels == np.argmax(game_map.component_sizes)
+    if not np.all(main | game_map.walls):
+        game_map = GameMap(game_map.walls | ~main, name=game_map.name)
+    _CACHE[key] = game_map
+    return game_map
+
+
+def resolve(spec: Optional[str], size: int) -> Optional[GameMap]:
+    """Map from a command line spec
+
+    Args:
+        spec (str): a map file, "random", "random:<density>" or
+            "random:<density>:<seed>" - None for the plain board
+        size (int): size of generated maps
+
+    Returns:
+        game_map (GameMap): shared map or None
+    """
+    if spec is None:
+        return None
+    if spec.startswith("random"):
+        settings = spec.split(":")[1:]
+        density = float(settings[0]) if settings else 0.1
+        seed = int(settings[1]) if len(settings) > 1 else 0
+        return generate(size, density=density, seed=seed)
+    return load(spec)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TRON MAPS - Generate an obstacle map")
+    parser.add_argument('filename', type=str, help="Map file to write")
+    parser.add_argument('--size', '-s', type=int, default=25, help="Size of the map - default 25")
+    parser.add_argument('--density', '-d', type=float, default=0.1, help="Obstacle density - default 0.1")
+    parser.add_argument('--seed', type=int, default=0, help="Layout seed - default 0")
+    parser.add_argument('--asymmetric', action='store_true', help="Do not mirror the obstacles")
+    args = parser.parse_args()
+
+    game_map = generate(args.size, density=args.density, seed=args.seed, symmetric=not args.asymmetric)
+    print(game_map.to_text(), end="")
+    print("Saved {} - {} free cells, {} spawns".format(game_map.save(args.filename),
+                                                       int(game_map.component_sizes.sum()), len(game_map.spawns)))
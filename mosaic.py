@@ -0,0 +1,151 @@
+"""Mosaic viewer - watch many Tron games tiled into one window
+
+All boards are turned into palette labels together, written into one
+persistent label frame and colored with a single lookup table index, so
+a frame costs one blit however many games are shown.
+"""
+import argparse
+import importlib
+import math
+from typing import Optional
+
+import numpy as np
+import pygame
+
+import export
+import tron
+from agent.util import build_agent_list
+from board import SparseBoard
+
+
+class Mosaic:
+    """Tile many boards of the same size into one image"""
+
+    def __init__(self, num_tiles: int, rows: int, cols: int, num_players: int,
+                 columns: Optional[int] = None, border: int = 1):
+        """Constructor
+
+        Args:
+            num_tiles (int): number of boards shown
+            rows (int): rows of each board
+            cols (int): columns of each board
+            num_players (int): players in each game
+            columns (int): tiles per row - defaults to a square layout
+            border (int): cells between tiles
+        """
+        self.num_tiles = num_tiles
+        self.rows, self.cols = rows, cols
+        self.columns = columns if columns else math.ceil(math.sqrt(num_tiles))
+        self.tile_rows = math.ceil(num_tiles / self.columns)
+
+        # export palette plus a gray border color
+        self.lut = np.vstack([export.palette(num_players), [128, 128, 128]]).astype(np.uint8)
+        self.BORDER = len(self.lut) - 1
+        # label of each board layer - walls then player tails
+        self.codes = np.array([export.WALL] + [2 + 2 * idx for idx in range(num_players)], dtype=np.uint8)
+        self.head_codes = self.codes[1:] + 1
+
+        self.labels = np.full((self.tile_rows * (rows + border), self.columns * (cols + border)),
+                              self.BORDER, dtype=np.uint8)
+        # tile_rows x columns x rows x cols view of the tiles inside the label frame
+        self._tiles = self.labels.reshape(self.tile_rows, rows + border,
+                                          self.columns, cols + border).transpose(0, 2, 1, 3)[:, :, :rows, :cols]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """Size of the label frame in cells (rows, cols)"""
+        return self.labels.shape
+
+    def update(self, boards: list, positions: Optional[list] = None) -> np.ndarray:
+        """Rebuild the label frame from the boards
+
+        Args:
+            boards (list): rows x cols x (1 + num_players) board of each game
+            positions (list): (y, x) of every player head in each game
+
+        Returns:
+            labels (np.array): palette index of every cell of the mosaic
+        """
+        boards = np.stack([b.toarray() if isinstance(b, SparseBoard) else b for b in boards])
+        tiles = np.zeros((self.tile_rows * self.columns, self.rows, self.cols), dtype=np.uint8)
+        # one label per cell - the first occupied layer decides the color
+        occupied = boards.any(axis=3)
+        tiles[:len(boards)] = np.where(occupied, self.codes[boards.argmax(axis=3)], export.FREE)
+
+        if positions is not None:
+            heads = np.array(positions, dtype=int)  # tiles x players x 2
+            tile_idx = np.repeat(np.arange(len(heads)), heads.shape[1])
+            tiles[tile_idx, heads[..., 0].ravel(), heads[..., 1].ravel()] = np.tile(self.head_codes, len(heads))
+
+        self._tiles[...] = tiles.reshape(self.tile_rows, self.columns, self.rows, self.cols)
+        return self.labels
+
+    def image(self) -> np.ndarray:
+        """RGB image of the label frame with one pixel per cell"""
+        return self.lut[self.labels]
+
+    def draw(self, surface: pygame.Surface, small: Optional[pygame.Surface] = None) -> pygame.Surface:
+        """Blit the mosaic onto a surface scaled to fit
+
+        Args:
+            surface (pygame.Surface): target window or offscreen surface
+            small (pygame.Surface): reusable one pixel per cell surface
+
+        Returns:
+            small (pygame.Surface): pass back in on the next frame
+        """
+        if small is None:
+            small = pygame.Surface((self.labels.shape[1], self.labels.shape[0]))
+        pygame.surfarray.blit_array(small, self.image().swapaxes(0, 1))
+        pygame.transform.scale(small, surface.get_size(), surface)
+        return small
+
+
+def run(games: int = 16, size: int = 25, players: int = 2, agents: list[str] = ['agent.wallhugger'],
+        cellsize: int = 3, fps: int = 30) -> None:
+    """Play games side by side and watch them in one window - finished games restart"""
+    agent_modules = [importlib.import_module(a) for a in build_agent_list(players, agents)]
+    mosaic = Mosaic(games, size, size, players)
+
+    pygame.init()
+    window = pygame.display.set_mode((mosaic.shape[1] * cellsize, mosaic.shape[0] * cellsize))
+    clock = pygame.time.Clock()
+    small = None
+
+    boards = [tron.Tron(size=size, num_players=players) for ii in range(games)]
+    observations = [b.reset() for b in boards]
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key in (pygame.K_ESCAPE, pygame.K_q)):
+                running = False
+
+        for idx, (game, obs) in enumerate(zip(boards, observations)):
+            actions = [am.generate_move(obs['board'], obs['positions'], obs['orientations'], uid,
+                                        legal_moves=obs['legal_moves'][uid], rng=game.player_rngs[uid])
+                       for uid, am in enumerate(agent_modules)]
+            observations[idx], done, status, reward = game.move(*actions)
+            if done:
+                observations[idx] = game.reset()
+
+        mosaic.update([obs['board'] for obs in observations], [obs['positions'] for obs in observations])
+        small = mosaic.draw(window, small)
+        pygame.display.update()
+        pygame.display.set_caption("TRON MOSAIC - {} games {:.0f} fps".format(games, clock.get_fps()))
+        clock.tick(fps)
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TRON MOSAIC - Watch many games at once. q/esc to quit")
+    parser.add_argument('--games', '-n', type=int, default=16, help="Number of games")
+    parser.add_argument('--players', '-p', type=int, default=2, help="Number of players")
+    parser.add_argument('--size', '-s', type=int, default=25, help="Size of grid")
+    parser.add_argument('--cellsize', '-c', type=int, default=3, help="Pixels per board cell")
+    parser.add_argument('--fps', '-f', type=int, default=30, help="Frame rate cap")
+    parser.add_argument('agents', nargs='*', default=['agent.wallhugger',], help="module to use, e.g. agent.dumb")
+    args = parser.parse_args()
+
+    run(games=args.games, size=args.size, players=args.players, agents=args.agents,
+        cellsize=args.cellsize, fps=args.fps)
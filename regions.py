@@ -0,0 +1,148 @@
+"""Connectivity helpers for finding players sealed in separate regions
+
+Cells are addressed by their linear index key = y * cols + x. Players move
+between 4-connected cells since every Turn keeps them facing N, E, S or W.
+"""
+from collections import deque
+from typing import Optional
+
+from board import SparseBoard
+
+# 4-connected neighbours as (dy, dx)
+SIDES = [(-1, 0), (0, 1), (1, 0), (0, -1)]
+
+
+class _SparseFree:
+    """Free cell lookup by linear index for a SparseBoard"""
+
+    def __init__(self, board: SparseBoard):
+        self.board = board
+
+    def __getitem__(self, key: int) -> bool:
+        return self.board.is_free(key)
+
+
+def free_cells(grid):
+    """Return a free cell lookup indexed by linear cell index
+
+    Args:
+        grid (np.array or SparseBoard): game board
+
+    Returns:
+        free (bytearray or _SparseFree): free[key] is truthy for empty cells
+    """
+    if isinstance(grid, SparseBoard):
+        return _SparseFree(grid)
+    return bytearray((grid.sum(axis=2) == 0).ravel().tobytes())
+
+
+def is_local_cut(free_ring: list[bool]) -> bool:
+    """Check if occupying a cell could split the free space around it
+
+    Args:
+        free_ring (list): free flags of the 8 neighbours in Player.STEPS order
+            (N, NE, E, SE, S, SW, W, NW)
+
+    Returns:
+        cut (bool): True if the free side neighbours (N, E, S, W) are split
+            into two or more runs around the ring. Otherwise they stay
+            connected through the ring and no region can have been split.
+    """
+    if all(free_ring) or not any(free_ring):
+        return False
+    # start the walk on an occupied cell so runs don't wrap around
+    start = free_ring.index(False)
+    runs = 0
+    in_run = has_side = False
+    for ii in range(9):
+        idx = (start + ii) % 8
+        if ii < 8 and free_ring[idx]:
+            if not in_run:
+                in_run, has_side = True, False
+            has_side |= idx % 2 == 0
+        else:
+            runs += in_run and has_side
+            in_run = False
+    return runs >= 2
+
+
+def flood(starts: list[int], free, cols: int, labels: dict[int, int], owner: int) -> Optional[int]:
+    """Breadth first fill of the free region containing the start cells
+
+    Args:
+        starts (list): linear index of free start cells - may already be
+            labelled with owner
+        free (bytearray): free cell lookup from free_cells
+        cols (int): number of columns of the board
+        labels (dict): linear index -> owner for cells already filled
+        owner (int): label written for this region
+
+    Returns:
+        size (int): number of cells in the region or None if the region
+            touches a cell labelled by another owner
+    """
+    for key in starts:
+        if labels.setdefault(key, owner) != owner:
+            return None
+    queue = deque(set(starts))
+    size = len(queue)
+
+    offsets = [dy * cols + dx for dy, dx in SIDES]
+    while queue:
+        key = queue.popleft()
+        for offset in offsets:
+            n = key + offset
+            if not free[n]:
+                continue
+            label = labels.get(n)
+            if label is None:
+                labels[n] = owner
+                queue.append(n)
+                size += 1
+            elif label != owner:
+                return None
+    return size
+
+
+def fill_path(y: int, x: int, orientation: int, free, cols: int,
+              turns: list[int], steps: list[tuple[int, int]]) -> list[tuple[int, int, int, int]]:
+    """Greedy space filling path from a head position
+
+    Warnsdorff style - always step to the free cell with the fewest free
+    onward neighbours, preferring to go straight on ties, and only enter a
+    dead end when nothing else is left.
+
+    Args:
+        y (int): head row
+        x (int): head column
+        orientation (int): head orientation from tron.Orientation
+        free (bytearray): free cell lookup from free_cells
+        cols (int): number of columns of the board
+        turns (list): possible actions - tron.TURNS
+        steps (list): (dy, dx) for each orientation - tron.Player.STEPS
+
+    Returns:
+        path (list): (action, y, x, orientation) for each step
+    """
+    visited = set()
+    path = []
+    turns = sorted(turns, key=abs)  # straight first
+    while True:
+        best, best_degree = None, None
+        for turn in turns:
+            on = (orientation + turn) % len(steps)
+            yn, xn = y + steps[on][0], x + steps[on][1]
+            key = yn * cols + xn
+            if not free[key] or key in visited:
+                continue
+            degree = sum(1 for dy, dx in SIDES
+                         if free[key + dy * cols + dx] and key + dy * cols + dx not in visited)
+            # a dead end is only taken as the last move
+            degree = degree if degree else 5
+            if best is None or degree < best_degree:
+                best, best_degree = (turn, yn, xn, on), degree
+        if best is None:
+            return path
+        path.append(best)
+        turn, y, x, orientation = best
+        visited.add(y * cols + x)
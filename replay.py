@@ -5,6 +5,7 @@ import argparse
 
 import tron
 import interface
+import live
 
 class ReplayInterface():
     
@@ -14,9 +15,20 @@ class ReplayInterface():
         self.WIDTH=width
         self.FPS = fps
 
-    def load(self, filename):
-        """Load JSON game datafilename"""
-        self.grid, self.states = tron.Tron.load(filename) 
+    def load(self, filename, follow=False):
+        """Load JSON game datafilename
+
+        Args:
+            filename (str): saved game or live record from Tron(record=...)
+            follow (bool): follow a live record as it is written - new
+                moves are read every frame and shown as they land
+        """
+        self.live = None
+        if follow:
+            self.live = live.LiveReader(filename)
+            self.grid, self.states = self.live.grid, self.live.states
+        else:
+            self.grid, self.states = tron.Tron.load(filename) 
         
         # get total number of time steps
         self.players = [p for p in self.states]
@@ -43,6 +55,9 @@ class ReplayInterface():
         #     uid = [state['uid'] for state in p]
             
         self._reset()
+        if self.live is not None:
+            # start on the latest move
+            self.step = self._num_steps()
 
     def _reset(self):
 
@@ -60,13 +75,18 @@ class ReplayInterface():
         self.image[self.grid[:,:,0] == 1] = interface.COLORS['black']
 
         self.surf = pygame.Surface((self.image.shape[0], self.image.shape[1]))
-        self.scaled_surf = pygame.Surface((self.WIDTH, self.HEIGHT))
         # text object
         self.position_text = interface.Text(size=16)
 
         self.window = pygame.display.set_mode((self.WIDTH, self.HEIGHT))
         pygame.display.set_caption('TRON REPLAY')
         self.clock = pygame.time.Clock()
+
+        # persistent scaled board - stepping forward only repaints new cells
+        self.board_surf = pygame.Surface((self.WIDTH, self.HEIGHT))
+        self.grid_overlay = self._draw_grid(pygame.Surface((self.WIDTH, self.HEIGHT), pygame.SRCALPHA))
+        self.drawn_step = None # step drawn on board_surf - None forces a full redraw
+        self.text_rect = None
     
     def _build_board(self):
         # set all white
@@ -74,7 +94,8 @@ class ReplayInterface():
         # draw walls v
         self.image[self.grid[:,:,0] == 1] = interface.COLORS['black']
 
-        # draw the players up through current step
+        # draw the players up through current step - heads on top of all tails
+        heads = []
         for idx, color_dict in enumerate(self.player_colors):
             x = self.players[idx]['x']
             y = self.players[idx]['y']
@@ -85,14 +106,13 @@ class ReplayInterface():
             max_step = self.step if self.step <= len(x) else len(x)
             head_idx = 0 if max_step == 0 else max_step-1
             self.image[y[0:max_step], x[0:max_step], :] = color_dict['tail']
-            self.image[y[head_idx], x[head_idx], :] = color_dict['head']
+            heads.append((y[head_idx], x[head_idx], color_dict['head']))
+        for y, x, color in heads:
+            self.image[y, x, :] = color
 
         # build surface
         pygame.surfarray.blit_array(self.surf, self.image.swapaxes(0, 1))
 
-    def _draw_grid(self, surf):
-        pass
-    
     def process_input(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -113,7 +133,62 @@ class ReplayInterface():
         self.step += keys[pygame.K_l] - keys[pygame.K_h]
 
     def update(self):
-        pass
+        if self.live is not None:
+            # stay on the latest move while following
+            following = self.step >= self._num_steps()
+            lines = self.live.poll()
+            if self.live.states is not self.states:
+                # the game was reset - follow the new one
+                self.grid, self.states = self.live.grid, self.live.states
+                self.players = [p for p in self.states]
+                self._reset()
+                self.step = self._num_steps()
+            elif lines and following:
+                self.step = self._num_steps()
+
+    def _num_steps(self):
+        return max(len(p['x']) for p in self.players)
+
+    def _draw_cell(self, y, x, color):
+        """Repaint a single cell of the board surface and return its rect"""
+        rect = pygame.Rect(x*self.cellsize, y*self.cellsize, self.cellsize, self.cellsize)
+        self.board_surf.fill(color, rect)
+        self.board_surf.blit(self.grid_overlay, rect, area=rect)
+        return rect
+
+    def _update_board(self):
+        """Bring the board surface up to the current step
+
+        Stepping forward only paints the cells passed since the last frame,
+        going back redraws the whole board.
+
+        Returns:
+            dirty (list): rects of the board surface that changed
+        """
+        if self.drawn_step is None or self.step < self.drawn_step:
+            self._build_board()
+            pygame.transform.scale(self.surf, (self.WIDTH, self.HEIGHT), self.board_surf)
+            self.board_surf.blit(self.grid_overlay, (0, 0))
+            self.drawn_step = self.step
+            return [self.board_surf.get_rect()]
+
+        def head(step, length):
+            # same as _build_board - the head is the last state shown
+            return max(min(step, length) - 1, 0)
+
+        dirty = []
+        heads = []
+        for p, color_dict in zip(self.players, self.player_colors):
+            start, stop = head(self.drawn_step, len(p['x'])), head(self.step, len(p['x']))
+            for t in range(start, stop):
+                dirty.append(self._draw_cell(p['y'][t], p['x'][t], color_dict['tail']))
+            if start != stop or self.step != self.drawn_step:
+                heads.append((p['y'][stop], p['x'][stop], color_dict['head']))
+        for y, x, color in heads:
+            dirty.append(self._draw_cell(y, x, color))
+
+        self.drawn_step = self.step
+        return dirty
 
     def _draw_grid(self, surf):
         """Draw a grid onto the larger surface"""
@@ -130,11 +205,7 @@ class ReplayInterface():
         return surf
 
     def render(self):
-        # draw surface
-        self._build_board()
-
-        pygame.transform.scale(self.surf, (self.WIDTH, self.HEIGHT), self.scaled_surf)
-        self.scaled_surf = self._draw_grid(self.scaled_surf)
+        dirty = self._update_board()
 
         # add current status flag for every player
         status = []
@@ -146,10 +217,15 @@ class ReplayInterface():
         for idx, s in enumerate(status):
             string += f"P{idx}:{s.name} "
 
-        self.scaled_surf.blit(self.position_text.draw(string), (0,0))
+        # restore the board under the previous text
+        if self.text_rect is not None:
+            dirty.append(self.text_rect)
+        for rect in dirty:
+            self.window.blit(self.board_surf, rect, area=rect)
+        self.text_rect = self.window.blit(self.position_text.draw(string), (0,0))
+        dirty.append(self.text_rect)
 
-        self.window.blit(self.scaled_surf, (0, 0))
-        pygame.display.update()
+        pygame.display.update(dirty)
 
     def _quit(self):
         pygame.quit()
@@ -167,9 +243,11 @@ class ReplayInterface():
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="TRON REPLAY - Replay games. Keyboard left/right to step, r reset, q/esc quit")
     parser.add_argument("save_game", nargs=1, help="Replay save file", type=str)
+    parser.add_argument("--follow", "-f", action="store_true",
+                        help="Follow a live record from Tron(record=...) while it is written")
     args = parser.parse_args()
 
     replay = ReplayInterface()
-    replay.load(args.save_game[0])
+    replay.load(args.save_game[0], follow=args.follow)
     replay.run()
 
@@ -0,0 +1,324 @@
+"""Asyncio match server for external bots
+
+Bots talk to the server with one JSON object per line over TCP, a Unix
+socket or the stdin/stdout of a persistent subprocess. Connections stay open
+across games and are pooled between concurrent matches.
+
+Protocol:
+    bot -> server  {"type": "hello", "name": "wallhugger"}
+    server -> bot  {"type": "start", "game": 3, "uid": 0, "size": 25, "num_players": 2}
+    server -> bot  {"type": "turn", "game": 3, "step": 0, "positions": [[y, x], ...],
+                    "orientations": [0, 4], "status": [0, 0]}
+    bot -> server  {"game": 3, "step": 0, "move": 0}
+    server -> bot  {"type": "end", "game": 3, "status": [0, 2]}
+
+Moves that miss the deadline are replaced by tron.Turn.STRAIGHT and late
+replies are discarded. Bots that disconnect leave the pool. When fewer live
+bots than players remain for pool_timeout seconds (at once if no listener can
+bring in new bots) the remaining games are dropped and the reason is kept in
+MatchServer.stopped. See bot_client.py for a client that runs agent modules.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import shlex
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import tron
+
+
+class BotConnection:
+    """Line protocol connection to a single bot process"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 name: str = "bot", process: Optional[asyncio.subprocess.Process] = None):
+        self.reader = reader
+        self.writer = writer
+        self.name = name
+        self.process = process
+        self.alive = True
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        self.writer.write((json.dumps(message) + "\n").encode())
+        await self.writer.drain()
+
+    async def recv(self) -> Dict[str, Any]:
+        line = await self.reader.readline()
+        if not line:
+            self.alive = False
+            raise ConnectionError(f"{self.name} disconnected")
+        return json.loads(line)
+
+    async def request_move(self, message: Dict[str, Any], deadline: float) -> tuple[Optional[int], float]:
+        """Send a turn and wait for the matching move
+
+        Returns:
+            move (int): move from tron.Turn or None if the deadline was missed
+            latency (float): seconds until the reply (deadline if missed)
+        """
+        start = time.perf_counter()
+        await self.send(message)
+        while True:
+            remaining = deadline - (time.perf_counter() - start)
+            try:
+                reply = await asyncio.wait_for(self.recv(), timeout=max(remaining, 0))
+            except asyncio.TimeoutError:
+                return None, deadline
+            # ignore late replies to earlier turns
+            if reply.get("game") == message["game"] and reply.get("step") == message["step"]:
+                return int(reply["move"]), time.perf_counter() - start
+
+    async def close(self) -> None:
+        self.alive = False
+        self.writer.close()
+        if self.process is not None:
+            await self.process.wait()
+
+
+class MatchServer:
+    """Host many concurrent Tron matches between pooled bot connections"""
+
+    def __init__(self, size: int = 25, players: int = 2, deadline: float = 1.0,
+                 concurrency: int = 4, pool_timeout: float = 30.0):
+        """Constructor
+
+        Args:
+            size (int): size of the game grid
+            players (int): number of bots in each match
+            deadline (float): seconds a bot has to answer each turn
+            concurrency (int): maximum number of matches played at once
+            pool_timeout (float): seconds to wait for new bots while fewer
+                live bots than players remain
+        """
+        self.size = size
+        self.players = players
+        self.deadline = deadline
+        self.concurrency = concurrency
+        self.pool_timeout = pool_timeout
+
+        self.pool: asyncio.Queue = asyncio.Queue()
+        self.connections: list[BotConnection] = []
+        self.latencies: Dict[str, list[float]] = {}
+        self.timeouts: Dict[str, int] = {}
+        self.results: list[Dict[str, Any]] = []
+        # why run stopped before num_games - None when every game was played
+        self.stopped: Optional[str] = None
+        self._game_ids = itertools.count()
+        self._acquire = asyncio.Lock()
+        self._servers: list[asyncio.AbstractServer] = []
+
+    async def _register(self, connection: BotConnection) -> None:
+        """Wait for the hello message and add the bot to the pool"""
+        hello = await connection.recv()
+        connection.name = hello.get("name", connection.name)
+        self.connections.append(connection)
+        await self.pool.put(connection)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await self._register(BotConnection(reader, writer))
+        except (ConnectionError, json.JSONDecodeError):
+            writer.close()
+
+    async def start_tcp(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Accept bots over TCP and return the bound port"""
+        server = await asyncio.start_server(self._handle_client, host, port)
+        self._servers.append(server)
+        return server.sockets[0].getsockname()[1]
+
+    async def start_unix(self, path: str) -> None:
+        """Accept bots over a Unix socket"""
+        server = await asyncio.start_unix_server(self._handle_client, path)
+        self._servers.append(server)
+
+    async def add_subprocess(self, command: str) -> None:
+        """Launch a persistent bot process speaking the protocol on stdin/stdout"""
+        process = await asyncio.create_subprocess_exec(*shlex.split(command),
+                                                       stdin=asyncio.subprocess.PIPE,
+                                                       stdout=asyncio.subprocess.PIPE)
+        await self._register(BotConnection(process.stdout, process.stdin,
+                                           name=command, process=process))
+
+    async def play_match(self, bots: list[BotConnection]) -> Dict[str, Any]:
+        """Play a single game between the given bots"""
+        game_id = next(self._game_ids)
+        game = tron.Tron(size=self.size, num_players=len(bots))
+        observation = game.reset()
+
+        for uid, bot in enumerate(bots):
+            await self._notify(bot, {"type": "start", "game": game_id, "uid": uid,
+                                     "size": self.size, "num_players": len(bots)})
+
+        done = False
+        status = [tron.Status.VALID for b in bots]
+        step = 0
+        while not done:
+            message = {"type": "turn", "game": game_id, "step": step,
+                       "positions": observation["positions"],
+                       "orientations": [int(o) for o in observation["orientations"]],
+                       "status": [int(s) for s in status]}
+            replies = await asyncio.gather(*[self._move(bot, message) for bot in bots])
+            observation, done, status, reward = game.move(*replies)
+            step += 1
+
+        for bot in bots:
+            await self._notify(bot, {"type": "end", "game": game_id, "status": [int(s) for s in status]})
+
+        result = {"game": game_id, "bots": [b.name for b in bots], "steps": step,
+                  "status": [int(s) for s in status]}
+        self.results.append(result)
+        return result
+
+    async def _notify(self, bot: BotConnection, message: Dict[str, Any]) -> None:
+        """Send a message to a live bot - a failed send marks it disconnected"""
+        if not bot.alive:
+            return
+        try:
+            await bot.send(message)
+        except ConnectionError:
+            bot.alive = False
+
+    async def _move(self, bot: BotConnection, message: Dict[str, Any]) -> int:
+        if not bot.alive:
+            return tron.Turn.STRAIGHT
+        try:
+            move, latency = await bot.request_move(message, self.deadline)
+        except ConnectionError:
+            bot.alive = False
+            move, latency = None, self.deadline
+        except (json.JSONDecodeError, KeyError, ValueError):
+            move, latency = None, self.deadline
+        self.latencies.setdefault(bot.name, []).append(latency)
+        if move is None or move not in tuple(tron.Turn):
+            self.timeouts[bot.name] = self.timeouts.get(bot.name, 0) + 1
+            return tron.Turn.STRAIGHT
+        return move
+
+    def _live_bots(self) -> int:
+        return sum(c.alive for c in self.connections)
+
+    async def _take_bots(self) -> Optional[list[BotConnection]]:
+        """Take all bots for a match - None once too few live bots remain
+
+        Bots in a running match count as live, so long matches never run into
+        pool_timeout - only disconnects do.
+        """
+        bots: list[BotConnection] = []
+        loop = asyncio.get_running_loop()
+        short_since = None
+        while len(bots) < self.players:
+            try:
+                bot = await asyncio.wait_for(self.pool.get(), timeout=0.1)
+            except asyncio.TimeoutError:
+                if self._live_bots() >= self.players:
+                    short_since = None
+                    continue
+                short_since = loop.time() if short_since is None else short_since
+                if not self._servers or loop.time() - short_since >= self.pool_timeout:
+                    for bot in bots:
+                        self.pool.put_nowait(bot)
+                    return None
+                continue
+            if bot.alive:
+                bots.append(bot)
+        return bots
+
+    async def _match_worker(self, remaining: itertools.count, num_games: int) -> None:
+        while next(remaining) < num_games:
+            # take all bots for a match at once so workers can't split the pool
+            async with self._acquire:
+                if self.stopped is not None:
+                    return
+                bots = await self._take_bots()
+                if bots is None:
+                    self.stopped = (f"{len(self.results)} of {num_games} games played - only "
+                                    f"{self._live_bots()} live bots for {self.players} players")
+                    return
+            try:
+                await self.play_match(bots)
+            finally:
+                # keep connections alive for the next game
+                for bot in bots:
+                    if bot.alive:
+                        self.pool.put_nowait(bot)
+
+    async def run(self, num_games: int = 10) -> list[Dict[str, Any]]:
+        """Play num_games matches with up to concurrency matches at once
+
+        Returns early, with the reason in stopped, when bots disconnect and
+        too few are left for a match.
+        """
+        remaining = itertools.count()
+        await asyncio.gather(*[self._match_worker(remaining, num_games)
+                               for ii in range(self.concurrency)])
+        return self.results
+
+    async def close(self) -> None:
+        for server in self._servers:
+            server.close()
+        for connection in self.connections:
+            if connection.alive:
+                await connection.close()
+
+    def latency_report(self, percentiles: tuple = (50, 90, 99)) -> Dict[str, Dict[str, float]]:
+        """Per bot move latency percentiles in milliseconds"""
+        report = {}
+        for name, latencies in self.latencies.items():
+            values = np.percentile(np.array(latencies) * 1000, percentiles)
+            report[name] = {f"p{p}": v for p, v in zip(percentiles, values)}
+            report[name]["moves"] = len(latencies)
+            report[name]["timeouts"] = self.timeouts.get(name, 0)
+        return report
+
+
+async def main(args) -> None:
+    server = MatchServer(size=args.size, players=args.players, deadline=args.deadline,
+                         concurrency=args.concurrency, pool_timeout=args.pool_timeout)
+    if args.port is not None:
+        port = await server.start_tcp(args.host, args.port)
+        print(f"Listening on {args.host}:{port}")
+    if args.unix:
+        await server.start_unix(args.unix)
+        print(f"Listening on {args.unix}")
+    for command in args.bot:
+        await server.add_subprocess(command)
+
+    # wait for enough bots to fill a match
+    while len(server.connections) < max(args.wait_bots, args.players):
+        await asyncio.sleep(0.1)
+
+    results = await server.run(num_games=args.games)
+    for r in results:
+        print("Game {}: {} steps {}".format(r["game"], r["steps"],
+                                            " ".join(f"{n}:{tron.Status(s).name}" for n, s in zip(r["bots"], r["status"]))))
+    if server.stopped is not None:
+        print(f"Stopped early: {server.stopped}")
+    print("Latency (ms):")
+    for name, stats in server.latency_report().items():
+        print("    {}: p50 {:.2f} p90 {:.2f} p99 {:.2f} moves {} timeouts {}".format(
+            name, stats["p50"], stats["p90"], stats["p99"], stats["moves"], stats["timeouts"]))
+    await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TRON match server - play many games between external bots")
+    parser.add_argument('--players', '-p', type=int, help="Number of bots per game", default=2)
+    parser.add_argument('--size', '-s', type=int, help="Size of grid", default=25)
+    parser.add_argument('--games', '-n', type=int, help="Number of games", default=10)
+    parser.add_argument('--concurrency', '-c', type=int, help="Games played at once", default=4)
+    parser.add_argument('--deadline', '-d', type=float, help="Seconds per move", default=1.0)
+    parser.add_argument('--host', type=str, default="127.0.0.1", help="TCP host")
+    parser.add_argument('--port', type=int, default=None, help="TCP port to accept bots on")
+    parser.add_argument('--unix', type=str, default=None, help="Unix socket path to accept bots on")
+    parser.add_argument('--pool_timeout', type=float, default=30.0,
+                        help="Seconds to wait for new bots when too few are left - default 30")
+    parser.add_argument('--wait_bots', type=int, default=0, help="Number of bots to wait for before starting")
+    parser.add_argument('--bot', action='append', default=[],
+                        help="Bot command run as a subprocess, e.g. 'python bot_client.py agent.wallhugger'")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -1,14 +1,50 @@
 """Run game autonomously"""
 import importlib  
+import json
 import os
 import sys
 import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
 
+import numpy as np
+
+import maps
 import tron
-from agent.util import build_agent_list
+import tablebase
+import utilities
+from agent.util import build_agent_list, ConcurrentMoves
+
+def play_game(move_generator: ConcurrentMoves, players: int, size: int, seed: int,
+              resolve: str = None, endgames=None, game_map=None, record: str = None) -> tuple[tron.Tron, int]:
+    """Play one game to the end - the same seed plays the same game
+
+    The engine and every agent draw from their own stream spawned from seed -
+    see Tron.player_rngs - so concurrent agents don't change the game.
+
+    Returns:
+        game (tron.Tron): finished game
+        steps (int): number of moves played
+    """
+    game = tron.Tron(size=size, num_players=players, resolve=resolve, tablebase=endgames,
+                     record=record, game_map=game_map, seed=seed)
+    observation = game.reset()
+
+    done = False
+    steps = 0
+    while not done:
+        # generate all the actions
+        actions = move_generator.generate_moves(observation, uids=range(players), rngs=game.player_rngs)
+        observation, done, status, reward = game.move(*actions)
+        steps += 1
+    return game, steps
+
 
 def run_simulation(players: int = 2, size: int = 25, agents: list[str] = ['agent.wallhugger'],
-                   fname_root: str = "tron_game"):
+                   fname_root: str = "tron_game", concurrent: bool = False,
+                   resolve: str = None, tablebase_file: str = None, record: str = None,
+                   game_map: str = None, seed: Optional[int] = None):
     
     print("TRON battle of {} players on {} grid".format(players, size))
     # build agent list
@@ -17,34 +53,168 @@ def run_simulation(players: int = 2, size: int = 25, agents: list[str] = ['agent
 
     # module_names = [os.path.splitext(a)[0] for a in agent_list]
     agent_modules = [importlib.import_module(a) for a in agent_list]
+    move_generator = ConcurrentMoves(agent_modules, concurrent=concurrent)
 
     # instantiate the game
-    game = tron.Tron(size=size, num_players=players)
-    observation = game.reset()
-
-    done = False
-    while not done:
-        # generate all the actions
-        actions = [am.generate_move(observation['board'],
-                                    observation['positions'],
-                                    observation['orientations'],
-                                    uid) for uid, am in enumerate(agent_modules)]
-        observation, done, status, reward = game.move(*actions)
+    # exact endgames for "fill" - loaded from and saved back to tablebase_file
+    endgames = tablebase.Tablebase(filename=tablebase_file) if tablebase_file else None
+    seed = int(np.random.default_rng().integers(2**31)) if seed is None else seed
+    game, steps = play_game(move_generator, players, size, seed, resolve=resolve, endgames=endgames,
+                            game_map=maps.resolve(game_map, size), record=record)
+    move_generator.close()
 
     
     # determine the winner and print
-    filename = game.save(fname_base=fname_root)
-    print("Finished - game saved to {}".format(filename))
+    filename = game.save(fname_base=fname_root, agents=agent_list)
+    if game.resolution is not None:
+        print("Resolved early ({}) - skipped {} steps".format(game.resolution["mode"], game.steps_skipped))
+    print("Finished - game saved to {} (seed {})".format(filename, seed))
+    if endgames is not None:
+        print("Tablebase {} entries ({} hits) saved to {}".format(len(endgames.table), endgames.hits,
+                                                                  endgames.save()))
+
+
+# agents, map and settings of a batch worker - set by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(config: Dict[str, Any]) -> None:
+    _worker.update(config)
+    _worker["move_generator"] = ConcurrentMoves([importlib.import_module(a) for a in config["agents"]],
+                                                concurrent=False)
+    _worker["game_map"] = maps.resolve(config["map"], config["size"])
+    _worker["endgames"] = tablebase.Tablebase(filename=config["tablebase_file"]) if config["tablebase_file"] else None
+    # wall clock since the pool was created - interpreter start, imports and setup
+    _worker["spawn_time"] = time.time() - config["launched"]
+
+
+def _play_games(games: list[tuple[int, int]]) -> tuple[int, int, int, float]:
+    """Play (game idx, seed) pairs and append their summaries to this worker's shard
+
+    Returns:
+        games (int): number of games played
+        steps (int): number of moves played
+        pid (int): worker process id
+        spawn_time (float): seconds the worker took to start - see _init_worker
+    """
+    shard = os.path.join(_worker["out_dir"], "{}_summary_{}.jsonl".format(_worker["fname_root"], os.getpid()))
+    total_steps = 0
+    with open(shard, "a") as file:
+        for idx, seed in games:
+            game, steps = play_game(_worker["move_generator"], _worker["players"], _worker["size"], seed,
+                                    resolve=_worker["resolve"], endgames=_worker["endgames"],
+                                    game_map=_worker["game_map"])
+            total_steps += steps
+            status = [tron.Status(s) for s in game.status]
+            summary = {"game": idx, "seed": seed, "steps": steps, "skipped": game.steps_skipped,
+                       "agents": _worker["agents"], "status": [s.name for s in status],
+                       "rewards": [sum(p.states["rewards"]) for p in game.players],
+                       "winners": [uid for uid, s in enumerate(status, start=1) if s == tron.Status.VALID],
+                       "resolution": game.resolution["mode"] if game.resolution else None}
+            if _worker["record_every"] and idx % _worker["record_every"] == 0:
+                fname_base = os.path.join(_worker["out_dir"], "{}_seed_{}".format(_worker["fname_root"], seed))
+                summary["record"] = game.save(fname_base=fname_base, agents=_worker["agents"])
+            file.write(json.dumps(summary, cls=utilities.NumpyEncoder) + "\n")
+    return len(games), total_steps, os.getpid(), _worker["spawn_time"]
+
+
+def run_batch(num_games: int, workers: Optional[int] = None, players: int = 2, size: int = 25,
+              agents: list[str] = ['agent.wallhugger'], fname_root: str = "tron_game", out_dir: str = ".",
+              seed: int = 0, resolve: str = None, tablebase_file: str = None, game_map: str = None,
+              record_every: int = 0, chunk_games: int = 10) -> Dict[str, float]:
+    """Play many seeded games in a process pool
+
+    Game idx is played with seed + idx, so any game can be replayed alone
+    with run_simulation(seed=...). Every worker appends one JSON line per
+    game to its own <fname_root>_summary_<pid>.jsonl shard in out_dir.
+
+    Args:
+        num_games (int): number of games
+        workers (int): number of processes - defaults to the number of CPUs
+        seed (int): seed of the first game
+        record_every (int): also save the full record of every
+            record_every-th game - 0 for summaries only
+        chunk_games (int): games per pool task
+        remaining: see run_simulation
+
+    Returns:
+        throughput (dict): games, steps, seconds, games_per_s, steps_per_s and
+            the mean/max worker spawn seconds
+    """
+    agent_list = build_agent_list(players, agents)
+    print("TRON batch of {} games - {} players on {} grid".format(num_games, players, size))
+    print("Competitors: {}".format(agent_list))
+    os.makedirs(out_dir, exist_ok=True)
+    config = {"players": players, "size": size, "agents": agent_list, "fname_root": fname_root,
+              "out_dir": out_dir, "resolve": resolve, "tablebase_file": tablebase_file, "map": game_map,
+              "record_every": record_every}
+    games = [(idx, seed + idx) for idx in range(num_games)]
+    chunks = [games[ii:ii + chunk_games] for ii in range(0, num_games, chunk_games)]
+
+    played = steps = 0
+    spawn_times: Dict[int, float] = {}
+    start = time.perf_counter()
+    config["launched"] = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as executor:
+        for chunk_played, chunk_steps, pid, spawn_time in executor.map(_play_games, chunks):
+            spawn_times[pid] = spawn_time
+            played += chunk_played
+            steps += chunk_steps
+            if played % 100 < chunk_played:
+                elapsed = time.perf_counter() - start
+                print("Games {}/{} - {:.1f} games/s, {:.0f} steps/s".format(played, num_games, played / elapsed,
+                                                                          steps / elapsed))
+    elapsed = time.perf_counter() - start
+    throughput = {"games": played, "steps": steps, "seconds": elapsed,
+                  "games_per_s": played / elapsed, "steps_per_s": steps / elapsed,
+                  "spawn_s": float(np.mean(list(spawn_times.values()))) if spawn_times else float("nan"),
+                  "spawn_max_s": max(spawn_times.values(), default=float("nan"))}
+    print("Finished {games} games in {seconds:.1f} s - {games_per_s:.1f} games/s, {steps_per_s:.0f} steps/s".format(
+        **throughput))
+    print("{} workers started in {:.2f} s on average (max {:.2f} s)".format(len(spawn_times), throughput["spawn_s"],
+                                                                           throughput["spawn_max_s"]))
+    print("Summaries in {}".format(os.path.join(out_dir, "{}_summary_*.jsonl".format(fname_root))))
+    return throughput
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="TRON - AI battle using provided agents")
     parser.add_argument('--players', '-p', type=int, help="Number of players", default=2)
     parser.add_argument('--size', '-s', type=int, help="Size of grid", default=100)
     parser.add_argument('--fname_root', '-f', type=str, default="tron_game", help="Filename root for saving game")
+    parser.add_argument('--concurrent', '-c', action='store_true', help="Generate all player moves concurrently")
+    parser.add_argument('--resolve', '-r', type=str, choices=["fill", "regions"], default=None,
+                        help="End the game early once players are sealed in separate regions")
+    parser.add_argument('--tablebase', '-t', type=str, default=None,
+                        help="Endgame tablebase file used by --resolve fill")
+    parser.add_argument('--record', type=str, default=None,
+                        help="Live record file to follow with replay.py --follow while the game runs")
+    parser.add_argument('--map', type=str, default=None,
+                        help="Map file or random[:density[:seed]] - default open board")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="Seed of the (first) game - a batch plays seed + idx. Default random")
+    parser.add_argument('--num_games', '--num-games', '-n', type=int, default=1,
+                        help="Number of games - more than 1 runs a batch in a process pool")
+    parser.add_argument('--workers', '-w', type=int, default=None, help="Batch processes - default all CPUs")
+    parser.add_argument('--out_dir', '-o', type=str, default=".", help="Batch summary shard directory - default .")
+    parser.add_argument('--record_every', type=int, default=0,
+                        help="Save the full record of every n-th batch game - default 0 (none)")
     parser.add_argument('agents', nargs='*', default=['agent.wallhugger',], help="module to use, e.g. agent.dumb")
     args = parser.parse_args()
-    
+
+    if args.num_games > 1:
+        run_batch(args.num_games, workers=args.workers, players=args.players, size=args.size, agents=args.agents,
+                  fname_root=args.fname_root, out_dir=args.out_dir,
+                  seed=args.seed if args.seed is not None else 0, resolve=args.resolve,
+                  tablebase_file=args.tablebase, game_map=args.map, record_every=args.record_every)
+        sys.exit()
+
     run_simulation(players=args.players,
                    size=args.size,
                    agents=args.agents,
-                   fname_root=args.fname_root)
+                   fname_root=args.fname_root,
+                   concurrent=args.concurrent,
+                   resolve=args.resolve,
+                   tablebase_file=args.tablebase,
+                   record=args.record,
+                   game_map=args.map,
+                   seed=args.seed)
@@ -0,0 +1,62 @@
+"""Seeded random streams for games, agents and learners
+
+Every game owns an np.random.SeedSequence and spawns independent streams
+from it - one for the engine (spawn placement) and one per player for the
+agent or learner driving it, see Tron.rng and Tron.player_rngs. A game seeded
+the same plays out the same whatever else runs in the process, in which
+worker it lands or in which order the agents are asked for moves, and
+nothing touches the global NumPy random state.
+
+Draws hands out uniform numbers from a generator in blocks, so scalar
+decisions like the epsilon greedy test cost an array lookup instead of a
+generator call per step. Blocks are drawn in a fixed order from the stream,
+so block draws stay bit-reproducible.
+"""
+from typing import Any, Optional, Union
+
+import numpy as np
+
+Seed = Union[None, int, np.random.SeedSequence]
+
+
+def seed_sequence(seed: Seed = None) -> np.random.SeedSequence:
+    """SeedSequence of a seed - None draws fresh entropy"""
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+
+def spawn(seeds: np.random.SeedSequence, num: int) -> list[np.random.Generator]:
+    """num independent generators spawned from seeds"""
+    return [np.random.default_rng(child) for child in seeds.spawn(num)]
+
+
+class Draws:
+    """Uniform draws from a generator, pre-generated in blocks"""
+
+    def __init__(self, rng: Any = None, block_size: int = 256):
+        """Constructor
+
+        Args:
+            rng (np.random.Generator): stream to draw from - a seed or
+                SeedSequence builds one, None uses fresh entropy
+            block_size (int): scalar draws generated per generator call
+        """
+        self.rng = np.random.default_rng(rng)
+        self.block_size = block_size
+        self._block = np.empty(0)
+        self._next = 0
+
+    def random(self, size: Optional[Any] = None) -> Any:
+        """Uniform float in [0, 1) - an array of them for a size"""
+        if size is not None:
+            return self.rng.random(size)
+        if self._next == len(self._block):
+            self._block = self.rng.random(self.block_size)
+            self._next = 0
+        self._next += 1
+        return float(self._block[self._next - 1])
+
+    def integers(self, high: int, size: Optional[Any] = None) -> Any:
+        """Uniform int in [0, high) - an array of them for a size"""
+        if size is not None:
+            return self.rng.integers(high, size=size)
+        return int(self.random() * high)
@@ -0,0 +1,181 @@
+"""Endgame tablebase - exact survival in small isolated regions
+
+Once a player is alone in a region the best play is the longest self
+avoiding path from its head. For small regions this is solved exactly by
+search and every solved position (including the sub regions visited along
+the way) is cached under a canonical key:
+
+    (width, bitmask of the region, entry y, entry x, orientation)
+
+The region is translated so its bounding box (with the entry cell) starts at
+(0, 0). The orientation is only part of the key when the cell behind the
+head is still free - otherwise every free neighbour is a legal move and the
+orientation does not change the answer. Each entry holds the optimal number
+of moves and the first step as an index into regions.SIDES.
+"""
+import json
+import os
+from collections import deque
+from typing import Optional
+
+from regions import SIDES
+
+Cell = tuple[int, int]
+
+
+def region_cells(y: int, x: int, is_free, limit: Optional[int] = None) -> Optional[set[Cell]]:
+    """Free cells reachable from the head at (y, x)
+
+    Args:
+        y (int): head row
+        x (int): head column
+        is_free (callable): is_free(y, x) for a cell
+        limit (int): give up once the region is larger than limit
+
+    Returns:
+        cells (set): (y, x) of every reachable free cell or None over the limit
+    """
+    cells = set()
+    queue = deque([(y, x)])
+    while queue:
+        cy, cx = queue.popleft()
+        for dy, dx in SIDES:
+            n = (cy + dy, cx + dx)
+            if n in cells or not is_free(*n):
+                continue
+            cells.add(n)
+            if limit is not None and len(cells) > limit:
+                return None
+            queue.append(n)
+    return cells
+
+
+def _component(cells: set[Cell], start: Cell) -> frozenset[Cell]:
+    """Cells of the region reachable from start (start itself excluded)"""
+    seen = set()
+    queue = deque([start])
+    while queue:
+        cy, cx = queue.popleft()
+        for dy, dx in SIDES:
+            n = (cy + dy, cx + dx)
+            if n in cells and n not in seen:
+                seen.add(n)
+                queue.append(n)
+    return frozenset(seen)
+
+
+class Tablebase:
+    """Memoized longest path solver for small regions"""
+
+    def __init__(self, max_cells: int = 20, filename: Optional[str] = None):
+        """Constructor
+
+        Args:
+            max_cells (int): largest region solved exactly
+            filename (str): JSON file to load from and save to
+        """
+        self.max_cells = max_cells
+        self.filename = filename
+        self.table: dict[tuple, tuple[int, int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+        if filename and os.path.exists(filename):
+            self.load(filename)
+
+    @staticmethod
+    def _key(cells: frozenset[Cell], entry: Cell, orientation: int) -> tuple:
+        ys = [c[0] for c in cells] + [entry[0]]
+        xs = [c[1] for c in cells] + [entry[1]]
+        y0, x0 = min(ys), min(xs)
+        width = max(xs) - x0 + 1
+        mask = 0
+        for cy, cx in cells:
+            mask |= 1 << ((cy - y0) * width + (cx - x0))
+
+        # orientation only matters if reversing into a free cell is forbidden
+        dy, dx = SIDES[(orientation // 2 + 2) % 4]
+        if (entry[0] + dy, entry[1] + dx) not in cells:
+            orientation = -1
+        return (width, mask, entry[0] - y0, entry[1] - x0, orientation)
+
+    def solve(self, cells: frozenset[Cell], entry: Cell, orientation: int) -> tuple[int, int]:
+        """Longest path from entry through cells
+
+        Args:
+            cells (frozenset): free (y, x) cells of the region, entry excluded
+            entry (tuple): (y, x) of the head
+            orientation (int): head orientation from tron.Orientation (N, E, S or W)
+
+        Returns:
+            length (int): number of moves before running out of room
+            step (int): index into regions.SIDES of the first move or -1
+        """
+        key = self._key(cells, entry, orientation)
+        if key in self.table:
+            self.hits += 1
+            return self.table[key]
+        self.misses += 1
+
+        best = (0, -1)
+        reverse = (orientation // 2 + 2) % 4
+        for step, (dy, dx) in enumerate(SIDES):
+            n = (entry[0] + dy, entry[1] + dx)
+            if n not in cells or step == reverse:
+                continue
+            rest = _component(cells - {n}, n)
+            length = 1 + self.solve(rest, n, 2 * step)[0]
+            if length > best[0]:
+                best = (length, step)
+            if length == len(cells):
+                break  # visits every cell - can't do better
+
+        self.table[key] = best
+        return best
+
+    def path(self, y: int, x: int, orientation: int, cells: set[Cell]) -> list[tuple[int, int, int, int]]:
+        """Optimal path through a region - same format as regions.fill_path
+
+        Returns:
+            path (list): (action, y, x, orientation) for each step
+        """
+        path = []
+        cells = frozenset(cells)
+        while True:
+            length, step = self.solve(cells, (y, x), orientation)
+            if not length:
+                return path
+            new_orientation = 2 * step
+            turn = (new_orientation - orientation + 4) % 8 - 4
+            y, x = y + SIDES[step][0], x + SIDES[step][1]
+            orientation = new_orientation
+            path.append((turn, y, x, orientation))
+            cells = _component(cells - {(y, x)}, (y, x))
+
+    def best_move(self, y: int, x: int, orientation: int, cells: set[Cell]) -> Optional[tuple[int, int]]:
+        """Optimal turn and survival length or None if the region is too big
+
+        Returns:
+            turn (int): action from tron.Turn
+            length (int): number of moves the player can still survive
+        """
+        if len(cells) > self.max_cells:
+            return None
+        length, step = self.solve(frozenset(cells), (y, x), orientation)
+        if step < 0:
+            return None
+        return (2 * step - orientation + 4) % 8 - 4, length
+
+    def save(self, filename: Optional[str] = None) -> str:
+        filename = filename if filename else self.filename
+        with open(filename, "w") as file:
+            json.dump({"max_cells": self.max_cells,
+                       "table": [list(k) + list(v) for k, v in self.table.items()]}, file)
+        return filename
+
+    def load(self, filename: str) -> None:
+        with open(filename, "r") as file:
+            data = json.load(file)
+        self.max_cells = max(self.max_cells, data["max_cells"])
+        for row in data["table"]:
+            self.table[tuple(row[:5])] = tuple(row[5:])
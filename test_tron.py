@@ -1,8 +1,37 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import types
+
 import numpy as np
 import pytest
 from itertools import combinations
 
 import tron
+from board import SparseBoard
+import actor_learner
+import approximators
+import catalog
+import convergence
+import evaluate
+import regions
+import simulator
+import streams
+import tablebase
+from traces import EligibilityTraces
+from vec_env import VecTron
+from server import MatchServer
+import bot_client
+import export
+import live
+import maps
+from agent import endgame, random_avoid, wallhugger
+from agent.util import BackgroundMoves, ConcurrentMoves
 
 class TestPlayer():
     def test_position(self):
@@ -107,50 +136,57 @@ class TestTron():
         assert status[0] is tron.Status.VALID
         assert reward[0] is 1
 
-    def test_validate_wall_valid(self):
+    def _place(self, game, *players):
+        """Clear the trails and put every player at (y, x, orientation)"""
+        game.grid[:, :, 1:] = 0
+        for p, (y, x, o) in zip(game.players, players):
+            p.y, p.x, p.orientation = y, x, o
+        game._update()
+
+    def test_move_wall_valid(self):
         game = tron.Tron(size=100, num_players=1)
         game.reset()
-    
         for ii in range(10):
-            x = np.random.randint(1,99)
-            y = np.random.randint(1,99)
-            player = tron.Player(y,x,tron.Orientation.N)
+            self._place(game, (np.random.randint(2, 99), np.random.randint(1, 99), tron.Orientation.N))
+            obs, done, status, reward = game.move(tron.Turn.STRAIGHT)
+            assert status[0] is tron.Status.VALID
 
-            status = game._validate_wall(player)
-            assert status is tron.Status.VALID
-
-    def test_validate_wall_crash(self):
+    def test_move_wall_crash(self):
         game = tron.Tron(size=100, num_players=1)
-        game.reset()
-    
         for ii in range(10):
-            x = np.random.randint(1,100)
-            y = 0
-            player = tron.Player(y,x,tron.Orientation.N)
+            game.reset()
+            self._place(game, (1, np.random.randint(1, 99), tron.Orientation.N))
+            obs, done, status, reward = game.move(tron.Turn.STRAIGHT)
+            assert status[0] is tron.Status.CRASH_INTO_WALL
+            assert done is True
 
-            status = game._validate_wall(player)
-            assert status is tron.Status.CRASH_INTO_WALL
+    def test_move_tail_crash(self):
+        game = tron.Tron(size=20, num_players=2)
+        game.reset()
+        self._place(game, (10, 5, tron.Orientation.E), (5, 5, tron.Orientation.E))
+        game.grid[10, 6, 2] = 1  # player 2 trail ahead of player 1
+        obs, done, status, reward = game.move(tron.Turn.STRAIGHT, tron.Turn.STRAIGHT)
+        assert status == [tron.Status.CRASH_INTO_TAIL, tron.Status.VALID]
 
-    def test_validate_tail_false(self):
-        game = tron.Tron(size=100, num_players=1)
-        for ii in range(100):
-            obs = game.reset()
-            x = obs['positions'][0][1]-1
-            y = obs['positions'][0][0]-1
-            player = tron.Player(y,x,tron.Orientation.N)
-            status = game._validate_tail(player)
-            assert status is tron.Status.VALID
+    def test_move_self_crash(self):
+        game = tron.Tron(size=20, num_players=1)
+        game.reset()
+        self._place(game, (10, 5, tron.Orientation.E))
+        game.grid[10, 6, 1] = 1  # own trail ahead
+        obs, done, status, reward = game.move(tron.Turn.STRAIGHT)
+        assert status[0] is tron.Status.CRASH_INTO_SELF
+
+    def test_move_fewer_actions(self):
+        game = tron.Tron(size=20, num_players=3)
+        game.reset()
+        self._place(game, (5, 5, tron.Orientation.E), (10, 5, tron.Orientation.E), (15, 5, tron.Orientation.E))
+        obs, done, status, reward = game.move(tron.Turn.STRAIGHT)
+        # players without an action stay in place and stay valid
+        assert done is False
+        assert status == [tron.Status.VALID] * 3
+        np.testing.assert_equal(game.heads, [[5, 6], [10, 5], [15, 5]])
+        assert [len(p.states["x"]) for p in game.players] == [2, 1, 1]
 
-    def test_validate_tail_true(self):
-        game = tron.Tron(size=100, num_players=1)
-        for ii in range(100):
-            obs = game.reset()
-            x = obs['positions'][0][1]
-            y = obs['positions'][0][0]
-            player = tron.Player(y,x,tron.Orientation.N)
-            status = game._validate_tail(player)
-            assert status > 0
-    
     def test_validate_n_players(self):
         game = tron.Tron(size=50, num_players=4)
         actions = [tron.Turn.STRAIGHT for i in range(game.num_players)]
@@ -162,15 +198,980 @@ class TestTron():
         # large grid tries to reduce this probablity
         assert sum(status) == 0
 
+    def test_player_store_views(self):
+        game = tron.Tron(size=50, num_players=4)
+        game.reset()
+        for idx, p in enumerate(game.players):
+            np.testing.assert_equal(game.heads[idx], [p.y, p.x])
+            assert game.orientations[idx] == p.orientation
+            assert game.status[idx] == p.status
+        # writing through a player updates the store
+        game.players[1].x = 7
+        assert game.heads[1, 1] == 7
 
-            
-        
+    def test_move_head_on_collision(self):
+        game = tron.Tron(size=20, num_players=2)
+        game.reset()
+        # players facing each other with a single empty cell between
+        game.grid[:, :, 1:] = 0
+        game.players[0].y, game.players[0].x = 10, 8
+        game.players[0].orientation = tron.Orientation.E
+        game.players[1].y, game.players[1].x = 10, 10
+        game.players[1].orientation = tron.Orientation.W
+        game._update()
+        obs, done, status, reward = game.move(tron.Turn.STRAIGHT, tron.Turn.STRAIGHT)
+        assert done is True
+        assert status == [tron.Status.CRASH_INTO_OPPONENT, tron.Status.CRASH_INTO_OPPONENT]
+
+    def test_move_many_players(self):
+        game = tron.Tron(size=200, num_players=32)
+        game.reset()
+        actions = [tron.Turn.STRAIGHT for i in range(game.num_players)]
+        obs, done, status, reward = game.move(*actions)
+        assert sum(status) == 0
+        assert np.sum(obs['board'][:, :, 1:]) == 2 * game.num_players
+
+    def test_sparse_matches_dense(self):
+        for seed in range(10):
+            boards = []
+            for sparse in (False, True):
+                game = tron.Tron(size=30, num_players=3, sparse=sparse, seed=seed)
+                game.reset()
+                actions = [tron.Turn.STRAIGHT for i in range(game.num_players)]
+                done = False
+                while not done:
+                    obs, done, status, reward = game.move(*actions)
+                    vision = game.get_vision_grid(uid=1, size=5)
+                board = obs['board'].toarray() if sparse else obs['board']
+                boards.append((board, status, vision))
+            np.testing.assert_equal(boards[0][0], boards[1][0])
+            assert boards[0][1:] == boards[1][1:]
+
+    def test_legal_moves_match_validate_position(self):
+        for sparse in (False, True):
+            game = tron.Tron(size=15, num_players=3, sparse=sparse)
+            obs = game.reset()
+            done = False
+            while not done:
+                for uid, ((y, x), o) in enumerate(zip(obs['positions'], obs['orientations'])):
+                    expected = [tron.Tron.validate_position(*tron.Player.future_move(y, x, o, a)[:2], obs['board'])
+                                for a in tron.Turn]
+                    np.testing.assert_equal(obs['legal_moves'][uid], expected)
+                actions = [random_avoid.generate_move(obs['board'], obs['positions'], obs['orientations'], uid,
+                                                      legal_moves=obs['legal_moves'][uid])
+                           for uid in range(game.num_players)]
+                obs, done, status, reward = game.move(*actions)
+
+    def _sealed_game(self, resolve):
+        game = tron.Tron(size=20, num_players=2, resolve=resolve)
+        game.reset()
+        # wall across the middle row splits the board in two
+        game.grid[10, :, 0] = 1
+        game.grid[:, :, 1:] = 0
+        game.players[0].y, game.players[0].x = 5, 5
+        game.players[0].orientation = tron.Orientation.N
+        game.players[1].y, game.players[1].x = 15, 5
+        game.players[1].orientation = tron.Orientation.S
+        game._update()
+        return game
+
+    def test_resolve_regions(self):
+        game = self._sealed_game("regions")
+        obs, done, status, reward = game.move(tron.Turn.STRAIGHT, tron.Turn.STRAIGHT)
+        assert done is True
+        assert status == [tron.Status.VALID, tron.Status.OUT_OF_ROOM]
+        assert reward[1] == game.players[1].states["rewards"][-1] < 0
+        assert game.get_game_stats(uid=2)["crash_flag"] == tron.Status.OUT_OF_ROOM
+        # 9 free rows above the wall vs 8 below - less the two trail cells
+        assert game.resolution["region_sizes"] == [9 * 18 - 2, 8 * 18 - 2]
+        assert game.resolution["winners"] == [1]
+        assert game.steps_skipped > 0
+
+    def test_resolve_fill(self):
+        game = self._sealed_game("fill")
+        obs, done, status, reward = game.move(tron.Turn.STRAIGHT, tron.Turn.STRAIGHT)
+        assert done is True
+        assert game.steps_skipped > 0
+        # the lower region is filled completely before crashing
+        assert game.steps_skipped == 8 * 18 - 2
+        assert status == [tron.Status.VALID, tron.Status.CRASH_INTO_SELF]
+        for p in game.players:
+            # skip the random start from reset - fast forwarded paths never
+            # revisit a cell before the final move
+            cells = list(zip(p.states["y"], p.states["x"]))[1:]
+            assert len(set(cells[:-1])) == len(cells) - 1
+            assert len(p.states["actions"]) == game.steps_skipped + 2
+
+    @staticmethod
+    def _flood_separated(game):
+        """Brute force check - label every free component, then compare the components next to each head"""
+        free = game.grid.sum(axis=2) == 0
+        labels = np.full(free.shape, -1)
+        for start in zip(*np.nonzero(free)):
+            if labels[start] >= 0:
+                continue
+            labels[start] = start[0] * free.shape[1] + start[1]
+            stack = [start]
+            while stack:
+                y, x = stack.pop()
+                for dy, dx in regions.SIDES:
+                    if free[y + dy, x + dx] and labels[y + dy, x + dx] < 0:
+                        labels[y + dy, x + dx] = labels[start]
+                        stack.append((y + dy, x + dx))
+        touched = [{labels[y + dy, x + dx] for dy, dx in regions.SIDES} - {-1} for y, x in game.heads.tolist()]
+        return all(not (a & b) for a, b in combinations(touched, 2))
+
+    @pytest.mark.parametrize("players,density", [(2, None), (3, None), (2, 0.15), (3, 0.15)])
+    def test_separated_matches_flood(self, players, density):
+        for seed in range(60):
+            game_map = None if density is None else maps.generate(12, density=density, seed=seed % 5)
+            game = tron.Tron(size=12, num_players=players, seed=seed, game_map=game_map)
+            obs = game.reset()
+            done = False
+            while not done:
+                actions = [random_avoid.generate_move(obs['board'], obs['positions'], obs['orientations'], uid,
+                                                      rng=game.player_rngs[uid])
+                           for uid in range(players)]
+                obs, done, status, reward = game.move(*actions)
+                if done:
+                    break
+                # the engine resolves on the first separation - compare up to it
+                expected = self._flood_separated(game)
+                assert game._separated() == expected, f"seed {seed} step {len(game.players[0].states['x'])}"
+                if expected:
+                    break
+
+    def test_resolve_not_separated(self):
+        game = tron.Tron(size=20, num_players=2, resolve="regions")
+        game.reset()
+        obs, done, status, reward = game.move(tron.Turn.STRAIGHT, tron.Turn.STRAIGHT)
+        assert done is False
+        assert game.resolution is None
+
+    def test_ray_features(self):
+        game = tron.Tron(size=10, num_players=2)
+        game.reset()
+        game.grid[:, :, 1:] = 0
+        game.players[0].y, game.players[0].x = 5, 2
+        game.players[0].orientation = tron.Orientation.E
+        game.players[1].y, game.players[1].x = 1, 2
+        game.players[1].orientation = tron.Orientation.S
+        game._update()
+        game.grid[5, 4, 0] = 1
+        features = game.get_ray_features(uid=1, ray_bins=(1, 3), distance_bins=(4, 10))
+        # ahead (E) one free cell, left (N) the opponent is 3 cells away
+        assert features[0] == 1
+        assert features[6] == 2
+        # behind (W) one free cell before the wall
+        assert features[4] == 1
+        # opponent 4 cells away on the left
+        assert features[8:] == [1, 6]
+        assert len(features) == len(tron.Tron.state_sizes("rays"))
+        assert all(f < n for f, n in zip(features, tron.Tron.state_sizes("rays")))
+
+    def test_local_cut(self):
+        # corridor - free ahead and behind only
+        assert regions.is_local_cut([True, False, False, False, True, False, False, False])
+        # against a wall - one run of free cells
+        assert not regions.is_local_cut([False, False, True, True, True, True, True, False])
+
+class TestSparseBoard():
+
+    def test_walls(self):
+        board = SparseBoard(10, 10, 2)
+        dense = tron.Tron(size=10, num_players=2)._define_grid()
+        np.testing.assert_equal(board.toarray(), dense)
+        assert board[0, 5, 0] == 1
+        assert board[5, 5, 0] == 0
+
+    def test_trails(self):
+        board = SparseBoard(10, 10, 2)
+        board[np.array([3, 4]), np.array([3, 4]), np.array([1, 2])] = 1
+        np.testing.assert_equal(board[3, 3, :], [0, 1, 0])
+        np.testing.assert_equal(board[4, 4, 1:], [0, 1])
+        assert board.trail_length == 2
+        assert tron.Tron.validate_position(3, 3, board) is False
+        assert tron.Tron.validate_position(5, 5, board) is True
+
+    def test_window(self):
+        board = SparseBoard(10, 10, 1)
+        board[1, 1, 1] = 1
+        window = board.window(0, 1, 3)
+        # top row lies outside of the board
+        np.testing.assert_equal(window[:, :, 0], [[0, 0, 0], [1, 1, 1], [1, 0, 0]])
+        assert window[2, 1, 1] == 1
+        window = board.window(1, 1, 3)
+        assert window[1, 1, 1] == 1
+
+class TestVecTron():
+
+    def test_step_auto_reset(self):
+        env = VecTron(num_envs=4, players=2, size=10, agents=['agent.wallhugger'])
+        states = env.reset()
+        assert states.shape == (4, 9)
+        finished = 0
+        for ii in range(50):
+            states, rewards, dones, infos = env.step([tron.Turn.STRAIGHT] * 4)
+            assert states.shape == (4, 9)
+            for done, info in zip(dones, infos):
+                if done:
+                    finished += 1
+                    assert len(info["final_state"]) == 9
+                    assert info["game_stats"]["num_actions"] > 0
+        # going straight on a 10x10 board always ends games
+        assert finished >= 4
+
+    def test_ray_states(self):
+        env = VecTron(num_envs=3, players=2, size=10, features="rays")
+        states = env.reset()
+        assert states.shape == (3, len(tron.Tron.state_sizes("rays")))
+
+class TestMatchServer():
+
+    def _play(self, agents, num_games, deadline=1.0):
+        async def run():
+            server = MatchServer(size=15, players=len(agents), deadline=deadline, concurrency=2)
+            port = await server.start_tcp()
+            for idx, agent in enumerate(agents):
+                sock = socket.create_connection(("127.0.0.1", port))
+                threading.Thread(target=bot_client.play, daemon=True,
+                                 args=(agent, sock.makefile("r"), sock.makefile("w"), f"bot{idx}")).start()
+            while len(server.connections) < len(agents):
+                await asyncio.sleep(0.01)
+            results = await server.run(num_games=num_games)
+            await server.close()
+            return server, results
+        return asyncio.run(run())
+
+    def test_games_reuse_connections(self):
+        server, results = self._play([wallhugger, wallhugger], num_games=3)
+        assert len(results) == 3
+        assert len(server.connections) == 2
+        report = server.latency_report()
+        assert set(report) == {"bot0", "bot1"}
+        assert report["bot0"]["p50"] <= report["bot0"]["p99"]
+
+    def test_deadline_fallback(self):
+        slow = types.SimpleNamespace(generate_move=lambda *args: time.sleep(0.05) or tron.Turn.LEFT_90)
+        server, results = self._play([slow, wallhugger], num_games=1, deadline=0.01)
+        assert server.timeouts["bot0"] == server.latency_report()["bot0"]["moves"]
+
+    def test_disconnect_stops_run(self):
+        def one_game(rfile):
+            for line in rfile:
+                yield line
+                if json.loads(line)["type"] == "end":
+                    return
+
+        def quit_after_one_game(sock):
+            bot_client.play(wallhugger, one_game(sock.makefile("r")), sock.makefile("w"), "quitter")
+            sock.close()
+
+        async def run():
+            server = MatchServer(size=15, players=2, concurrency=2, pool_timeout=0.2)
+            port = await server.start_tcp()
+            sock = socket.create_connection(("127.0.0.1", port))
+            threading.Thread(target=bot_client.play, daemon=True,
+                             args=(wallhugger, sock.makefile("r"), sock.makefile("w"), "bot0")).start()
+            threading.Thread(target=quit_after_one_game, daemon=True,
+                             args=(socket.create_connection(("127.0.0.1", port)),)).start()
+            while len(server.connections) < 2:
+                await asyncio.sleep(0.01)
+            results = await asyncio.wait_for(server.run(num_games=10), timeout=10)
+            await server.close()
+            return server, results
+
+        server, results = asyncio.run(run())
+        assert 1 <= len(results) < 10
+        assert "1 live bots" in server.stopped
+
+class TestConcurrentMoves():
+
+    def test_threads_overlap(self):
+        slow = types.SimpleNamespace(generate_move=lambda *args, **kwargs: time.sleep(0.1) or tron.Turn.STRAIGHT)
+        game = tron.Tron(size=20, num_players=4)
+        obs = game.reset()
+        moves = ConcurrentMoves([slow] * 4, concurrent=True)
+        start = time.perf_counter()
+        actions = moves.generate_moves(obs, uids=range(4))
+        elapsed = time.perf_counter() - start
+        moves.close()
+        assert actions == [tron.Turn.STRAIGHT] * 4
+        assert elapsed < 0.3
+
+    def test_process_pool(self):
+        game = tron.Tron(size=20, num_players=2)
+        obs = game.reset()
+        moves = ConcurrentMoves([wallhugger, wallhugger], concurrent=True)
+        assert moves.process_pool is not None
+        actions = moves.generate_moves(obs, uids=range(2))
+        moves.close()
+        serial = ConcurrentMoves([wallhugger, wallhugger], concurrent=False).generate_moves(obs, uids=range(2))
+        assert actions == serial
+
+class TestTablebase():
+
+    def test_solve_exact(self):
+        tb = tablebase.Tablebase()
+        # stem of 2 then branches of 1 (left) and 3 (right)
+        cells = {(2, 2), (1, 2), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5)}
+        length, step = tb.solve(frozenset(cells), (3, 2), tron.Orientation.N)
+        assert length == 6
+        assert step == 0
+        path = tb.path(3, 2, tron.Orientation.N, cells)
+        assert len(path) == 6
+        assert [p[0] for p in path[:4]] == [tron.Turn.STRAIGHT] * 3 + [tron.Turn.RIGHT_90]
+        # reversing into the free cell behind the head is not allowed
+        assert tb.solve(frozenset({(1, 0), (2, 0)}), (0, 0), tron.Orientation.N) == (0, -1)
+
+    def test_translation_shares_entries(self):
+        tb = tablebase.Tablebase()
+        cells = {(1, 1), (1, 2), (2, 2)}
+        tb.solve(frozenset(cells), (0, 1), tron.Orientation.S)
+        misses = tb.misses
+        shifted = {(y + 5, x + 7) for y, x in cells}
+        tb.solve(frozenset(shifted), (5, 8), tron.Orientation.S)
+        assert tb.misses == misses
+        assert tb.hits == 1
+
+    def test_save_load(self, tmp_path):
+        tb = tablebase.Tablebase()
+        cells = frozenset((y, x) for y in range(3) for x in range(3)) - {(0, 0)}
+        expected = tb.solve(cells, (0, 0), tron.Orientation.E)
+        filename = tb.save(str(tmp_path / "tablebase.json"))
+        loaded = tablebase.Tablebase(filename=filename)
+        assert len(loaded.table) == len(tb.table)
+        assert loaded.solve(cells, (0, 0), tron.Orientation.E) == expected
+        assert loaded.misses == 0
+
+    def test_resolve_fill_exact(self):
+        tb = tablebase.Tablebase(max_cells=32)
+        game = tron.Tron(size=10, num_players=2, resolve="fill", tablebase=tb)
+        game.reset()
+        game.grid[5, :, 0] = 1
+        game.grid[:, :, 1:] = 0
+        game.players[0].y, game.players[0].x = 2, 2
+        game.players[0].orientation = tron.Orientation.N
+        game.players[1].y, game.players[1].x = 7, 3
+        game.players[1].orientation = tron.Orientation.S
+        game._update()
+        obs, done, status, reward = game.move(tron.Turn.STRAIGHT, tron.Turn.STRAIGHT)
+        assert done is True
+        assert tb.misses > 0
+        # every free cell of the lower region is used
+        assert game.steps_skipped == game.resolution["region_sizes"][1]
+        assert status[0] == tron.Status.VALID
+
+    def test_endgame_agent(self):
+        board = bot_client.new_board(8, 2)
+        # player 0 sealed in a corridor along the top wall
+        board[2, 1:7, 0] = 1
+        board[1, 3, 1] = 1
+        board[6, 6, 2] = 1
+        positions = ((1, 3), (6, 6))
+        orientations = (tron.Orientation.S, tron.Orientation.N)
+        # three free cells to the right beat two to the left
+        assert endgame.generate_move(board, positions, orientations, 0) == tron.Turn.LEFT_90
+
+    def test_background_deadline(self):
+        slow = types.SimpleNamespace(generate_move=lambda *args, **kwargs: time.sleep(0.2) or tron.Turn.LEFT_90)
+        fast = types.SimpleNamespace(generate_move=lambda *args, **kwargs: tron.Turn.RIGHT_90)
+        game = tron.Tron(size=20, num_players=2)
+        obs = game.reset()
+        thinker = BackgroundMoves([slow, fast], deadline=0.05)
+        thinker.submit(obs, uids=range(2))
+        start = time.perf_counter()
+        moves = thinker.collect()
+        assert time.perf_counter() - start < 0.15
+        # the slow agent falls back to a legal move
+        assert moves == [tron.Turn.STRAIGHT, tron.Turn.RIGHT_90]
+        assert thinker.timeouts == 1
+
+        # the late move for the old observation is dropped
+        obs, done, status, reward = game.move(*moves)
+        thinker.submit(obs, uids=range(2))
+        time.sleep(0.25)
+        assert thinker.collect(deadline=0.5) == [tron.Turn.LEFT_90, tron.Turn.RIGHT_90]
+        thinker.close()
+
+class TestExport():
+
+    def _saved_game(self, tmp_path):
+        game = tron.Tron(size=10, num_players=2)
+        game.reset()
+        done = False
+        while not done:
+            obs, done, status, reward = game.move(tron.Turn.STRAIGHT, tron.Turn.STRAIGHT)
+        return game, game.save(fname_base=str(tmp_path / "game"))
+
+    def test_frames(self, tmp_path):
+        game, filename = self._saved_game(tmp_path)
+        grid, states = tron.Tron.load(filename)
+        frames = list(export.iter_frames(grid, states, cellsize=2))
+        assert len(frames) == max(len(p["y"]) for p in states)
+        assert frames[0].shape == (20, 20, 3)
+        lut = export.palette(2)
+        p = states[1]
+        # head in the dark color and the previous cell in the tail color
+        np.testing.assert_equal(frames[1][2 * p["y"][1], 2 * p["x"][1]], lut[5])
+        np.testing.assert_equal(frames[1][2 * p["y"][0], 2 * p["x"][0]], lut[4])
+        np.testing.assert_equal(frames[0][0, 0], lut[export.WALL])
+        # every n-th frame keeps the final frame
+        assert len(list(export.iter_frames(grid, states, every=100))) == 1
+
+    def test_export_png(self, tmp_path):
+        game, filename = self._saved_game(tmp_path)
+        outputs = export.export_games([filename], out_dir=str(tmp_path / "out"), every=2, workers=1)
+        files = outputs[filename]
+        assert len(files) > 0
+        Image = pytest.importorskip("PIL.Image")
+        grid, states = tron.Tron.load(filename)
+        last = list(export.iter_frames(grid, states))[-1]
+        np.testing.assert_equal(np.array(Image.open(files[-1])), last)
+
+class TestInterface():
+
+    def test_incremental_matches_full_redraw(self, monkeypatch):
+        monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+        interface = pytest.importorskip("interface")
+        pygame = interface.pygame
+        ui = interface.UserInterface(size=20, num_players=3, width=160, human=False,
+                                     agents=['agent.random_avoid'])
+        for ii in range(10):
+            ui.render("")
+            actions = ui.process_input()
+            if ui.done:
+                break
+            ui.update(*actions)
+        ui.render("")
+        incremental = pygame.surfarray.array3d(ui.board_surf)
+        # only head cells are repainted after the first frame
+        assert len(ui._update_board(ui.observation)) == ui.num_players
+
+        ui.heads = None
+        ui._update_board(ui.observation)
+        np.testing.assert_equal(incremental, pygame.surfarray.array3d(ui.board_surf))
+        ui._quit()
+
+    def test_color_pairs_match_pygame(self, monkeypatch):
+        monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+        interface = pytest.importorskip("interface")
+        names = ['blue', 'red', 'darkorange', 'darkorchid', 'aquamarine', 'brown', 'cadetblue', 'chartreuse',
+                 'coral', 'cyan', 'darkgoldenrod']
+        # export.py colors frames with the same pairs without importing pygame
+        assert export.COLOR_PAIRS is interface.COLOR_PAIRS
+        assert interface.COLOR_PAIRS == [(interface.COLORS[f"{name}4"], interface.COLORS[f"{name}1"])
+                                         for name in names]
+
+class TestLive():
+
+    def _play(self, game, steps=None):
+        obs = game._get_observation()
+        done, step = False, 0
+        while not done and (steps is None or step < steps):
+            actions = [wallhugger.generate_move(obs['board'], obs['positions'], obs['orientations'], uid)
+                       for uid in range(game.num_players)]
+            obs, done, status, reward = game.move(*actions)
+            step += 1
+        return done
+
+    def test_follow_record(self, tmp_path):
+        filename = str(tmp_path / "live.jsonl")
+        game = tron.Tron(size=15, num_players=3, record=filename)
+        game.reset()
+        reader = live.LiveReader(filename)
+        assert reader.poll() == 0
+        np.testing.assert_equal(reader.grid[:, :, 0], game.grid[:, :, 0])
+
+        self._play(game, steps=3)
+        assert reader.poll() == 3
+        assert reader.done is False
+        self._play(game)
+        reader.poll()
+        assert reader.done is True
+        for p, state in zip(game.players, reader.states):
+            assert state["x"] == p.states["x"]
+            assert state["y"] == p.states["y"]
+            assert state["status"] == [int(s) for s in p.states["status"]]
+
+    def test_follow_across_reset(self, tmp_path):
+        filename = str(tmp_path / "live.jsonl")
+        game = tron.Tron(size=15, num_players=2, record=filename)
+        game.reset()
+        reader = live.LiveReader(filename)
+        self._play(game)
+        reader.poll()
+        assert reader.done is True
+        # the next game rewrites a shorter record
+        game.reset()
+        self._play(game, steps=2)
+        assert reader.poll() == 2
+        assert reader.done is False
+        for p, state in zip(game.players, reader.states):
+            assert state["x"] == p.states["x"] and state["y"] == p.states["y"]
+
+    def test_partial_line(self, tmp_path):
+        filename = str(tmp_path / "live.jsonl")
+        game = tron.Tron(size=15, num_players=2, record=filename)
+        game.reset()
+        reader = live.LiveReader(filename)
+        with open(filename, "a") as file:
+            file.write('{"type": "step", "sta')
+        assert reader.poll() == 0
+
+    def test_replay_follow(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+        replay = pytest.importorskip("replay")
+        pygame = replay.pygame
+        filename = str(tmp_path / "live.jsonl")
+        game = tron.Tron(size=20, num_players=2, record=filename)
+        game.reset()
+
+        viewer = replay.ReplayInterface(width=160)
+        viewer.load(filename, follow=True)
+        viewer.render()
+        done = False
+        while not done:
+            done = self._play(game, steps=2)
+            viewer.update()
+            viewer.render()
+        assert viewer.step == max(len(p.states["x"]) for p in game.players)
+        incremental = pygame.surfarray.array3d(viewer.board_surf)
+
+        viewer.drawn_step = None
+        viewer._update_board()
+        np.testing.assert_equal(incremental, pygame.surfarray.array3d(viewer.board_surf))
+        pygame.quit()
+
+class TestMosaic():
+
+    def test_tiles(self, monkeypatch):
+        monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+        mosaic_module = pytest.importorskip("mosaic")
+        games = [tron.Tron(size=10, num_players=2) for ii in range(5)]
+        observations = [g.reset() for g in games]
+        observations[3], done, status, reward = games[3].move(tron.Turn.STRAIGHT, tron.Turn.STRAIGHT)
+
+        mosaic = mosaic_module.Mosaic(5, 10, 10, 2)
+        assert mosaic.shape == (2 * 11, 3 * 11)
+        labels = mosaic.update([o['board'] for o in observations], [o['positions'] for o in observations])
+        # fourth game is the first tile on the second row
+        tile = labels[11:21, 0:10]
+        assert (tile[0, :] == export.WALL).all()
+        (y0, x0), (y1, x1) = observations[3]['positions']
+        assert tile[y0, x0] == 3 and tile[y1, x1] == 5
+        assert tile[games[3].players[0].states["y"][0], games[3].players[0].states["x"][0]] == 2
+        assert (labels[10, :] == mosaic.BORDER).all()
+        # the sixth tile is unused
+        assert (labels[11:21, 22:32] == export.FREE).all()
+
+        surface = mosaic_module.pygame.Surface((mosaic.shape[1] * 2, mosaic.shape[0] * 2))
+        mosaic.draw(surface)
+        pixels = mosaic_module.pygame.surfarray.array3d(surface).swapaxes(0, 1)
+        np.testing.assert_equal(pixels[2 * (11 + y0), 2 * x0], mosaic.lut[3])
+
+class TestApproximators():
+
+    @pytest.mark.parametrize("kind", approximators.APPROXIMATORS)
+    def test_fit_batch(self, kind):
+        rng = np.random.default_rng(1)
+        sizes = [2] * 25
+        states = rng.integers(0, 2, size=(64, 25))
+        actions = rng.integers(0, 3, size=64)
+        # value depends on the action and the cell ahead
+        targets = np.where(states[:, 7] == 1, -10.0, 1.0) * (actions + 1)
+        q_function = approximators.build(kind, sizes, 3, learning_rate=0.2 if kind == "tiles" else 0.01)
+        assert q_function.q_values(states).shape == (64, 3)
+
+        def error():
+            return np.mean((q_function.q_values(states)[np.arange(64), actions] - targets)**2)
+        before = error()
+        for ii in range(200):
+            q_function.update(states, actions, targets)
+        assert error() < 0.1 * before
+
+    def test_tiles_constant_memory(self):
+        small = approximators.TileCodedQ([2] * 9, memory=2**12)
+        large = approximators.TileCodedQ([2] * 225, memory=2**12)
+        assert small.weights.shape == large.weights.shape
+        assert large.q_values(np.ones((5, 225), dtype=int)).shape == (5, 3)
+
+class TestEligibilityTraces():
+
+    def test_decay_and_truncate(self):
+        traces = EligibilityTraces(threshold=0.1)
+        table = np.zeros((4, 3))
+        traces.visit(np.ravel_multi_index((0, 1), table.shape))
+        traces.decay(0.5)
+        traces.visit(np.ravel_multi_index((2, 2), table.shape))
+        traces.visit(np.ravel_multi_index((2, 2), table.shape))  # replacing - stays at 1
+        traces.apply(table, 2.0)
+        assert table[0, 1] == 1.0 and table[2, 2] == 2.0
+        assert len(traces) == 2
+        traces.decay(0.05)
+        assert len(traces) == 0
+
+    def test_sarsa_lambda_credit(self, tmp_path):
+        sarsa = pytest.importorskip("sarsa")
+        learner = sarsa.SARSA(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / "sarsa"), trace_decay=0.9,
+                              learning_rate=0.5)
+        states = [[0] * 9, [1] + [0] * 8, [0, 1] + [0] * 7, [0, 0, 1] + [0] * 6]
+        straight = tron.Turn.STRAIGHT
+        for s, s_prime in zip(states[:-2], states[1:-1]):
+            learner.update_table(s, straight, 0, s_prime, straight)
+        learner.update_table(states[-2], straight, -100, states[-1], straight)
+        # the crash reaches every earlier state-action pair of the episode
+        for s in states[:-1]:
+            assert learner.q_table[tuple(s) + (learner.ACTION_MAP[straight],)] < 0
+
+class TestActorLearner():
+
+    def test_transition_rows(self):
+        # episodes of 2 and 3 transitions - final states at rows 2 and 6
+        np.testing.assert_equal(actor_learner.transition_rows([2, 3]), [0, 1, 3, 4, 5])
+
+    def test_learn_episodes_matches_update_table(self, tmp_path):
+        q_learning = pytest.importorskip("q_learning")
+        batched = q_learning.QLearning(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / "a"))
+        single = q_learning.QLearning(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / "b"))
+        states = np.array([[0] * 9, [1] + [0] * 8, [0, 1] + [0] * 7, [1] * 9, [0, 0, 1] + [0] * 6], dtype=np.int8)
+        actions = np.array([1, 0, 2, 1, 1], dtype=np.int8)
+        rewards = np.array([1.0, -10.0, 1.0], dtype=np.float32)
+        batched.learn_episodes(states, actions, rewards, np.array([2, 1]))
+        for s, a, r, s_prime in ((0, 1, 1.0, 1), (1, 0, -10.0, 2), (3, 1, 1.0, 4)):
+            single.update_table(states[s], single.DIRECTION_MAP[a], r, states[s_prime])
+        np.testing.assert_allclose(batched.q_table, single.q_table)
+
+    @pytest.mark.parametrize("module,cls", [("q_learning", "QLearning"), ("sarsa", "SARSA")])
+    def test_learn_episodes_repeated_state_action(self, tmp_path, module, cls):
+        trainer = getattr(pytest.importorskip(module), cls)
+        learner = trainer(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / module))
+        # 60 one step episodes of the same (s, STRAIGHT) - two rewards
+        s, s_prime = [0] * 9, [1] * 9
+        states = np.array([s, s_prime] * 60, dtype=np.int8)
+        actions = np.array([1, 1] * 60, dtype=np.int8)
+        rewards = np.array([1.0, -10.0] * 30, dtype=np.float32)
+        for ii in range(5):
+            learner.learn_episodes(states, actions, rewards, np.ones(60, dtype=int))
+        # one averaged step per batch towards the mean reward
+        expected = -4.5 * (1 - (1 - learner.learning_rate)**5)
+        np.testing.assert_allclose(learner.q_table[tuple(s) + (1,)], expected)
+
+    def test_train(self, tmp_path):
+        q_learning = pytest.importorskip("q_learning")
+        learner = q_learning.QLearning(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / "ql"))
+        stats, throughput = actor_learner.train(learner, num_episodes=10, num_actors=2, queue_size=2,
+                                                episodes_per_batch=3, refresh_every=1)
+        assert len(stats) == 10
+        assert [s["episode"] for s in stats] == list(range(10))
+        assert np.any(learner.q_table != 0)
+        assert throughput["actor_steps_per_s"] > 0 and throughput["learner_steps_per_s"] > 0
+        assert 0 < throughput["spawn_s"] <= throughput["spawn_max_s"]
+
+class TestSelfPlay():
+
+    @pytest.mark.parametrize("module,cls", [("q_learning", "QLearning"), ("sarsa", "SARSA")])
+    def test_all_players_learn(self, tmp_path, module, cls):
+        trainer = getattr(pytest.importorskip(module), cls)
+        learner = trainer(size=10, players=3, agents=['agent.wallhugger'], filename_root=str(tmp_path / module))
+        counts = []
+        original = learner.learn_episodes
+
+        def learn_episodes(states, actions, rewards, lengths):
+            counts.append(len(lengths))
+            original(states, actions, rewards, lengths)
+        learner.learn_episodes = learn_episodes
+        learner.run_self_play(num_episodes=3)
+        # one transition per player every step
+        assert counts and set(counts) == {3}
+        assert np.any(learner.q_table != 0)
+        assert len(learner.game_stats) == 3
+
+    def test_frozen_opponents(self, tmp_path):
+        q_learning = pytest.importorskip("q_learning")
+        learner = q_learning.QLearning(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / "ql"))
+        counts = []
+        original = learner.learn_episodes
+
+        def learn_episodes(states, actions, rewards, lengths):
+            counts.append(len(lengths))
+            original(states, actions, rewards, lengths)
+        learner.learn_episodes = learn_episodes
+        # every opponent plays the frozen snapshot - only uid=1 learns
+        learner.run_self_play(num_episodes=2, frozen_every=1, frozen_prob=1.0)
+        assert set(counts) == {1}
+
+    def test_self_play_traces(self, tmp_path):
+        sarsa = pytest.importorskip("sarsa")
+        learner = sarsa.SARSA(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / "sarsa"),
+                              trace_decay=0.8)
+        learner.run_self_play(num_episodes=2)
+        assert np.any(learner.q_table != 0)
+
+class TestTrainer():
+
+    @pytest.mark.parametrize("agents", ['agent.wallhugger', ['agent.wallhugger']])
+    def test_opponents_fill_players(self, tmp_path, agents):
+        q_learning = pytest.importorskip("q_learning")
+        learner = q_learning.QLearning(size=10, players=4, agents=agents, filename_root=str(tmp_path / "ql"))
+        assert learner.agent_list == ['agent.wallhugger'] * 3
+        assert len(learner.agents) == 3
+        game = learner._new_game()
+        moves = learner.opponents.generate_moves(game.reset(), uids=range(1, len(learner.agents)+1),
+                                                 rngs=game.player_rngs)
+        # a move for every opponent - none sit still
+        assert len(moves) == 3
+
+class TestConvergence():
+
+    def test_delta_q_rule(self):
+        tracker = convergence.ConvergenceTracker(window=3, tol=0.1)
+        q = np.zeros((4, 3))
+        stats = {"num_actions": 10, "total_reward": 5}
+        assert not tracker.update(q, stats)  # first episode has no change to measure
+        q[0, 0] = 1.0
+        assert not tracker.update(q, stats)
+        assert tracker.delta_q[-1] == 1.0
+        for ii in range(2):
+            assert not tracker.update(q, stats)  # the 1.0 change is still in the window
+        assert tracker.update(q, stats)
+        assert "dQ" in tracker.reason
+
+    def test_patience_rule(self):
+        tracker = convergence.ConvergenceTracker(window=2, patience=3)
+        q = np.zeros(3)
+        rewards = [1, 2, 3, 4, 2, 2, 2, 2]
+        stops = [tracker.update(q, {"num_actions": r, "total_reward": r}) for r in rewards]
+        assert stops.index(True) == 6  # rolling 3.5 after the 4th, then 3 episodes without a gain
+        assert tracker.rolling_reward == 2 and tracker.rolling_length == 2
+
+    def test_coverage(self):
+        tracker = convergence.ConvergenceTracker()
+        visits = np.zeros((2, 2, 3), dtype=int)
+        visits[0, 1, 2] = 4
+        tracker.update(np.zeros(3), {"num_actions": 1, "total_reward": 1}, visits=visits)
+        assert tracker.coverage == 1 / 12
+        assert tracker.history[-1]["coverage"] == 1 / 12
+
+    @pytest.mark.parametrize("module,cls", [("q_learning", "QLearning"), ("sarsa", "SARSA"),
+                                            ("monte_carlo", "MonteCarlo")])
+    def test_learner_coverage(self, tmp_path, module, cls):
+        trainer = getattr(pytest.importorskip(module), cls)
+        tracker = convergence.ConvergenceTracker()
+        learner = trainer(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / module), tracker=tracker)
+        s = np.zeros(len(learner.q_table.shape) - 1, dtype=int)
+        # a zero reward visit leaves Q at zero but still counts as covered
+        learner.learn_episodes(np.stack([s, s]), np.array([1, 1]), np.array([0.0]), np.array([1]))
+        learner._converged({"num_actions": 1, "total_reward": 0})
+        assert not np.any(learner.q_table)
+        assert tracker.coverage == 1 / learner.q_table.size
+        assert tracker.delta_q[-1] == 0.0
+        learner.learn_episodes(np.stack([s, s]), np.array([1, 1]), np.array([2.0]), np.array([1]))
+        learner._converged({"num_actions": 1, "total_reward": 2})
+        assert tracker.delta_q[-1] == pytest.approx(np.max(np.abs(learner.q_table)))
+        assert tracker.coverage == 1 / learner.q_table.size
+
+    def test_early_stop_training(self, tmp_path):
+        q_learning = pytest.importorskip("q_learning")
+        tracker = convergence.ConvergenceTracker(window=5, patience=1)
+        learner = q_learning.QLearning(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / "ql"),
+                                       tracker=tracker)
+        learner.run_simulation(num_episodes=200)
+        assert tracker.reason is not None
+        assert len(learner.game_stats) == tracker.episodes < 200
+
+class TestEvaluate():
+
+    def test_wilson_interval(self):
+        low, high = evaluate.wilson_interval(50, 100, 1.96)
+        assert low == pytest.approx(0.404, abs=1e-3) and high == pytest.approx(0.596, abs=1e-3)
+        low, high = evaluate.wilson_interval(0, 20, 1.96)
+        assert low == 0.0 and 0 < high < 0.2
+
+    def test_sequential_stopping(self, tmp_path):
+        filename = str(tmp_path / "q_tables.npz")
+        np.savez(filename, q_table=np.zeros(tuple(tron.Tron.state_sizes("vision", 3)) + (3,)))
+        # loose precision stops at min_games, far before max_games
+        report = evaluate.evaluate(filename, size=10, precision=0.5, min_games=20, max_games=1000,
+                                   chunk_games=10, workers=2)
+        assert 20 <= report["games"] < 1000
+        assert sum(rate for rate, low, high in report["outcomes"].values()) == pytest.approx(1.0)
+        assert sum(rate for rate, low, high in report["crashes"].values()) == pytest.approx(1.0)
+        assert report["precision"] <= 0.5
+        for rate, low, high in report["outcomes"].values():
+            assert low <= rate <= high
+
+    def test_report_independent_of_pool(self, tmp_path):
+        filename = str(tmp_path / "q_tables.npz")
+        np.savez(filename, q_table=np.zeros(tuple(tron.Tron.state_sizes("vision", 3)) + (3,)))
+        # chunks finish in a different order, the stopping rule sees the same games
+        reports = [evaluate.evaluate(filename, size=10, precision=0.2, min_games=30, max_games=200,
+                                     chunk_games=5, workers=workers, seed=3) for workers in (1, 4)]
+        assert reports[0] == reports[1]
+
+    def test_table_shape_check(self, tmp_path):
+        filename = str(tmp_path / "q_tables.npz")
+        np.savez(filename, q_table=np.zeros((2, 2, 3)))
+        with pytest.raises(ValueError):
+            evaluate.evaluate(filename, size=10)
+
+class TestMaps():
+
+    def test_text_round_trip(self, tmp_path):
+        game_map = maps.generate(20, density=0.2, seed=1)
+        filename = game_map.save(str(tmp_path / "arena.map"))
+        loaded = maps.load(filename)
+        np.testing.assert_equal(loaded.walls, game_map.walls)
+        assert maps.load(filename) is loaded  # cached until the file changes
+        assert maps.resolve("random:0.2:1", 20) is game_map
+
+    def test_static_fields(self):
+        walls = np.zeros((7, 7), dtype=bool)
+        walls[3, 1:3] = True  # spur from the west wall
+        game_map = maps.GameMap(walls)
+        assert game_map.wall_distance[3, 3] == 1 and game_map.wall_distance[2, 4] == 2
+        assert game_map.wall_distance[0, 0] == 0
+        # facing E from (3, 3) the cells (3, 4) and (3, 5) are free
+        assert game_map.free_runs[1, 3, 3] == 2
+        assert game_map.free_runs[0, 5, 1] == 1  # N from (5, 1) stops at the spur
+        assert len(game_map.component_sizes) == 1 and game_map.component_sizes[0] == 25 - 2
+
+    def test_generated_map_is_connected(self):
+        game_map = maps.generate(30, density=0.3, seed=4)
+        free = ~game_map.walls
+        assert len(game_map.component_sizes) == 1
+        assert free[1:-1, 1:-1].sum() < 0.8 * 28**2
+        # point symmetric layout
+        np.testing.assert_equal(game_map.walls, game_map.walls[::-1, ::-1])
+        ys, xs, orientations = game_map.spawns.T
+        assert np.all(free[ys, xs])
+        assert np.all(game_map.free_runs[orientations // 2, ys, xs] > 0)
+
+    @pytest.mark.parametrize("sparse", [False, True])
+    def test_game_on_map(self, sparse):
+        game_map = maps.generate(25, density=0.15, seed=2)
+        game = tron.Tron(size=25, num_players=3, sparse=sparse, game_map=game_map)
+        observation = game.reset()
+        walls = np.array([[game.grid[y, x, 0] for x in range(25)] for y in range(25)], dtype=bool)
+        np.testing.assert_equal(walls, game_map.walls)
+        for y, x in observation['positions']:
+            assert not game_map.walls[y, x]
+        with pytest.raises(ValueError):
+            tron.Tron(size=30, game_map=game_map)
+
+class TestCatalog():
+
+    @staticmethod
+    def _play(fname_base, size=10, sparse=False):
+        game = tron.Tron(size=size, num_players=2, sparse=sparse)
+        observation = game.reset()
+        done = False
+        while not done:
+            moves = [wallhugger.generate_move(observation['board'], observation['positions'], observation['orientations'],
+                                              uid, legal_moves=observation['legal_moves'][uid]) for uid in range(2)]
+            observation, done, status, reward = game.move(*moves)
+        return game, game.save(fname_base=fname_base, agents=['agent.wallhugger', 'agent.wallhugger'])
+
+    def test_ingest_and_summary(self, tmp_path):
+        games = [self._play(str(tmp_path / f"game_{ii}"), size=10 if ii < 3 else 12, sparse=ii == 4) for ii in range(5)]
+        (tmp_path / "notes.json").write_text('{"not": "a game"}')
+        with catalog.Catalog(str(tmp_path / "games.db")) as games_db:
+            assert games_db.ingest([str(tmp_path)], workers=1) == (5, 1)
+            # nothing new - nothing parsed
+            assert games_db.ingest([str(tmp_path)], workers=1) == (0, 0)
+
+            small = [g for g, f in games[:3]]
+            summary = games_db.summary(size=10, uid=2)
+            assert summary["games"] == 3
+            assert summary["mean_length"] == pytest.approx(np.mean([g.get_game_stats(1)["num_actions"] for g in small]))
+            assert games_db.summary(agent="agent.wallhugger")["games"] == 5
+            statuses = games_db.query("SELECT status_name, COUNT(*) FROM players GROUP BY status_name")
+            assert sum(count for name, count in statuses) == 10
+
+            # a replaced file is parsed again, a deleted one pruned
+            os.remove(games[0][1])
+            assert games_db.prune() == 1
+            assert games_db.summary()["games"] == 4
+            assert games_db.query("SELECT COUNT(*) FROM players")[0][0] == 8
+
+class TestBatchSimulator():
+
+    def test_seeded_batch(self, tmp_path):
+        throughput = simulator.run_batch(12, workers=2, size=12, fname_root="batch", out_dir=str(tmp_path),
+                                         seed=40, record_every=5, chunk_games=3)
+        assert throughput["games"] == 12 and throughput["steps_per_s"] > 0
+        assert 0 < throughput["spawn_s"] <= throughput["spawn_max_s"]
+        rows = [json.loads(line) for shard in tmp_path.glob("batch_summary_*.jsonl")
+                for line in shard.read_text().splitlines()]
+        assert sorted(r["game"] for r in rows) == list(range(12))
+        assert {r["seed"] - r["game"] for r in rows} == {40}
+        assert sorted(r["game"] for r in rows if "record" in r) == [0, 5, 10]
 
+        # any game replays alone from its seed
+        row = next(r for r in rows if r["game"] == 7)
+        moves = ConcurrentMoves([wallhugger, wallhugger], concurrent=False)
+        game, steps = simulator.play_game(moves, 2, 12, row["seed"])
+        assert steps == row["steps"]
+        assert [tron.Status(s).name for s in game.status] == row["status"]
 
+class TestHeadless():
 
+    def test_imports_only_numpy(self):
+        modules = ["tron", "simulator", "actor_learner", "evaluate", "vec_env", "catalog", "maps",
+                   "agent.wallhugger", "agent.random_avoid", "agent.endgame", "q_learning", "sarsa", "monte_carlo"]
+        code = ("import sys\n" + "".join(f"import {m}\n" for m in modules) +
+                "print(','.join(m for m in ('pandas', 'matplotlib', 'pygame') if m in sys.modules))")
+        loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        assert loaded.stdout.strip() == ""
 
+    def test_game_stats_round_trip(self, tmp_path):
+        q_learning = pytest.importorskip("q_learning")
+        learner = q_learning.QLearning(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / "ql"))
+        learner.run_simulation(num_episodes=3, game_save_modulo=1000)
+        learner.run_simulation(num_episodes=2, game_save_modulo=1000)
+        reloaded = q_learning.QLearning(size=10, agents=['agent.wallhugger'], filename_root=str(tmp_path / "ql"))
+        assert [s["episode"] for s in reloaded.game_stats] == list(range(5))
+        for saved, kept in zip(reloaded.game_stats, learner.game_stats):
+            assert saved == {key: int(value) if key != "total_reward" else value for key, value in kept.items()}
 
+class TestStreams():
 
+    def test_block_draws(self):
+        draws = streams.Draws(7, block_size=16)
+        scalars = [draws.random() for ii in range(40)]
+        np.testing.assert_equal(scalars, np.random.default_rng(7).random(48)[:40])
+        assert all(0 <= draws.integers(3) < 3 for ii in range(100))
 
+    def test_seeded_games_ignore_thread_order(self):
+        runs = []
+        for concurrent in (False, True, True):
+            moves = ConcurrentMoves([random_avoid] * 3, concurrent=concurrent)
+            game, steps = simulator.play_game(moves, 3, 20, seed=11)
+            moves.close()
+            runs.append((steps, [p.states["actions"] for p in game.players], list(game.status)))
+        assert runs[0] == runs[1] == runs[2]
+        game, steps = simulator.play_game(ConcurrentMoves([random_avoid] * 3, concurrent=False), 3, 20, seed=12)
+        assert [p.states["actions"] for p in game.players] != runs[0][1]
 
+    def test_process_agents_draw_the_same_stream(self):
+        serial, _ = simulator.play_game(ConcurrentMoves([random_avoid] * 2, concurrent=False), 2, 15, seed=5)
+        moves = ConcurrentMoves([random_avoid] * 2, concurrent=True)
+        assert moves.process_pool is not None
+        pooled, _ = simulator.play_game(moves, 2, 15, seed=5)
+        moves.close()
+        assert [p.states["actions"] for p in pooled.players] == [p.states["actions"] for p in serial.players]
 
+    def test_trainer_reproducible(self, tmp_path):
+        q_learning = pytest.importorskip("q_learning")
+        global_state = np.random.get_state()[1].copy()
+        tables, stats = [], []
+        for run in range(2):
+            learner = q_learning.QLearning(size=10, agents=['agent.random_avoid'], epsilon=0.5, seed=3,
+                                           filename_root=str(tmp_path / f"ql{run}"))
+            learner.run_simulation(num_episodes=5, game_save_modulo=1000)
+            tables.append(learner.q_table)
+            stats.append(learner.game_stats)
+        np.testing.assert_equal(tables[0], tables[1])
+        assert stats[0] == stats[1]
+        np.testing.assert_equal(np.random.get_state()[1], global_state)
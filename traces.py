@@ -0,0 +1,50 @@
+"""Sparse eligibility traces for tabular SARSA(lambda) and Watkins Q(lambda)
+
+Only the recently visited state-action pairs carry a trace. They are kept
+as a short array of packed ids - np.ravel_multi_index of state + (action,)
+into the Q table - next to an array of trace values, and dropped once their
+trace decays below a threshold.
+"""
+import numpy as np
+
+
+class EligibilityTraces:
+    """Replacing traces over packed state-action ids"""
+
+    def __init__(self, threshold: float = 1e-3):
+        """Constructor
+
+        Args:
+            threshold (float): traces below this are dropped
+        """
+        self.threshold = threshold
+        self.ids = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def reset(self) -> None:
+        """Clear all traces - new episode or exploratory action for Watkins Q(lambda)"""
+        self.ids = np.empty(0, dtype=np.int64)
+        self.values = np.empty(0)
+
+    def visit(self, sa_id: int) -> None:
+        """Set the trace of a visited state-action pair to 1"""
+        hit = np.flatnonzero(self.ids == sa_id)
+        if len(hit):
+            self.values[hit] = 1.0
+        else:
+            self.ids = np.append(self.ids, sa_id)
+            self.values = np.append(self.values, 1.0)
+
+    def apply(self, table: np.ndarray, step: float) -> None:
+        """Add step times the trace to every traced entry of the table in one update"""
+        table.flat[self.ids] += step * self.values
+
+    def decay(self, factor: float) -> None:
+        """Multiply every trace by factor (discount * lambda) and drop the small ones"""
+        self.values *= factor
+        keep = self.values >= self.threshold
+        if not keep.all():
+            self.ids, self.values = self.ids[keep], self.values[keep]
@@ -0,0 +1,657 @@
+"""Shared training loops for the Tron learners
+
+Trainer holds everything QLearning, SARSA and MonteCarlo have in common -
+the opponent lineup, seeded games and exploration, the epsilon greedy policy
+over the Q table, game stats, early stopping, saving and the single game,
+vectorized and actor-learner loops. A learner only brings its update rule
+
+    _start_episode: per game learning state - traces or a trajectory
+    _learn_step: learn from (or record) one transition s, a, r, s', a'
+    _end_episode: finish learning from a game
+    learn_episodes: update from packed episodes - see actor_learner.py
+    _load_qn_tables / _save_tables: its tables on disk
+
+TDTrainer adds the one step TD machinery of QLearning and SARSA - function
+approximation, eligibility traces, visit tracking and self-play - around the
+value of the next state, _bootstrap, which is all the two rules differ in.
+"""
+import argparse
+import importlib
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+import actor_learner
+import approximators
+import convergence
+import maps
+import streams
+import tron
+from agent.util import build_agent_list, ConcurrentMoves
+from traces import EligibilityTraces
+from vec_env import VecTron
+from utilities import append_records, read_records
+
+
+class Trainer:
+    """Epsilon greedy learner of a Q table playing uid=1 - see the module docstring"""
+
+    ACTION_MAP = {tron.Turn.LEFT_90: 0, tron.Turn.STRAIGHT: 1, tron.Turn.RIGHT_90: 2}
+    DIRECTION_MAP = {v: k for k, v in ACTION_MAP.items()}
+    GAME_STATS_FIELDS = ['episode', 'num_actions', 'total_reward', 'crash_flag']
+    # default filename root tag and table file suffix
+    NAME = "trainer"
+    TABLES = "q_tables"
+
+    def __init__(self, players: int = 2, size: int = 25, agents: str = 'agent.wallhugger',
+                 discount_rate: float = 0.9, epsilon: float = 0.2,
+                 filename_root: str = None, vision_grid_size: int = 3,
+                 concurrent: bool = False, mask_actions: bool = False,
+                 features: str = "vision", tracker: Optional[convergence.ConvergenceTracker] = None,
+                 game_map: Optional[str] = None, seed: Optional[int] = None):
+        self.players = players
+        self.size = size
+        self.discount_rate = discount_rate # future reward value
+        self.epsilon = epsilon # greedy selection probability
+
+        self.vision_grid_size = vision_grid_size
+        self.mask_actions = mask_actions # only explore legal actions
+        self.features = features # learner state - see tron.Tron.get_state
+        # obstacle map shared by every game - file or random spec, see maps.resolve
+        self.game_map = maps.resolve(game_map, size)
+        # every game is seeded with the next child spawned from seed - see streams.py
+        self.seed_sequence = streams.seed_sequence(seed)
+        # exploration draws - the learner's stream of the current game, see _new_game
+        self.draws = streams.Draws(self.seed_sequence.spawn(1)[0])
+        # filenames for storing data
+        self.fname_root = (f'tron_{self.NAME}_{self.size}x{self.size}_{self.players}players' if not filename_root else filename_root)
+        if not filename_root and features != "vision":
+            self.fname_root += f"_{features}"
+        self._qn_fname = f'{self.fname_root}_{self.TABLES}.npz'
+        self._game_stats_fname = f'{self.fname_root}_game_stats.csv'
+
+        # one opponent module per player uid > 1 - the last one given fills the rest
+        self.agent_list = build_agent_list(self.players-1, [agents] if isinstance(agents, str) else list(agents))
+        # player lineup stored with saved games
+        self.lineup = [type(self).__name__] + self.agent_list
+        self.agents = [importlib.import_module(a) for a in self.agent_list]
+        # opponent moves - optionally generated concurrently
+        self.opponents = ConcurrentMoves(self.agents, concurrent=concurrent)
+
+        # Q table, approximator and game stats data
+        self.q_table: Optional[np.ndarray] = None
+        self.q_function = None
+        # visited state-action entries and max |dQ| since the last episode - see _converged
+        self.visited = 0
+        self._delta_q = 0.0
+        # optional early stopping - see convergence.py
+        self.tracker = tracker
+        self._probe: Optional[np.ndarray] = None
+        self.game_stats: list[Dict] = []
+
+        self._load_qn_tables()
+        self._load_game_stats()
+
+    def _load_qn_tables(self) -> None:
+        raise NotImplementedError
+
+    def _save_tables(self, fp) -> None:
+        raise NotImplementedError
+
+    def _load_game_stats(self) -> None:
+        if os.path.exists(self._game_stats_fname):
+            print("Loading saved game stats")
+        else:
+            print("Initializing new game stats")
+        self.game_stats = read_records(self._game_stats_fname)
+
+    def _initialize_table(self, vision_grid_size: int, dtype) -> np.ndarray:
+        """Initialize a table with an entry per state-action"""
+        size = tuple(tron.Tron.state_sizes(self.features, vision_grid_size)) + tuple([len(tron.Turn)])
+        table = np.zeros(size, dtype=dtype)
+        return table
+
+    def _q_values(self, states: np.ndarray) -> np.ndarray:
+        """Action values for a batch of states from the Q table or approximator"""
+        if self.q_function is not None:
+            return self.q_function.q_values(states)
+        return self.q_table[tuple(states.T)]
+
+    def select_action(self, state, legal_moves: Optional[np.ndarray] = None) -> tron.Turn:
+        """Pick best action from Q table
+
+        legal_moves is the optional action mask from the observation. When
+        given, exploration only picks legal actions (if there are any)
+        """
+        idx_a = np.argmax(self._q_values(np.asarray(state)[None])[0])
+        x = self.draws.random()
+        if x > self.epsilon:
+            return self.DIRECTION_MAP[idx_a]
+        elif legal_moves is not None and np.any(legal_moves):
+            legal = np.flatnonzero(legal_moves)
+            return self.DIRECTION_MAP[legal[self.draws.integers(len(legal))]]
+        else:
+            return self.DIRECTION_MAP[self.draws.integers(len(self.DIRECTION_MAP))]
+
+    def select_actions(self, states: np.ndarray, legal_moves: Optional[np.ndarray] = None) -> list[tron.Turn]:
+        """Pick best actions from Q table for a batch of states"""
+        states = np.asarray(states)
+        idx_a = np.argmax(self._q_values(states), axis=1)
+        x = self.draws.random(len(states))
+        explore = x <= self.epsilon
+        if legal_moves is None:
+            idx_a[explore] = self.draws.integers(len(self.DIRECTION_MAP), size=np.sum(explore))
+        else:
+            # random legal action per row - all actions when none are legal
+            weights = np.where(np.any(legal_moves, axis=1, keepdims=True), legal_moves, True)
+            keys = self.draws.random(weights.shape) * weights
+            idx_a[explore] = np.argmax(keys, axis=1)[explore]
+        return [self.DIRECTION_MAP[a] for a in idx_a]
+
+    def _start_episode(self) -> Any:
+        raise NotImplementedError
+
+    def _learn_step(self, episode: Any, s, a: tron.Turn, r: float, s_prime, a_prime: tron.Turn) -> None:
+        raise NotImplementedError
+
+    def _end_episode(self, episode: Any) -> None:
+        raise NotImplementedError
+
+    def learn_episodes(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                       lengths: np.ndarray) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def _build_game_stats(n: int, game_stats: Dict) -> Dict:
+        stats = {"episode": n}
+        stats.update(game_stats)
+        return stats
+
+    def _converged(self, game_stats: Dict) -> bool:
+        """Feed the convergence tracker with a finished episode - True when training should stop"""
+        if self.tracker is None:
+            return False
+        if self.q_function is not None:
+            if self._probe is None:
+                self._probe = convergence.probe_states(tron.Tron.state_sizes(self.features, self.vision_grid_size))
+            stop = self.tracker.update(self.q_function.q_values(self._probe), game_stats)
+        else:
+            stop = self.tracker.record(game_stats, self._delta_q, coverage=self.visited / self.q_table.size)
+            self._delta_q = 0.0
+        if self.tracker.episodes % 100 == 0:
+            print(f"    {self.tracker.summary()}")
+        if stop:
+            print(f"Stopping early after {self.tracker.episodes} episodes: {self.tracker.reason}")
+        return stop
+
+    def _new_game(self) -> tron.Tron:
+        """Game seeded with the next spawned child - exploration then draws from its uid=1 stream"""
+        game = tron.Tron(size=self.size, num_players=self.players, game_map=self.game_map,
+                         seed=self.seed_sequence.spawn(1)[0])
+        self.draws = streams.Draws(game.player_rngs[0])
+        return game
+
+    def run_simulation(self, num_episodes: int = 1000, game_save_modulo: int = 500):
+
+        stats = []
+        n_prev = len(self.game_stats)
+        for n_sim in range(num_episodes):
+            if (n_sim + 1) % 100 == 0:
+                print(f"Simulation {n_sim + 1}/{num_episodes}")
+
+            game = self._new_game()
+            observation = game.reset()
+            episode = self._start_episode()
+
+            # get current state representation (vision grid) and pick an action for it
+            s = game.get_state(uid=1, features=self.features, size=self.vision_grid_size)
+            action = self.select_action(s, observation['legal_moves'][0] if self.mask_actions else None)
+            done = False
+            while not done:
+                # RL agent is player uid=1 (first player always)
+                actions = [action]
+                # actions for players uid > 1
+                actions = actions + self.opponents.generate_moves(observation,
+                                                                  uids=range(1, len(self.agents)+1),
+                                                                  rngs=game.player_rngs)
+
+                # game move
+                observation, done, status, reward = game.move(*actions)
+                r = reward[0] # we're player 0
+                s_prime = game.get_state(uid=1, features=self.features, size=self.vision_grid_size)
+                # the next action is picked before learning - SARSA bootstraps from it
+                action_prime = self.select_action(s_prime, observation['legal_moves'][0] if self.mask_actions else None)
+                self._learn_step(episode, s, action, r, s_prime, action_prime)
+                s, action = s_prime, action_prime
+            self._end_episode(episode)
+
+            # save total game state
+            stats.append(self._build_game_stats(n=n_sim+n_prev, game_stats=game.get_game_stats(uid=1))) # RL is player uid=1
+
+            if (n_sim + 1) % game_save_modulo == 0:
+                game_fname = f"{self.fname_root}_episode_{n_prev + n_sim+1}"
+                print("Game saved: {}".format(game.save(fname_base=game_fname, agents=self.lineup)))
+            if self._converged(stats[-1]):
+                break
+
+        self._save_learning(stats)
+
+    def run_vectorized_simulation(self, num_episodes: int = 1000, num_envs: int = 8,
+                                  game_save_modulo: int = 500):
+        """Train on num_envs games at once with one batched action query per step"""
+        env = VecTron(num_envs=num_envs, players=self.players, size=self.size,
+                      agents=self.agent_list, vision_grid_size=self.vision_grid_size,
+                      features=self.features, game_map=self.game_map, seed=self.seed_sequence.spawn(1)[0])
+
+        stats = []
+        n_prev = len(self.game_stats)
+        s = env.reset()
+        episodes = [self._start_episode() for ii in range(num_envs)]
+        actions = self.select_actions(s, env.legal_moves if self.mask_actions else None)
+        stopped = False
+        while len(stats) < num_episodes and not stopped:
+            s_prime, r, dones, infos = env.step(actions)
+            actions_prime = self.select_actions(s_prime, env.legal_moves if self.mask_actions else None)
+            for ii in range(num_envs):
+                if not dones[ii]:
+                    self._learn_step(episodes[ii], s[ii], actions[ii], r[ii], s_prime[ii], actions_prime[ii])
+                    continue
+                # finished games are already reset - learn from the final state
+                sp = infos[ii]["final_state"]
+                self._learn_step(episodes[ii], s[ii], actions[ii], r[ii], sp, self.select_action(sp))
+                self._end_episode(episodes[ii])
+                episodes[ii] = self._start_episode()
+
+                # save total game state
+                n_sim = len(stats)
+                stats.append(self._build_game_stats(n=n_sim+n_prev, game_stats=infos[ii]["game_stats"]))
+                if (n_sim + 1) % 100 == 0:
+                    print(f"Simulation {n_sim + 1}/{num_episodes}")
+                if (n_sim + 1) % game_save_modulo == 0:
+                    game_fname = f"{self.fname_root}_episode_{n_prev + n_sim+1}"
+                    print("Game saved: {}".format(infos[ii]["game"].save(fname_base=game_fname, agents=self.lineup)))
+                stopped = self._converged(stats[-1])
+                if len(stats) == num_episodes or stopped:
+                    break
+            s, actions = s_prime, actions_prime
+
+        self._save_learning(stats)
+
+    def run_actor_learner(self, num_episodes: int = 1000, num_actors: int = 2, queue_size: int = 8):
+        """Learn from games played by num_actors processes - see actor_learner.py"""
+        stats, throughput = actor_learner.train(self, num_episodes=num_episodes, num_actors=num_actors,
+                                                queue_size=queue_size, seed=self.seed_sequence.spawn(1)[0])
+        self._save_learning(stats)
+        return throughput
+
+    def _save_learning(self, stats: list[Dict]) -> None:
+        # save learning statistics
+        # TODO Verify the saving/loading here
+        self.game_stats.extend(stats)
+        append_records(self._game_stats_fname, stats, self.GAME_STATS_FIELDS)
+
+        with open(self._qn_fname, "wb") as fp:
+            self._save_tables(fp)
+
+    def _print_tables(self) -> None:
+        if self.q_table is not None:
+            print(f"Reward Table")
+            print(f"    Max: {np.max(self.q_table)}")
+            print(f"    Avg: {np.mean(self.q_table)}")
+            print(f"    Min: {np.min(self.q_table)}")
+
+    def visualize_learning(self):
+        """Load learning history and plot data"""
+        # plotting is the only use of matplotlib - headless training never loads it
+        import matplotlib.pyplot as plt
+
+        num_episodes = len(self.game_stats)
+        episodes, num_actions, total_reward, crash_flag = (np.array([s[key] for s in self.game_stats])
+                                                           for key in self.GAME_STATS_FIELDS)
+        unique, counts = np.unique(crash_flag, return_counts=True)
+
+        print(f"{num_episodes} episodes on {self.size}x{self.size} board")
+        print(f"Actions:")
+        print(f"    Max: {np.max(num_actions)}")
+        print(f"    Avg: {np.mean(num_actions)}")
+        print(f"    Min: {np.min(num_actions)}")
+        print(f"Rewards:")
+        print(f"    Max: {np.max(total_reward)}")
+        print(f"    Avg: {np.mean(total_reward)}")
+        print(f"    Min: {np.min(total_reward)}")
+        print(f"Crash Flag:")
+        for cf, num in zip(unique, counts):
+            print(f"    {tron.Status(cf).name}: {(num/sum(counts)):.2%} or {num}/{sum(counts)}")
+        self._print_tables()
+
+        fig, axs = plt.subplots(ncols=1, nrows=3, sharex='col')
+        plt.subplots_adjust(hspace=0)
+
+        axs[0].scatter(episodes, num_actions, s=1)
+        axs[0].set_ylabel('Number of Actions')
+
+        axs[1].scatter(episodes, total_reward, s=1)
+        axs[1].set_ylabel('Total Reward')
+
+        axs[2].scatter(episodes, crash_flag, s=1)
+        axs[2].set_ylabel('End game state')
+
+        plt.show()
+
+
+class TDTrainer(Trainer):
+    """One step TD learner - subclasses give the value of the next state, see _bootstrap"""
+
+    def __init__(self, learning_rate: float = 0.4, approximator: Optional[str] = None,
+                 approximator_lr: Optional[float] = None, batch_size: int = 32,
+                 trace_decay: float = 0.0, **kwargs):
+        """Constructor - see Trainer for the other arguments
+
+        Args:
+            learning_rate (float): step size of the Q table update
+            approximator (str): Q function approximator instead of the Q
+                table - see approximators.py
+            approximator_lr (float): approximator step size
+            batch_size (int): transitions per semi-gradient update
+            trace_decay (float): lambda of the eligibility traces - 0 is the
+                one step update
+        """
+        self.learning_rate = learning_rate
+        # function approximation instead of the Q table - see approximators.py
+        self.approximator = approximator
+        self.approximator_lr = approximator_lr
+        self.batch_size = batch_size # transitions per semi-gradient update
+        self.trace_decay = trace_decay
+        self.traces = EligibilityTraces()
+        if approximator and trace_decay:
+            raise ValueError("Eligibility traces are only supported for the Q table")
+        # visited mask of the Q table
+        self.visits: Optional[np.ndarray] = None
+        self._batch: list[tuple] = []
+        super().__init__(**kwargs)
+
+    def _load_qn_tables(self) -> None:
+        if self.approximator:
+            self._qn_fname = f'{self.fname_root}_{self.approximator}.npz'
+            self.q_function = approximators.build(self.approximator,
+                                                  tron.Tron.state_sizes(self.features, self.vision_grid_size),
+                                                  len(tron.Turn), learning_rate=self.approximator_lr)
+            if os.path.exists(self._qn_fname):
+                print(f"Loading saved {self.approximator} Q function")
+                self.q_function.load_state_dict(np.load(self._qn_fname))
+            return
+
+        if os.path.exists(self._qn_fname):
+            print("Loading saved Q tables")
+            with open(self._qn_fname, "rb") as f:
+                npzfile = np.load(f)
+                self.q_table = npzfile['q_table']
+                # older saves have no visits - updated entries stand in for them
+                self.visits = npzfile['visits'] if 'visits' in npzfile else self.q_table != 0
+        else: # no saved data
+            print("Intializing new Q tables")
+            self.q_table = self._initialize_table(self.vision_grid_size, dtype=float)
+            self.visits = self._initialize_table(self.vision_grid_size, dtype=bool)
+        self.visited = int(np.count_nonzero(self.visits))
+
+    def _save_tables(self, fp) -> None:
+        if self.q_function is not None:
+            self._train_batch()
+            np.savez(fp, **self.q_function.state_dict())
+        else:
+            np.savez(fp, q_table=self.q_table, visits=self.visits)
+
+    @staticmethod
+    def _bootstrap(q_sp: np.ndarray, a_prime) -> Any:
+        """Value of the next state from its action values (last axis) and the next action"""
+        raise NotImplementedError
+
+    def _cut_traces(self, s, a: int) -> bool:
+        """True when the traces end before the update of taking action index a in s"""
+        return False
+
+    def _start_episode(self) -> EligibilityTraces:
+        return EligibilityTraces()
+
+    def _learn_step(self, episode: EligibilityTraces, s, a: tron.Turn, r: float, s_prime, a_prime: tron.Turn) -> None:
+        self.update_table(s, a, r, s_prime, a_prime, traces=episode)
+
+    def _end_episode(self, episode: EligibilityTraces) -> None:
+        episode.reset()
+
+    def update_table(self, s: list, a: tron.Turn, r: int, s_prime: list, a_prime: Optional[tron.Turn] = None,
+                     traces: Optional[EligibilityTraces] = None) -> None:
+        """Learn from one transition
+
+        a_prime is the action picked in s_prime - only the on-policy rules
+        read it. traces default to the learner's own for learn_episodes.
+        """
+        a_prime = -1 if a_prime is None else self.ACTION_MAP[a_prime]
+        if self.q_function is not None:
+            # minibatch of transitions for a batched semi-gradient update
+            self._batch.append((s, self.ACTION_MAP[a], r, s_prime, a_prime))
+            if len(self._batch) >= self.batch_size:
+                self._train_batch()
+            return
+
+        sa = tuple(s) + (self.ACTION_MAP[a],)
+        q_sa = self.q_table[sa]
+        q_sp = self._bootstrap(self.q_table[tuple(s_prime)], a_prime)
+        step = self.learning_rate * (r + self.discount_rate * q_sp - q_sa)
+        if not self.visits[sa]:
+            self.visits[sa] = True
+            self.visited += 1
+        # replacing traces put sa at 1, so it moves the most
+        self._delta_q = max(self._delta_q, abs(step))
+        if self.trace_decay:
+            traces = traces if traces is not None else self.traces
+            if self._cut_traces(s, self.ACTION_MAP[a]):
+                traces.reset()
+            traces.visit(np.ravel_multi_index(sa, self.q_table.shape))
+            traces.apply(self.q_table, step)
+            traces.decay(self.discount_rate * self.trace_decay)
+            return
+        self.q_table[sa] = q_sa + step
+
+    def _train_batch(self) -> None:
+        """Update the approximator towards r + discount * the bootstrapped next state value"""
+        if not self._batch:
+            return
+        s, a, r, s_prime, a_prime = (np.array(v) for v in zip(*self._batch))
+        targets = r + self.discount_rate * self._bootstrap(self.q_function.q_values(s_prime), a_prime)
+        self.q_function.update(s, a, targets)
+        self._batch = []
+
+    def learn_episodes(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                       lengths: np.ndarray) -> None:
+        """Update from packed episodes in one go - see actor_learner.py for the layout
+
+        The table update is a single batched step against the table before the
+        batch. Transitions that share a state-action are averaged into one step
+        for that entry, so repeats don't add up to an overshooting update.
+        """
+        rows = actor_learner.transition_rows(lengths)
+        s, a, s_prime = states[rows], actions[rows].astype(int), states[rows + 1]
+        a_prime = actions[rows + 1].astype(int)
+        if self.q_function is not None:
+            for ii in range(0, len(rows), self.batch_size):
+                batch = slice(ii, ii + self.batch_size)
+                q_sp = self._bootstrap(self.q_function.q_values(s_prime[batch]), a_prime[batch])
+                self.q_function.update(s[batch], a[batch], rewards[batch] + self.discount_rate * q_sp)
+            return
+        if self.trace_decay:
+            # traces depend on the update order - replay one transition at a time
+            for episode in np.split(np.arange(len(rows)), np.cumsum(lengths)[:-1]):
+                for ii in episode:
+                    self.update_table(s[ii], self.DIRECTION_MAP[a[ii]], rewards[ii], s_prime[ii],
+                                      self.DIRECTION_MAP[a_prime[ii]])
+                self.traces.reset()
+            return
+        q_sp = self._bootstrap(self.q_table[tuple(s_prime.T)], a_prime)
+        self._step_entries(tuple(s.T) + (a,), rewards + self.discount_rate * q_sp)
+
+    def _step_entries(self, sa: tuple, targets: np.ndarray) -> None:
+        """One learning rate step per state-action towards its mean target"""
+        entries, inverse, counts = np.unique(np.ravel_multi_index(sa, self.q_table.shape),
+                                             return_inverse=True, return_counts=True)
+        mean_targets = np.bincount(inverse.ravel(), weights=targets) / counts
+        steps = self.learning_rate * (mean_targets - self.q_table.flat[entries])
+        self.q_table.flat[entries] += steps
+        new = entries[~self.visits.flat[entries]]
+        self.visits.flat[new] = True
+        self.visited += len(new)
+        if len(steps):
+            self._delta_q = max(self._delta_q, float(np.max(np.abs(steps))))
+
+    def run_self_play(self, num_episodes: int = 1000, frozen_every: int = 0, frozen_prob: float = 0.5,
+                      num_frozen: int = 10, game_save_modulo: int = 500):
+        """Train with every player acting from and learning into the shared Q table
+
+        The states of all players are looked up with one batched query and
+        learned from with one batched update per step, so each step gives a
+        transition per player instead of one for uid=1.
+
+        Args:
+            num_episodes (int): number of games
+            frozen_every (int): keep a snapshot of the Q table every
+                frozen_every episodes - 0 for pure self-play
+            frozen_prob (float): chance that an opponent plays greedily from a
+                random snapshot instead of learning
+            num_frozen (int): number of most recent snapshots kept
+            game_save_modulo (int): save every game_save_modulo-th game
+        """
+        stats = []
+        n_prev = len(self.game_stats)
+        uids = np.arange(1, self.players + 1)
+        frozen: list[actor_learner.SnapshotPolicy] = []
+        for n_sim in range(num_episodes):
+            if (n_sim + 1) % 100 == 0:
+                print(f"Simulation {n_sim + 1}/{num_episodes}")
+            if frozen_every and n_sim % frozen_every == 0:
+                policy = actor_learner.SnapshotPolicy(0.0, tron.Tron.state_sizes(self.features, self.vision_grid_size))
+                policy.load(actor_learner.snapshot(self))
+                frozen = (frozen + [policy])[-num_frozen:]
+
+            game = self._new_game()
+            observation = game.reset()
+            # uid=1 always learns - opponents may play a frozen snapshot
+            opponents = {uid: frozen[self.draws.integers(len(frozen))] for uid in uids[1:]
+                         if frozen and self.draws.random() < frozen_prob}
+            learners = np.array([uid for uid in uids if uid not in opponents]) - 1
+            player_traces = [EligibilityTraces() for uid in uids]
+
+            s = np.array([game.get_state(uid=uid, features=self.features, size=self.vision_grid_size) for uid in uids])
+            a = self._self_play_actions(s, observation)
+            done = False
+            while not done:
+                moves = [self.DIRECTION_MAP[opponents[uid].select(s[uid - 1]) if uid in opponents else a[uid - 1]]
+                         for uid in uids]
+                observation, done, status, reward = game.move(*moves)
+                s_prime = np.array([game.get_state(uid=uid, features=self.features, size=self.vision_grid_size)
+                                    for uid in uids])
+                a_prime = self._self_play_actions(s_prime, observation)
+                r = np.array(reward, dtype=float)
+                if self.trace_decay:
+                    for idx in learners:
+                        self.update_table(s[idx], self.DIRECTION_MAP[a[idx]], r[idx], s_prime[idx],
+                                          self.DIRECTION_MAP[a_prime[idx]], traces=player_traces[idx])
+                else:
+                    # one packed episode of a single transition per learning player
+                    packed = np.stack([s[learners], s_prime[learners]], axis=1).reshape(2 * len(learners), -1)
+                    self.learn_episodes(packed, np.stack([a[learners], a_prime[learners]], axis=1).ravel(),
+                                        r[learners], np.ones(len(learners), dtype=int))
+                s, a = s_prime, a_prime
+
+            stats.append(self._build_game_stats(n=n_sim+n_prev, game_stats=game.get_game_stats(uid=1)))
+            if (n_sim + 1) % game_save_modulo == 0:
+                game_fname = f"{self.fname_root}_episode_{n_prev + n_sim+1}"
+                print("Game saved: {}".format(game.save(fname_base=game_fname, agents=[type(self).__name__] * self.players)))
+            if self._converged(stats[-1]):
+                break
+
+        self._save_learning(stats)
+
+    def _self_play_actions(self, states: np.ndarray, observation: tron.Observation) -> np.ndarray:
+        """Action index of every player from one batched lookup"""
+        legal_moves = np.asarray(observation['legal_moves']) if self.mask_actions else None
+        return np.array([self.ACTION_MAP[t] for t in self.select_actions(states, legal_moves)])
+
+
+def build_parser(description: str, td: bool = True) -> argparse.ArgumentParser:
+    """Command line of a learner - td adds the TDTrainer options"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--players', '-p', type=int, help="Number of players - default 2", default=2)
+    parser.add_argument('--size', '-s', type=int, help="Size of game grid - default 25", default=25)
+    parser.add_argument('--vision_grid', '-v', type=int, help="Size of vision grid - default 3. Must be odd", default=3)
+    parser.add_argument('--num_episodes', '-n', type=int, default=1000, help="Number of episodes - default 1000")
+    parser.add_argument('--discount_rate', '-d', type=float, default=0.9, help="Discount rate for future rewards - default 0.9")
+    parser.add_argument('--epsilon', '-e', type=float, default=0.2, help="Epsilon for greedy action selection - default 0.2")
+    parser.add_argument('--filename_root', '-f', type=str, default=None, help="Filename root for saving - default None")
+    parser.add_argument('--num_envs', type=int, default=1, help="Number of games to run at once - default 1")
+    parser.add_argument('--actors', type=int, default=0,
+                        help="Actor processes playing for one learner process - default 0 (no actors)")
+    parser.add_argument('--queue_size', type=int, default=8,
+                        help="Trajectory batches queued before the actors block - default 8")
+    parser.add_argument('--concurrent', '-c', action='store_true', help="Generate opponent moves concurrently")
+    parser.add_argument('--mask_actions', '-m', action='store_true', help="Only explore legal actions")
+    parser.add_argument('--features', type=str, choices=tron.FEATURES, default="vision",
+                        help="Learner state - vision grid or ray cast features - default vision")
+    if td:
+        parser.add_argument('--learning_rate', '-l', type=float, default=0.4, help="Learning rate - default 0.4")
+        parser.add_argument('--self_play', action='store_true', help="Every player learns into the shared Q table")
+        parser.add_argument('--frozen_every', type=int, default=0,
+                            help="Self-play episodes between frozen opponent snapshots - default 0 (none)")
+        parser.add_argument('--frozen_prob', type=float, default=0.5,
+                            help="Chance an opponent plays a frozen snapshot in self-play - default 0.5")
+        parser.add_argument('--approximator', '-a', type=str, choices=approximators.APPROXIMATORS, default=None,
+                            help="Q function approximator instead of the Q table - default None")
+        parser.add_argument('--approximator_lr', type=float, default=None,
+                            help="Approximator step size - default tiles 0.1, mlp 0.001")
+        parser.add_argument('--batch_size', '-b', type=int, default=32,
+                            help="Transitions per approximator update - default 32")
+        parser.add_argument('--trace_decay', type=float, default=0.0,
+                            help="Lambda of the eligibility traces - default 0 (one step)")
+    parser.add_argument('--tol', type=float, default=None,
+                        help="Stop once max |dQ| stays below tol for --window episodes - default None")
+    parser.add_argument('--patience', type=int, default=None,
+                        help="Stop after this many episodes without a rolling reward gain - default None")
+    parser.add_argument('--window', type=int, default=100,
+                        help="Episodes for the |dQ| rule and the rolling means - default 100")
+    parser.add_argument('--map', type=str, default=None,
+                        help="Map file or random[:density[:seed]] - default open board")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="Seed of the games and the exploration - default fresh entropy")
+    parser.add_argument('agents', nargs="*", default=['agent.wallhugger'], help="Opponent modules - default agent.wallhugger")
+    return parser
+
+
+def main(trainer_class: type, args: argparse.Namespace) -> None:
+    """Build the learner from parsed build_parser arguments, train it and plot the learning"""
+    if not args.vision_grid % 2:
+        print("Vision grid not odd. Setting to 3")
+        args.vision_grid = 3
+    tracker = None
+    if args.tol is not None or args.patience is not None:
+        tracker = convergence.ConvergenceTracker(window=args.window, tol=args.tol, patience=args.patience)
+    kwargs = {}
+    if issubclass(trainer_class, TDTrainer):
+        kwargs = {"approximator": args.approximator, "approximator_lr": args.approximator_lr,
+                  "batch_size": args.batch_size, "trace_decay": args.trace_decay,
+                  "learning_rate": args.learning_rate}
+    rl_agent = trainer_class(players=args.players, size=args.size, agents=args.agents,
+                             vision_grid_size=args.vision_grid,
+                             discount_rate=args.discount_rate, epsilon=args.epsilon,
+                             filename_root=args.filename_root, concurrent=args.concurrent, mask_actions=args.mask_actions,
+                             features=args.features, tracker=tracker, game_map=args.map, seed=args.seed, **kwargs)
+    if getattr(args, "self_play", False):
+        rl_agent.run_self_play(num_episodes=args.num_episodes, frozen_every=args.frozen_every,
+                               frozen_prob=args.frozen_prob)
+    elif args.actors > 0:
+        rl_agent.run_actor_learner(num_episodes=args.num_episodes, num_actors=args.actors,
+                                   queue_size=args.queue_size)
+    elif args.num_envs > 1:
+        rl_agent.run_vectorized_simulation(num_episodes=args.num_episodes, num_envs=args.num_envs)
+    else:
+        rl_agent.run_simulation(num_episodes=args.num_episodes)
+    rl_agent.visualize_learning()
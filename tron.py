@@ -1,13 +1,16 @@
 import numpy as np
 import enum 
-from itertools import combinations, permutations, product
 from datetime import datetime
 import json
 from typing import Any, Optional, Dict
 
 import numpy as np
 
+import live
+import regions
+import streams
 import utilities
+from board import SparseBoard
 
 # type aliases
 Location = tuple[int, int]  # location type (y, x)
@@ -21,6 +24,8 @@ class Status(enum.IntEnum):
     CRASH_INTO_TAIL = 2
     CRASH_INTO_OPPONENT = 3
     CRASH_INTO_SELF = 4
+    # sealed in a smaller region than an opponent - see Tron resolve="regions"
+    OUT_OF_ROOM = 5
 
 
 class Orientation(enum.IntEnum):
@@ -42,6 +47,18 @@ class Turn(enum.IntEnum):
     RIGHT_90 = 2
 
 
+# enum members indexed by value - avoids building a new enum on every lookup
+ORIENTATIONS = list(Orientation)
+STATUSES = list(Status)
+TURNS = list(Turn)
+
+# state representations for the learners - see Tron.get_state
+FEATURES = ("vision", "rays")
+# bin edges for the ray cast features - see Tron.get_ray_features
+RAY_BINS = (1, 3)
+DISTANCE_BINS = (4, 10)
+
+
 class Player:
     # movement possible - square grid - diagonals possible
     # (dy, dx)
@@ -56,6 +73,8 @@ class Player:
         (-1, -1),  # NW
     ]
 
+    STEPS_ARRAY = np.array(STEPS, dtype=int)
+
     NORTH_FACING = [0]
     SOUTH_FACING = [4]
     EAST_FACING = [2]
@@ -73,10 +92,11 @@ class Player:
         """
 
         self.uid = uid
-        self.x = x
-        self.y = y
-        self.orientation = Orientation(orientation)
-        self.status = status
+        # head, orientation and status live in small arrays so that a Tron game
+        # can rebind them to views of its own struct-of-arrays player store
+        self._head = np.array([y, x], dtype=int)
+        self._orientation = np.array([Orientation(orientation)], dtype=int)
+        self._status = np.array([status], dtype=int)
 
         # save state history
         # state at each time step - location/postion, orientaiton, uid, status, action
@@ -101,6 +121,53 @@ class Player:
             ],
         }
 
+    @property
+    def y(self) -> int:
+        return int(self._head[0])
+
+    @y.setter
+    def y(self, value: int) -> None:
+        self._head[0] = value
+
+    @property
+    def x(self) -> int:
+        return int(self._head[1])
+
+    @x.setter
+    def x(self, value: int) -> None:
+        self._head[1] = value
+
+    @property
+    def orientation(self) -> Orientation:
+        return ORIENTATIONS[self._orientation[0]]
+
+    @orientation.setter
+    def orientation(self, value: Orientation) -> None:
+        self._orientation[0] = value
+
+    @property
+    def status(self) -> Status:
+        return STATUSES[self._status[0]]
+
+    @status.setter
+    def status(self, value: Status) -> None:
+        self._status[0] = value
+
+    def bind(self, head: np.ndarray, orientation: np.ndarray, status: np.ndarray) -> None:
+        """Store the player state in views of a shared player store
+
+        Args:
+            head (np.array): view of shape (2,) holding (y, x)
+            orientation (np.array): view of shape (1,) holding the orientation
+            status (np.array): view of shape (1,) holding the status
+        """
+        head[:] = self._head
+        orientation[:] = self._orientation
+        status[:] = self._status
+        self._head = head
+        self._orientation = orientation
+        self._status = status
+
     def act(self, action):
         """Rotate and move 1 unit forward
 
@@ -168,17 +235,52 @@ class Player:
 class Tron:
     """Define game board and collisions"""
 
-    def __init__(self, size: int = 10, num_players: int = 2):
+    RESOLVE_MODES = (None, "fill", "regions")
+
+    def __init__(self, size: int = 10, num_players: int = 2, sparse: bool = False,
+                 resolve: Optional[str] = None, tablebase=None, record: Optional[str] = None,
+                 game_map=None, seed: streams.Seed = None):
         """Default constructor
 
         Args:
             size (int): size of side of square grid for game
             num_players (int): number of players
+            sparse (bool): store the board as a SparseBoard of trails instead
+                of a dense size x size x (1 + num_players) array
+            resolve (str): end the game early once every player is sealed in
+                its own region
+                None: play every step
+                "fill": fast forward each player along a space filling path
+                "regions": stop and declare the winners by region size
+            tablebase (tablebase.Tablebase): exact endgame solver used by
+                "fill" for regions up to tablebase.max_cells
+            record (str): append every move to this live record file so the
+                game can be followed with replay.py --follow
+            game_map (maps.GameMap): obstacles and spawn points - must be
+                size x size. None for the open board with top/bottom starts
+            seed (int): seed or np.random.SeedSequence of the game. The engine
+                and every player get their own spawned stream - see rng and
+                player_rngs. None for fresh entropy
         """
+        if resolve not in Tron.RESOLVE_MODES:
+            raise ValueError(f"resolve must be one of {Tron.RESOLVE_MODES}")
+        if game_map is not None and game_map.size != size:
+            raise ValueError(f"Map {game_map.name} is {game_map.size}x{game_map.size}, not {size}x{size}")
 
         self.size = size
         self.halfsize = size // 2
         self.num_players = num_players
+        self.sparse = sparse
+        self.resolve = resolve
+        self.tablebase = tablebase
+        self.record = record
+        self.game_map = game_map
+        self._live: Optional[live.LiveWriter] = None
+
+        # spawn placement draws from rng, the agent or learner driving uid
+        # from player_rngs[uid - 1] - see streams.py
+        self.seed_sequence = streams.seed_sequence(seed)
+        self.rng, *self.player_rngs = streams.spawn(self.seed_sequence, 1 + num_players)
 
     def reset(self) -> Observation:
         """Initialize game field and randomly place players
@@ -191,10 +293,31 @@ class Tron:
         # initialize all the players
         self.players = self._init_players()
         # self.players = self._init_two_players()
+        self._init_player_store()
 
         self._update()
         observation = self._get_observation()
 
+        # early resolution bookkeeping
+        self.steps_skipped = 0
+        self.resolution: Optional[dict[str, Any]] = None
+        if self.game_map is None:
+            self._check_regions = True  # full connectivity check on the first move
+            self._cut_heads = False  # a head was on a local cut after the last move
+        else:
+            # the map's cached regions stand in for the first flood - spawns in
+            # different regions start apart, and a start cell that cuts its
+            # region is flooded on the first move
+            labels = self.game_map.labels[self.heads[:, 0], self.heads[:, 1]]
+            self._check_regions = len(set(labels.tolist())) > 1
+            self._cut_heads = any(self._ring_check())
+
+        if self.record is not None:
+            if self._live is not None:
+                self._live.close()
+            self._live = live.LiveWriter(self.record)
+            self._live.start(self)
+
         return observation
     
     def get_game_stats(self, uid: int = 1) -> Dict[str, Any]:
@@ -205,13 +328,18 @@ class Tron:
         return stats
     
     def _init_players(self) -> list[Player]:
+        if self.game_map is not None:
+            # spread out picks from the map's precomputed spawn points
+            return [Player(int(y), int(x), int(o), uid=idx + 1)
+                    for idx, (y, x, o) in enumerate(self.game_map.spawn(self.num_players, rng=self.rng))]
+
         players = []
 
         wall_gap = self.size // 10
         rows = self.grid.shape[0]
         cols = self.grid.shape[1]
         # random locations for players on top/bottom
-        x_location = np.random.choice(
+        x_location = self.rng.choice(
             np.arange(1 + wall_gap, cols - wall_gap - 1),
             size=self.num_players,
             replace=False,
@@ -225,12 +353,33 @@ class Tron:
 
             players.append(
                 Player(
-                    int(y), int(x), np.random.choice(orientation_options), uid=idx + 1
+                    int(y), int(x), self.rng.choice(orientation_options), uid=idx + 1
                 )
             )
 
         return players
 
+    def _init_player_store(self) -> None:
+        """Hold player heads, orientations and status in arrays
+
+        Each Player is rebound to views of these arrays so the game can move
+        every player at once while Player attributes stay in sync.
+            heads (np.array): num_players x 2 array of (y, x)
+            orientations (np.array): num_players array from Orientation
+            status (np.array): num_players array from Status
+            uids (np.array): num_players array of player uid (grid layer)
+        """
+        num_players = len(self.players)
+        self.heads = np.zeros((num_players, 2), dtype=int)
+        self.orientations = np.zeros(num_players, dtype=int)
+        self.status = np.zeros(num_players, dtype=int)
+        self.uids = np.array([p.uid for p in self.players], dtype=int)
+
+        for idx, player in enumerate(self.players):
+            player.bind(self.heads[idx],
+                        self.orientations[idx:idx+1],
+                        self.status[idx:idx+1])
+
     def _init_two_players(self) -> list[Player]:
         players = []
         players.append(Player(5, 5, Orientation.E))
@@ -243,7 +392,16 @@ class Tron:
 
         Returns:
             grid (ndarray): nxnxm array of walls and player positions
+                or a SparseBoard with the same indexing if sparse
         """
+        if self.sparse:
+            # boundary walls are implicit
+            board = SparseBoard(self.size, self.size, self.num_players)
+            if self.game_map is not None:
+                ys, xs = np.nonzero(self.game_map.walls[1:-1, 1:-1])
+                board[ys + 1, xs + 1, 0] = 1
+            return board
+
         # grid (0, 0) is in top left corner
         # positive x - move to larger/higher columns (right)
         # positive y - move to higher/larger rows (down)
@@ -255,6 +413,8 @@ class Tron:
         grid[-1, :, 0] = 1
         grid[:, 0, 0] = 1
         grid[:, -1, 0] = 1
+        if self.game_map is not None:
+            grid[:, :, 0] = self.game_map.walls
 
         return grid
 
@@ -264,8 +424,7 @@ class Tron:
         Update game board with the current player positions
         """
         # TODO: only move players in valid state
-        for idx, player in enumerate(self.players):
-            self.grid[player.y, player.x, player.uid] = 1
+        self.grid[self.heads[:, 0], self.heads[:, 1], self.uids] = 1
 
     def _get_observation(self) -> Observation:
         """Return representation of game
@@ -276,21 +435,47 @@ class Tron:
                     m: y coordinate - positive down
                     n: x coordinate - positive right
                     p: player locations
+                    For a sparse game this is the live SparseBoard (not a copy)
                 - positions (list): tuple (y, x) of each player current coordinates
                 - orientations (tuple): tuple of length num_players of each player orientation
+                - legal_moves (np.array): num_players x len(Turn) boolean mask of
+                    moves in Turn order that land on a free square
         """
         observation = {
-            "board": self.grid.copy(),
-            "positions": tuple([(p.y, p.x) for p in self.players]),
-            "orientations": tuple([p.orientation for p in self.players]),
+            "board": self.grid if self.sparse else self.grid.copy(),
+            "positions": tuple(map(tuple, self.heads.tolist())),
+            "orientations": tuple([ORIENTATIONS[o] for o in self.orientations]),
+            "legal_moves": self._legal_moves(),
         }
         # TODO add rewards here
         return observation
 
+    def _legal_moves(self) -> np.ndarray:
+        """Legal action mask for every player
+
+        Same check as validate_position on future_move for every Turn, done
+        for all players at once.
+
+        Returns:
+            legal (np.array): num_players x len(Turn) boolean array in Turn order
+        """
+        rows, cols = self.grid.shape[0], self.grid.shape[1]
+        turns = np.array(TURNS, dtype=int)
+        orientations = (self.orientations[:, None] + turns[None, :]) % len(Orientation)
+        cells = self.heads[:, None, :] + Player.STEPS_ARRAY[orientations]
+        ys, xs = cells[..., 0], cells[..., 1]
+
+        legal = (ys < rows) & (xs < cols) & (ys > 0) & (xs > 0)
+        legal[legal] = self.grid[ys[legal], xs[legal], :].sum(axis=-1) == 0
+        return legal
+
     # TODO Add other game representations
     def move(self, *actions) -> tuple[Observation, bool, list, list] :
         """Move all the players
 
+        All players are moved, checked against walls, tails and each other in
+        a single vectorized pass over the player store.
+
         Args:
             actions (List[int]): List of actions for each player - Turn enumeration
                 -2: large CCW turn
@@ -306,45 +491,54 @@ class Tron:
                 2: player crashed into another tail
         """
         done = False
-        status = [p.status for p in self.players]
+        rows, cols = self.grid.shape[0], self.grid.shape[1]
 
-        # move the valid players
-        for player, action in zip(self.players, actions):
-            if player.status == Status.VALID:
-                player.act(action)
+        # move the valid players - players without an action stay in place
+        moving = self.status == Status.VALID
+        moving[len(actions):] = False
+        action_array = np.zeros(self.num_players, dtype=int)
+        action_array[:len(actions)] = actions[:self.num_players]
+        self.orientations[moving] = (self.orientations[moving] + action_array[moving]) % len(Orientation)
+        self.heads[moving] += Player.STEPS_ARRAY[self.orientations[moving]]
 
         # check against walls - only update if valid
-        for idx, p in enumerate(self.players):
-            if p.status == Status.VALID:
-                status[idx] = self._validate_wall(p)
-
-        # check each player against the walls/tails
-        if self.num_players == 1:
-            status[0] = (
-                self._validate_tail(self.players[0])
-                if status[0] == Status.VALID
-                else status[0]
-            )
-        else:
-            # check if players have crashed into others
-            for idx, (p, o) in enumerate(permutations(self.players, r=2)):
-                if (
-                    p.status == Status.VALID and 
-                    status[idx // (self.num_players - 1)] == Status.VALID
-                ):
-                    # TODO Need to check which o current p crashed into and save
-                    # this will simply tell us we crashed into another player, but not which one
-                    if status[idx // (self.num_players - 1)] is Status.VALID:
-                        status[idx // (self.num_players - 1)] = self._validate_player(
-                            p, o
-                        )
+        status = self.status.copy()
+        ys, xs = self.heads[:, 0], self.heads[:, 1]
+        outside = (ys >= rows) | (xs >= cols) | (ys <= 0) | (xs <= 0)
+        crash_wall = moving & outside
+        inside = moving & ~outside
+        crash_wall[inside] = self.grid[ys[inside], xs[inside], 0] > 0
+        status[crash_wall] = Status.CRASH_INTO_WALL
+
+        # check remaining moving players against the tails
+        check = np.flatnonzero((status == Status.VALID) & moving)
+        cells = self.grid[ys[check], xs[check], 1:]
+        own = cells[np.arange(len(check)), self.uids[check] - 1] > 0
+        others = cells.sum(axis=1) - own > 0
+        status[check[own]] = Status.CRASH_INTO_SELF
+        status[check[~own & others]] = Status.CRASH_INTO_TAIL
+
+        if self.num_players > 1:
+            # head on collisions - moving players sharing a hashed head coordinate.
+            # Landing on a head that stays in place is a tail crash above
+            keys = ((ys + 1) * (cols + 2) + (xs + 1))[moving]
+            _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+            shared = np.zeros(self.num_players, dtype=bool)
+            shared[moving] = counts[inverse.ravel()] > 1
+            status[(status == Status.VALID) & shared] = Status.CRASH_INTO_OPPONENT
 
         # update player status and last state based on the computed status
+        self.status[:] = status
+        status = [STATUSES[s] for s in status]
         reward = [self._reward(s) for s in status]
-        for s, r, p in zip(status, reward, self.players):
-            # TODO Compute reward for each player
-            # status should stay the same since we don't move if not valid
-            p.update_status(s,r)
+        for idx, (s, r, p) in enumerate(zip(status, reward, self.players)):
+            if moving[idx]:
+                p.states["y"].append(p.y)
+                p.states["x"].append(p.x)
+                p.states["orientation"].append(p.orientation)
+                p.states["actions"].append(actions[idx])
+            p.states["status"].append(s)
+            p.states["rewards"].append(r)
 
         # TODO: Fix logic for ending game with n > 2 players
         # done only when single player is remaining - when not singleplayer
@@ -361,101 +555,154 @@ class Tron:
 
         if not done:
             self._update()  # update game board
+            if self.resolve is not None and self._separated():
+                return self._resolve(status, reward)
 
+        if self._live is not None:
+            self._live.write(self, done)
         observation = self._get_observation()
         return observation, done, status, reward
-    
-    def _reward(self, status: Status) -> float:
-        """Return a reward based on a given status flag"""
-        if status == Status.VALID:
-            return 1
-        elif status in (Status.CRASH_INTO_OPPONENT, Status.CRASH_INTO_SELF, Status.CRASH_INTO_TAIL, Status.CRASH_INTO_WALL):
-            return -100
-
-    def _validate_player(self, player: Player, opponent: Player) -> Status:
-        """Check if player is in valid state
-
-        Args:
-            player (Player): player instance
-            opponent (Player): opponent to check for a head on collision
 
-        Returns:
-            status (int): status for the current player
-                0: valid
-                1: crash into wall
-                2: crash into tail
+    def _separated(self) -> bool:
+        """Check if every player is sealed in its own region
+
+        A region can only split when a new head lands on a cell whose free
+        neighbours are not connected around it - with the heads landing one
+        after the other, so the later heads of the move are still free in
+        the ring of an earlier one. A head on such a cut may
+        touch several regions and leaves all but one of them by moving on,
+        so the full flood fill runs when a head is on a local cut now or was
+        on the move before (and on the first move - on a map the cached
+        regions seed the check instead, see reset). A head with no free side
+        neighbour is sealed in an empty region and triggers the fill too.
+
+        Sets self._region_sizes to the free cells reachable by each player
+        and self._region_labels to the owner of each reachable cell
         """
-        status = Status.VALID
-
-        # check crash into any tails
-        status = self._validate_tail(player)
-
-        if status > 0:
-            return status
-
-        # check for crash into head
-        status = player.front_crash(opponent)
-
-        return status
+        rows, cols = self.grid.shape[0], self.grid.shape[1]
+        if self.num_players < 2:
+            return False
 
-    def _validate_wall(self, player: Player) -> Status:
-        """Check if player crashes into a wall boundary
+        split, cut_heads, trapped = self._ring_check()
+        check = self._check_regions or split or trapped or self._cut_heads
+        self._check_regions, self._cut_heads = False, cut_heads
+        if not check:
+            return False
 
-        Args:
-            player (Player): player instance
+        free = regions.free_cells(self.grid)
+        starts = [[(y + dy) * cols + (x + dx) for dy, dx in regions.SIDES if free[(y + dy) * cols + (x + dx)]]
+                  for y, x in self.heads.tolist()]
+        # label every player's start cells first so a shared region is found
+        # as soon as one fill reaches another player
+        labels = {}
+        for idx, keys in enumerate(starts):
+            for key in keys:
+                if labels.setdefault(key, idx) != idx:
+                    return False
+
+        sizes = []
+        for idx, keys in enumerate(starts):
+            size = regions.flood(keys, free, cols, labels, owner=idx)
+            if size is None:
+                return False
+            sizes.append(size)
+
+        self._region_sizes = sizes
+        self._region_labels = labels
+        return True
+
+    def _ring_check(self) -> tuple[bool, bool, bool]:
+        """Local cut checks on the 8 cells around every head - see _separated
 
         Returns:
-            status (int): status for the player
-                0: valid
-                1: crash into wall
+            split (bool): a head landing after the previous ones cut its ring
+            cut_heads (bool): a head sits on a cut of the current board
+            trapped (bool): a head has no free side neighbour
         """
-        # check if outside game board
         rows, cols = self.grid.shape[0], self.grid.shape[1]
-        if (
-            player.y >= rows or player.x >= cols or player.y <= 0 or player.x <= 0
-        ):  # exterior wall
-            return Status.CRASH_INTO_WALL
-        elif self.grid[player.y, player.x, 0]:  # obstacles in map
-            return Status.CRASH_INTO_WALL
-        else:
-            return Status.VALID
-
-    def _validate_tail(self, player: Player) -> Status:
-        """Check if player crashed into a tail
-
-        Args:
-            player (Player): player instance
-
-        Returns:
-            status (int): status for the player
-                0: player is valid
-                2: player crashed into a tail
+        ring = self.heads[:, None, :] + Player.STEPS_ARRAY[None, :, :]
+        ys, xs = ring[..., 0].clip(0, rows - 1), ring[..., 1].clip(0, cols - 1)
+        free_ring = self.grid[ys, xs, :].sum(axis=-1) == 0
+        later = np.triu(np.ones((self.num_players, self.num_players), dtype=bool), 1)
+        landing = free_ring | ((ring[:, :, None, :] == self.heads[None, None]).all(axis=-1) & later[:, None, :]).any(axis=-1)
+        split = any(regions.is_local_cut(r) for r in landing.tolist())
+        cut_heads = any(regions.is_local_cut(r) for r in free_ring.tolist())
+        trapped = not free_ring[:, ::2].any(axis=1).all()  # N, E, S, W are the even ring cells
+        return split, cut_heads, trapped
+
+    def _resolve(self, status: list, reward: list) -> tuple[Observation, bool, list, list]:
+        """Finish a game where every player is sealed in its own region
+
+        "regions" ends the game now with the largest regions as winners and
+        estimates the skipped steps as the smallest region. Every other player
+        ends OUT_OF_ROOM with the crash reward - all of them on a tie, like a
+        head on crash. "fill" moves every
+        player along a space filling path (the exact tablebase path for
+        small regions) until the first one runs out of room and plays that
+        final move normally.
         """
-        all_opponents = np.array([p.uid for p in self.players])
-        all_opponents = all_opponents[all_opponents != player.uid]
-        if self.grid[player.y, player.x, player.uid] > 0:
-            return Status.CRASH_INTO_SELF
-        elif np.sum(self.grid[player.y, player.x, all_opponents]) > 0:
-            return Status.CRASH_INTO_TAIL
-        else:
-            return Status.VALID
-
-    def _validate_front_crash(self, player1: Player, player2: Player) -> Status:
-        """Check if two players heads have collided
+        sizes = self._region_sizes
+        if self.resolve == "regions":
+            self.steps_skipped += min(sizes)
+            winners = [idx + 1 for idx, s in enumerate(sizes) if s == max(sizes)]
+            if len(winners) == self.num_players:
+                winners = []
+            for idx, p in enumerate(self.players):
+                if idx + 1 not in winners:
+                    # the outcome replaces the last recorded step
+                    status[idx] = Status.OUT_OF_ROOM
+                    reward[idx] = self._reward(Status.OUT_OF_ROOM)
+                    self.status[idx] = Status.OUT_OF_ROOM
+                    p.states["status"][-1] = status[idx]
+                    p.states["rewards"][-1] = reward[idx]
+            self.resolution = {"mode": self.resolve, "region_sizes": sizes, "winners": winners,
+                               "steps_skipped": self.steps_skipped}
+            if self._live is not None:
+                self._live.write(self, True)
+            return self._get_observation(), True, status, reward
 
-        Args:
-            player1 (Player): player 1 instance
-            player2 (Player): player 2 instance
-
-        Returns:
-            status (int): status for player1
-                0: valid
-                2: crash into player2
-        """
-        if player1.front_crash(player2):
-            return Status.CRASH_INTO_OPPONENT
-        else:
-            return Status.VALID
+        cols = self.grid.shape[1]
+        free = regions.free_cells(self.grid)
+        paths = []
+        for idx, ((y, x), o) in enumerate(zip(self.heads.tolist(), self.orientations.tolist())):
+            if self.tablebase is not None and sizes[idx] <= self.tablebase.max_cells:
+                # small region - play the exact longest path
+                cells = {divmod(key, cols) for key, owner in self._region_labels.items() if owner == idx}
+                paths.append([(Turn(t), yn, xn, on) for t, yn, xn, on in self.tablebase.path(y, x, o, cells)])
+            else:
+                paths.append(regions.fill_path(y, x, o, free, cols, TURNS, Player.STEPS))
+        skip = min(len(p) for p in paths)
+
+        # apply the first skip steps of every path at once
+        if skip:
+            for idx, (path, p) in enumerate(zip(paths, self.players)):
+                turns, ys, xs, orientations = zip(*path[:skip])
+                self.grid[np.array(ys), np.array(xs), np.full(skip, p.uid)] = 1
+                self.heads[idx] = (ys[-1], xs[-1])
+                self.orientations[idx] = orientations[-1]
+
+                p.states["y"].extend(ys)
+                p.states["x"].extend(xs)
+                p.states["orientation"].extend(ORIENTATIONS[o] for o in orientations)
+                p.states["actions"].extend(turns)
+                p.states["status"].extend([Status.VALID] * skip)
+                p.states["rewards"].extend([self._reward(Status.VALID)] * skip)
+
+        self.steps_skipped += skip
+        self.resolution = {"mode": self.resolve, "region_sizes": sizes,
+                           "steps_skipped": self.steps_skipped}
+
+        # players out of room go straight and crash
+        actions = [p[skip][0] if len(p) > skip else Turn.STRAIGHT for p in paths]
+        return self.move(*actions)
+    
+    def _reward(self, status: Status) -> float:
+        """Return a reward based on a given status flag"""
+        if status == Status.VALID:
+            return 1
+        elif status in (Status.CRASH_INTO_OPPONENT, Status.CRASH_INTO_SELF, Status.CRASH_INTO_TAIL, Status.CRASH_INTO_WALL,
+                        Status.OUT_OF_ROOM):
+            return -100
 
     @staticmethod
     def validate_position(yn: int, xn: int, board: np.ndarray) -> bool:
@@ -466,46 +713,128 @@ class Tron:
         else:
             return False if np.sum(board[yn, xn, :]) > 0 else True
 
+    def get_window(self, y: int, x: int, size: int) -> np.ndarray:
+        """Dense size x size x (1 + num_players) view of the board centered on (y, x)
+
+        Cells outside of the board are zero
+        """
+        if self.sparse:
+            return self.grid.window(y, x, size)
+
+        window = np.zeros((size, size, self.grid.shape[2]), dtype=int)
+        r0, c0 = y - size // 2, x - size // 2
+        rows = slice(max(r0, 0), min(r0 + size, self.grid.shape[0]))
+        cols = slice(max(c0, 0), min(c0 + size, self.grid.shape[1]))
+        window[rows.start - r0:rows.stop - r0, cols.start - c0:cols.stop - c0] = self.grid[rows, cols]
+        return window
+
     def get_vision_grid(self, uid: int = 1, size: int = 3):
         """Return vision grid for current game state
 
         """
         # get current player position
         (y, x) = (self.players[uid-1].y, self.players[uid-1].x)
-        rows = np.arange(y-size//2, y+size//2+1)
-        cols = np.arange(x-size//2, x+size//2+1)
-        
+
         # obstacle grid centered around current position
-        obstacle_grid = np.zeros((size, size), dtype=int)
-        player_grid = np.zeros((size, size), dtype=int)
-        opponent_grid = np.zeros((size, size), dtype=int) 
-
-        for idx, (r, c) in enumerate(product(rows, cols)):
-            # only extract values that lie within the grid (non negative or > grid_size)
-            if r < 0 or c < 0 or r >= self.size or c >= self.size:
-                continue
-            loc = np.unravel_index(idx, obstacle_grid.shape, order='C')
-            obstacle_grid[loc] = self.grid[r, c, 0]
-            player_grid[loc] = self.grid[r, c, uid]
-            opponent_grid[loc] = 1 if self.grid[r, c, uid+1:].sum() > 0 else 0
-
-        
+        window = self.get_window(y, x, size)
+        obstacle_grid = window[:, :, 0]
+        player_grid = window[:, :, uid]
+        opponent_grid = window[:, :, uid+1:].sum(axis=2)
+
         vision_grid = obstacle_grid + player_grid + opponent_grid
         vision_grid[vision_grid>0] = 1 
 
         return vision_grid.flatten().tolist()
 
-    def save(self, fname_base: str = "tron", start_time: datetime = datetime.now()) -> str:
+    def get_ray_features(self, uid: int = 1, ray_bins: tuple = RAY_BINS,
+                         distance_bins: tuple = DISTANCE_BINS) -> list[int]:
+        """Return ego-centric ray cast features for current game state
+
+        Rays are cast from the head along all 8 Player.STEPS directions at once,
+        starting straight ahead and going clockwise. Free distances only matter
+        up to the last bin edge so rays stop there.
+
+        Args:
+            uid (int): player uid
+            ray_bins (tuple): bin edges of the free distance along each ray
+            distance_bins (tuple): bin edges of the distance to the nearest opponent
+
+        Returns:
+            features (list): 8 binned ray distances, then the binned distance
+                (manhattan) and the bearing (0-7 clockwise from ahead) of the
+                nearest opponent head
+        """
+        rows, cols = self.grid.shape[0], self.grid.shape[1]
+        head = self.heads[uid-1]
+        orientation = int(self.orientations[uid-1])
+        directions = Player.STEPS_ARRAY[(orientation + np.arange(len(Orientation))) % len(Orientation)]
+
+        # 8 x K cells along every ray
+        k = np.arange(1, ray_bins[-1] + 1)
+        cells = head + directions[:, None, :] * k[None, :, None]
+        ys, xs = cells[..., 0], cells[..., 1]
+        inside = (ys >= 0) & (ys < rows) & (xs >= 0) & (xs < cols)
+        free = np.zeros(ys.shape, dtype=bool)
+        free[inside] = self.grid[ys[inside], xs[inside], :].sum(axis=-1) == 0
+        # free cells before the first blocked one
+        distances = np.where(free.all(axis=1), len(k), np.argmin(free, axis=1))
+        features = np.digitize(distances, ray_bins).tolist()
+
+        opponents = np.delete(self.heads, uid-1, axis=0)
+        if len(opponents):
+            offsets = opponents - head
+            manhattan = np.abs(offsets).sum(axis=1)
+            dy, dx = offsets[np.argmin(manhattan)]
+            # octant of the opponent in Orientation order (N=0 clockwise)
+            octant = int(np.round(np.arctan2(dx, -dy) / (np.pi / 4))) % len(Orientation)
+            features += [int(np.digitize(manhattan.min(), distance_bins)),
+                         (octant - orientation) % len(Orientation)]
+        else:
+            features += [len(distance_bins), 0]
+        return features
+
+    @staticmethod
+    def state_sizes(features: str = "vision", size: int = 3, ray_bins: tuple = RAY_BINS,
+                    distance_bins: tuple = DISTANCE_BINS) -> list[int]:
+        """Number of values of every entry of a state from get_state - for Q table shapes"""
+        if features == "rays":
+            return [len(ray_bins) + 1] * len(Orientation) + [len(distance_bins) + 1, len(Orientation)]
+        return [2] * size**2
+
+    def get_state(self, uid: int = 1, features: str = "vision", size: int = 3) -> list[int]:
+        """Learner state - the vision grid or the ray cast features
+
+        Args:
+            uid (int): player uid
+            features (str): "vision" for get_vision_grid or "rays" for get_ray_features
+            size (int): size of the vision grid
+        """
+        if features == "rays":
+            return self.get_ray_features(uid=uid)
+        return self.get_vision_grid(uid=uid, size=size)
+
+    def save(self, fname_base: str = "tron", start_time: datetime = datetime.now(),
+             agents: Optional[list[str]] = None) -> str:
         """Save the game history to file
 
         Args:
             start_time (datetime): Time to append to the filename - defaults to now()
+            agents (list): module or learner name of each player - kept for
+                catalog.py
         """
         # TODO ensure saving and loading are working - write a unit test
         filename = "{}.json".format(fname_base)
         with open(filename, "w") as file:
+            # sparse boards are stored compactly under "board"
+            board = {"board": self.grid.to_dict()} if self.sparse else {"grid": self.grid}
+            if self.resolution is not None:
+                board["resolution"] = self.resolution
+            if agents is not None:
+                board["agents"] = list(agents)
+            if self.game_map is not None:
+                board["map"] = self.game_map.name
             json.dump(
-                {"grid": self.grid, "states": [p.states for p in self.players]},
+                {**board, "states": [p.states for p in self.players]},
                 file,
                 indent=4,
                 cls=utilities.NumpyEncoder,
@@ -521,7 +850,7 @@ class Tron:
             filename (str): name of json file to load
 
         Returns:
-            grid (np.array): Game board
+            grid (np.array): Game board - a SparseBoard for sparse games
             states (list): list of player states. Each is a list for the game with dict elements
                 x: x position
                 y: y position
@@ -533,6 +862,8 @@ class Tron:
             data = json.load(file)
 
         # break out into useful variables
+        if "board" in data:
+            return SparseBoard.from_dict(data["board"]), data["states"]
         return np.array(data["grid"]), data["states"]
 
 
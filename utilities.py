@@ -1,5 +1,9 @@
-import numpy as np
+import csv
 import json
+import os
+from typing import Any, Dict
+
+import numpy as np
 
 
 class NumpyEncoder(json.JSONEncoder):
@@ -13,6 +17,48 @@ class NumpyEncoder(json.JSONEncoder):
         return super(NpEncoder, self).default(obj)
 
 
+def _plain(value: Any) -> Any:
+    """Python int or float of numpy scalars and int enums such as tron.Status"""
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value)
+    return value
+
+
+def _number(text: str) -> Any:
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def read_records(filename: str) -> list[Dict[str, Any]]:
+    """Rows of a csv file as dicts - numeric fields are parsed back to numbers"""
+    if not os.path.exists(filename):
+        return []
+    with open(filename, "r", newline="") as file:
+        return [{key: _number(value) for key, value in row.items()} for row in csv.DictReader(file)]
+
+
+def append_records(filename: str, records: list[Dict[str, Any]], fields: list[str]) -> None:
+    """Append dicts as csv rows - the header is written when the file is new
+
+    Plain csv instead of pandas so training never imports it - a list of
+    dicts is enough for the learning history.
+    """
+    new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+    with open(filename, "a", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+        if new:
+            writer.writeheader()
+        writer.writerows({key: _plain(value) for key, value in record.items()} for record in records)
+
+
 def state_space(grid_size=13, num_players=2):
     """compute state space of tron game"""
     # each grid location is either free or occupied
@@ -0,0 +1,122 @@
+"""Vectorized Tron environments for the trainers"""
+import importlib
+from typing import Any, Dict
+
+import numpy as np
+
+import streams
+import tron
+from agent.util import build_agent_list
+
+
+class VecTron:
+    """Run N Tron games side by side behind a gym style reset/step API
+
+    The learner is always player uid=1 and the remaining players are driven by
+    the opponent agents owned by the environment. Observations are the
+    learner's state (vision grid or ray features) for every game stacked
+    into one array. Finished games are reset automatically inside step.
+    """
+
+    def __init__(self, num_envs: int = 8, players: int = 2, size: int = 25,
+                 agents: list[str] = ['agent.wallhugger'], vision_grid_size: int = 3,
+                 sparse: bool = False, features: str = "vision", game_map=None,
+                 seed: streams.Seed = None):
+        """Constructor
+
+        Args:
+            num_envs (int): number of games to run at once
+            players (int): number of players in each game - learner is uid=1
+            size (int): size of the game grid
+            agents (list): opponent modules, e.g. agent.wallhugger
+            vision_grid_size (int): size of the learner vision grid
+            sparse (bool): use the sparse board backend
+            features (str): learner state from tron.FEATURES - see Tron.get_state
+            game_map (maps.GameMap): obstacle map shared by every game
+            seed (int): seed or np.random.SeedSequence - every game, including
+                the automatic resets, is seeded with the next spawned child
+        """
+        self.num_envs = num_envs
+        self.players = players
+        self.size = size
+        self.vision_grid_size = vision_grid_size
+        self.sparse = sparse
+        self.features = features
+        self.game_map = game_map
+        self.seed_sequence = streams.seed_sequence(seed)
+
+        agent_list = build_agent_list(players - 1, list(agents)) if players > 1 else []
+        self.agents = [importlib.import_module(a) for a in agent_list]
+
+        self.games: list[tron.Tron] = []
+        self.observations: list[tron.Observation] = []
+
+    def _reset_game(self, idx: int) -> None:
+        game = tron.Tron(size=self.size, num_players=self.players, sparse=self.sparse,
+                         game_map=self.game_map, seed=self.seed_sequence.spawn(1)[0])
+        observation = game.reset()
+        if idx < len(self.games):
+            self.games[idx] = game
+            self.observations[idx] = observation
+        else:
+            self.games.append(game)
+            self.observations.append(observation)
+
+    @property
+    def legal_moves(self) -> np.ndarray:
+        """num_envs x len(tron.Turn) legal move mask of the learner in each game"""
+        return np.array([o['legal_moves'][0] for o in self.observations])
+
+    def _get_states(self) -> np.ndarray:
+        return np.array([g.get_state(uid=1, features=self.features, size=self.vision_grid_size)
+                         for g in self.games], dtype=int)
+
+    def reset(self) -> np.ndarray:
+        """Start a new game in every environment
+
+        Returns:
+            states (np.array): num_envs x state size learner states
+        """
+        self.games, self.observations = [], []
+        for idx in range(self.num_envs):
+            self._reset_game(idx)
+        return self._get_states()
+
+    def step(self, actions) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[Dict[str, Any]]]:
+        """Move the learner in every game and advance the opponents
+
+        Args:
+            actions (list): learner action for each game from tron.Turn
+
+        Returns:
+            states (np.array): num_envs x state size learner states. Games
+                that finished are already reset and show the new game
+            rewards (np.array): learner reward for each game
+            dones (np.array): True where the game finished on this step
+            infos (list): dict per game. Finished games hold the
+                "final_state" learner state and the "game_stats" of the learner
+        """
+        rewards = np.zeros(self.num_envs)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = [{} for ii in range(self.num_envs)]
+
+        for idx, (game, observation, action) in enumerate(zip(self.games, self.observations, actions)):
+            # opponents are players uid > 1
+            moves = [action] + [am.generate_move(observation['board'],
+                                                 observation['positions'],
+                                                 observation['orientations'],
+                                                 ii+1,
+                                                 legal_moves=observation['legal_moves'][ii+1],
+                                                 rng=game.player_rngs[ii+1])
+                                for ii, am in enumerate(self.agents)]
+            self.observations[idx], dones[idx], status, reward = game.move(*moves)
+            rewards[idx] = reward[0]
+
+            if dones[idx]:
+                infos[idx]["final_state"] = game.get_state(uid=1, features=self.features,
+                                                           size=self.vision_grid_size)
+                infos[idx]["game_stats"] = game.get_game_stats(uid=1)
+                infos[idx]["game"] = game
+                self._reset_game(idx)
+
+        return self._get_states(), rewards, dones, infos